@@ -0,0 +1,56 @@
+# Public functions are resolved lazily: importing the package only builds this
+# table, and each submodule (with its geopandas/pyarrow/dask imports) is loaded
+# the first time one of its names is used.
+import importlib
+
+# Submodule providing each public name
+_exports = {
+    "sqlite": [
+        "GeoPackage", "as_sqlite", "get_gpkg", "close_gpkgs", "decode_gpkg_geometry",
+        "read_sf_dataset_sqlite", "read_sf_dataset_sqlite_chunks"
+    ],
+    "package": [
+        "read_parquet", "write_parquet", "open_dataset", "layer_to_geoparquet",
+        "gpkg_to_geoparquet", "glue"
+    ],
+    # The mask_hydrofabric function is reached through its module, which owns the name
+    "mask_hydrofabric": ["mask_hydrofabric_batch"],
+    "reference": [
+        "flowline_nodes", "reference_network", "routelink_waterbodies", "build_reference_network"
+    ],
+    "network": ["build_network_index", "load_network_index", "navigate", "subset_network"],
+    "zonal": ["read_grid", "weight_grid", "execute_zonal"],
+    "forcing": ["aggregate_forcing", "aggregate_forcing_file"],
+    "pipeline": ["pipeline_table", "run_pipeline"],
+    "qml": ["append_style"],
+    "writer": ["write_gpkg"],
+    "cache": ["enable_cache", "disable_cache"],
+    "global_id": ["assign_global_identifiers"],
+    "remote": ["RemoteStore", "read_remote_parquet", "serve_directory"],
+    "conflicts": ["hydrofabric_conflicts", "print_hydrofabric_conflicts"],
+    "attach": ["hydrofabric_attach", "package_version"],
+    "zzz": ["on_attach"],
+    "benchmark": ["run_benchmarks", "compare_results"],
+    "profiling": [
+        "enable_profiling", "disable_profiling", "span", "register_hook", "unregister_hook",
+        "get_spans", "clear_spans", "export_spans", "export_chrome_trace"
+    ],
+}
+
+_modules = {name: module for module, names in _exports.items() for name in names}
+
+__all__ = sorted(_modules)
+
+def __getattr__(name):
+    if name in _modules:
+        value = getattr(importlib.import_module(f".{_modules[name]}", __name__), name)
+    elif name in _exports or name == "utils":
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_exports))
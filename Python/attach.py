@@ -1,32 +1,39 @@
-import importlib
-import pkg_resources
+import importlib.util
+import sys
 from typing import List, Optional
 
+from .utils import installed_version, lazy_import
+
 core = [
-    "dplyr", "climateR", "nhdplusTools", "hydrofab", "zonal", 
+    "dplyr", "climateR", "nhdplusTools", "hydrofab", "zonal",
     "hfsubsetR", "ngen.hydrofab", "sf", "terra"
 ]
 
 def core_unloaded() -> List[str]:
-    loaded_packages = {pkg.key for pkg in pkg_resources.working_set}
-    return [pkg for pkg in core if pkg not in loaded_packages]
+    return [pkg for pkg in core if pkg not in sys.modules]
 
 def same_library(pkg: str) -> Optional[str]:
+    # Only check that the package can be found; the import itself is deferred
+    # until the package is first used.
     try:
-        return importlib.import_module(pkg)
-    except ImportError:
+        found = importlib.util.find_spec(pkg) is not None
+    except (ImportError, ValueError):
+        found = False
+
+    if not found:
         print(f"Package '{pkg}' could not be found.")
         return None
+    return lazy_import(pkg)
 
 def hydrofabric_attach():
     to_load = core_unloaded()
-    
+
     if not to_load:
         return
 
     print("Attaching packages:")
-    
-    versions = {pkg: pkg_resources.get_distribution(pkg).version for pkg in to_load}
+
+    versions = {pkg: installed_version(pkg) for pkg in to_load}
     for pkg in to_load:
         version = versions[pkg]
         print(f"{pkg}: {version}")
@@ -35,10 +42,12 @@ def hydrofabric_attach():
         same_library(pkg)
 
 def package_version(pkg_name: str) -> str:
-    version = pkg_resources.get_distribution(pkg_name).version
+    version = installed_version(pkg_name)
+    if version is None:
+        raise ValueError(f"Package '{pkg_name}' is not installed.")
     version_parts = version.split('.')
-    
+
     # Format version with colors in console (using ANSI escape codes)
     if len(version_parts) > 3:
         version_parts[3:] = [f"\033[91m{part}\033[0m" for part in version_parts[3:]]  # red color
-    return ".".join(version_parts)
\ No newline at end of file
+    return ".".join(version_parts)
@@ -0,0 +1,406 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import multiprocessing
+
+from .utils import installed_version, lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+gpd = lazy_import("geopandas")
+shapely = lazy_import("shapely")
+
+# Number of divides of each synthetic fabric scale (CONUS holds ~880k divides)
+SCALES = {"vpu": 20000, "region": 200000, "conus": 900000}
+
+# Number of VPUs the synthetic fabrics are split into
+NVPU = 21
+
+# Side of a synthetic divide (meters, EPSG:5070)
+CELL = 3000
+
+# Layers of the synthetic fabrics that have a QML style
+STYLED_LAYERS = ["divides", "flowpaths", "nexus"]
+
+# Round trip time (seconds) the stand-in server adds to remote reads
+REMOTE_LATENCY = 0.02
+
+# Distributions whose versions are recorded with the results
+RECORDED = ["numpy", "pandas", "geopandas", "pyarrow", "shapely", "pyogrio", "dask"]
+
+# Function to build a synthetic hydrofabric
+def synthetic_fabric(n, seed=0):
+    """
+    Builds a synthetic hydrofabric of n divides laid out on a square grid.
+
+    Every divide drains through a nexus on its west edge into the flowpath of
+    its western neighbour; the first column drains to terminal nexuses. VPUs are
+    vertical bands of the grid. Attribute values are drawn from a seeded RNG,
+    so the same n and seed always give the same fabric.
+
+    Parameters:
+    n (int): Number of divides
+    seed (int, optional): RNG seed, defaults to 0
+
+    Returns:
+    dict: divides, flowpaths and nexus GeoDataFrames and the network DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    ncol = int(np.ceil(np.sqrt(n)))
+    i = np.arange(n)
+    row, col = np.divmod(i, ncol)
+
+    x0, y0 = col * CELL, row * CELL
+    vpuid = np.char.zfill((col * NVPU // ncol + 1).astype(str), 2)
+
+    ids = np.char.add("wb-", (i + 1).astype(str))
+    divide_ids = np.char.add("cat-", (i + 1).astype(str))
+    nexus_ids = np.char.add("nex-", (i + 1).astype(str))
+    toids = np.where(col > 0, np.char.add("wb-", i.astype(str)), np.char.add("tnx-", (i + 1).astype(str)))
+
+    areasqkm = rng.uniform(0.5, 1.0, n) * (CELL / 1000) ** 2
+    lengthkm = rng.uniform(0.5, 1.5, n) * CELL / 1000
+    crs = "EPSG:5070"
+
+    divides = gpd.GeoDataFrame({
+        "divide_id": divide_ids, "toid": nexus_ids, "type": "network", "id": ids,
+        "areasqkm": areasqkm, "vpuid": vpuid,
+    }, geometry=shapely.box(x0, y0, x0 + CELL, y0 + CELL), crs=crs)
+
+    cx, cy = x0 + CELL / 2, y0 + CELL / 2
+    flowpaths = gpd.GeoDataFrame({
+        "id": ids, "toid": nexus_ids, "divide_id": divide_ids, "mainstem": row + 1,
+        "lengthkm": lengthkm, "areasqkm": areasqkm, "vpuid": vpuid,
+    }, geometry=shapely.linestrings(np.stack([np.stack([cx, cy], 1), np.stack([x0, cy], 1)], 1)), crs=crs)
+
+    nexus = gpd.GeoDataFrame({
+        "id": nexus_ids, "toid": toids, "type": np.where(col > 0, "nexus", "terminal"), "vpuid": vpuid,
+    }, geometry=shapely.points(x0, cy), crs=crs)
+
+    network = pd.DataFrame({
+        "id": ids, "toid": nexus_ids, "divide_id": divide_ids, "ds_id": toids,
+        "hf_id": i + 1, "lengthkm": lengthkm, "areasqkm": areasqkm, "vpuid": vpuid,
+    })
+
+    return {"divides": divides, "flowpaths": flowpaths, "nexus": nexus, "network": network}
+
+# Function to write a synthetic hydrofabric to GeoPackage and GeoParquet
+def write_fabric(n, outdir, seed=0):
+    """
+    Writes a synthetic hydrofabric of n divides, unless it already exists.
+
+    Writes {outdir}/fabric-{n}-{seed}.gpkg and the matching vpuid-partitioned
+    GeoParquet datasets in {outdir}/fabric-{n}-{seed}/{layer}.
+
+    Parameters:
+    n (int): Number of divides
+    outdir (str): Directory to write to
+    seed (int, optional): RNG seed, defaults to 0
+
+    Returns:
+    dict: Paths of the GeoPackage ("gpkg") and the parquet directory ("parquet"),
+        the number of divides ("n") and the fabric extent ("bounds")
+    """
+    from .package import gpkg_to_geoparquet
+    from .sqlite import close_gpkgs
+
+    name = f"fabric-{n}-{seed}"
+    gpkg = os.path.join(outdir, f"{name}.gpkg")
+    parquet = os.path.join(outdir, name)
+    ncol = int(np.ceil(np.sqrt(n)))
+    fabric = {
+        "gpkg": gpkg, "parquet": parquet, "n": n,
+        "bounds": [0, 0, ncol * CELL, int(np.ceil(n / ncol)) * CELL]
+    }
+
+    if os.path.exists(gpkg) and os.path.isdir(parquet):
+        return fabric
+
+    os.makedirs(outdir, exist_ok=True)
+    tmp = os.path.join(outdir, f"{name}.tmp.gpkg")
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    for layer, df in synthetic_fabric(n, seed).items():
+        if isinstance(df, gpd.GeoDataFrame):
+            df.to_file(tmp, layer=layer, driver="GPKG")
+        else:
+            gpd.GeoDataFrame(df).to_file(tmp, layer=layer, driver="GPKG")
+
+    shutil.rmtree(parquet, ignore_errors=True)
+    gpkg_to_geoparquet(tmp, parquet)
+    close_gpkgs()
+    os.replace(tmp, gpkg)
+
+    return fabric
+
+# Function to build a mask covering a fraction of a fabric
+def center_mask(fabric, fraction=0.01):
+    """
+    Returns a square mask centered on a fabric, covering a fraction of its extent.
+    """
+    xmin, ymin, xmax, ymax = fabric["bounds"]
+    half = np.sqrt(fraction) / 2
+    dx, dy = (xmax - xmin) * half, (ymax - ymin) * half
+    cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+    return gpd.GeoDataFrame(geometry=[shapely.box(cx - dx, cy - dy, cx + dx, cy + dy)], crs="EPSG:5070")
+
+# Benchmark cases: each one prepares its inputs (untimed) and returns the timed
+# call, which returns the number of rows it processed
+def case_as_sqlite(fabric):
+    from .sqlite import as_sqlite, close_gpkgs, read_sf_dataset_sqlite
+
+    close_gpkgs()
+
+    def run():
+        return len(read_sf_dataset_sqlite(as_sqlite(fabric["gpkg"], "divides"), "divides"))
+    return run
+
+def case_read_sf_dataset_sqlite_bbox(fabric):
+    from .sqlite import as_sqlite, read_sf_dataset_sqlite
+
+    conn = as_sqlite(fabric["gpkg"], "divides")
+    bbox = tuple(center_mask(fabric).total_bounds)
+
+    def run():
+        return len(read_sf_dataset_sqlite(conn, "divides", columns=["divide_id", "vpuid"], bbox=bbox))
+    return run
+
+def case_mask_hydrofabric(fabric):
+    from .mask_hydrofabric import mask_hydrofabric
+
+    mask = center_mask(fabric)
+
+    def run():
+        return sum(len(layer) for layer in mask_hydrofabric(fabric["gpkg"], mask).values())
+    return run
+
+def case_read_parquet(fabric):
+    from .package import read_parquet
+
+    def run():
+        return len(read_parquet(os.path.join(fabric["parquet"], "divides")))
+    return run
+
+def case_read_parquet_filter(fabric):
+    from .package import read_parquet
+
+    def run():
+        return len(read_parquet(os.path.join(fabric["parquet"], "divides"), filters={"vpuid": "01"}))
+    return run
+
+def case_open_dataset_bbox(fabric):
+    from .package import open_dataset
+
+    bbox = tuple(center_mask(fabric).total_bounds)
+
+    def run():
+        return len(open_dataset(os.path.join(fabric["parquet"], "divides"), bbox=bbox).compute())
+    return run
+
+def case_read_remote_parquet_bbox(fabric):
+    from .remote import read_remote_parquet, serve_directory
+
+    server = serve_directory(fabric["parquet"], latency=REMOTE_LATENCY)
+    bbox = tuple(center_mask(fabric).total_bounds)
+
+    def run():
+        # Cold read: no block cache
+        return len(read_remote_parquet(f"{server.url}/divides", bbox=bbox, cache_dir=False))
+    return run
+
+def case_append_style(fabric):
+    from .qml import append_style
+
+    gpkg = fabric["gpkg"] + ".styled.gpkg"
+    shutil.copyfile(fabric["gpkg"], gpkg)
+
+    def run():
+        append_style(gpkg, layer_names=STYLED_LAYERS)
+        return len(STYLED_LAYERS)
+    return run
+
+CASES = {
+    "as_sqlite": case_as_sqlite,
+    "read_sf_dataset_sqlite_bbox": case_read_sf_dataset_sqlite_bbox,
+    "mask_hydrofabric": case_mask_hydrofabric,
+    "read_parquet": case_read_parquet,
+    "read_parquet_filter": case_read_parquet_filter,
+    "open_dataset_bbox": case_open_dataset_bbox,
+    "read_remote_parquet_bbox": case_read_remote_parquet_bbox,
+    "append_style": case_append_style,
+}
+
+# Function to read the peak resident set size of the current process
+def peak_rss():
+    """
+    Returns the peak resident set size of the current process in bytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+# Function to time one benchmark case
+def time_case(case, fabric, repeat=3):
+    """
+    Times a benchmark case, preparing its inputs afresh before every repeat.
+
+    Meant to run in its own process, so the peak RSS belongs to this case only.
+    A failing case returns its error as a string instead of raising, so it cannot
+    abort the rest of the run.
+
+    Returns:
+    dict: Timings (seconds), rows processed, peak RSS (bytes) and error (None
+        if the case ran)
+    """
+    seconds = []
+    rows = None
+
+    try:
+        for _ in range(repeat):
+            run = CASES[case](fabric)
+            start = time.perf_counter()
+            rows = run()
+            seconds.append(time.perf_counter() - start)
+    except Exception as e:
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        return {"seconds": [], "rows": None, "peak_rss": peak_rss(), "error": error}
+
+    return {"seconds": seconds, "rows": rows, "peak_rss": peak_rss(), "error": None}
+
+# Function to run the benchmark suite
+def run_benchmarks(scales=("vpu",), cases=None, repeat=3, data_dir=None, seed=0):
+    """
+    Runs the benchmark cases against synthetic fabrics of the given scales.
+
+    Fabrics are written once to data_dir and reused by later runs. Each case runs
+    in a fresh process so peak RSS is measured per case. Cases that fail (or whose
+    process dies) are recorded with their error and no timings.
+
+    Parameters:
+    scales (list, optional): Keys of SCALES or divide counts, defaults to ("vpu",)
+    cases (list, optional): Keys of CASES, defaults to None (all)
+    repeat (int, optional): Timed repeats per case, defaults to 3
+    data_dir (str, optional): Directory holding the fabrics, defaults to a
+        hydrofabric-benchmark directory in the system temp directory
+    seed (int, optional): RNG seed of the fabrics, defaults to 0
+
+    Returns:
+    dict: Run metadata ("metadata") and one record per case and scale ("results")
+    """
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), "hydrofabric-benchmark")
+    cases = list(cases or CASES)
+    results = []
+
+    for scale in scales:
+        n = SCALES[scale] if scale in SCALES else int(scale)
+        fabric = write_fabric(n, data_dir, seed)
+
+        for case in cases:
+            context = multiprocessing.get_context("spawn")
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    timing = pool.submit(time_case, case, fabric, repeat).result()
+            except Exception as e:
+                # The worker itself died (e.g. it was killed or crashed)
+                error = "".join(traceback.format_exception_only(type(e), e)).strip()
+                timing = {"seconds": [], "rows": None, "peak_rss": None, "error": error}
+
+            best = min(timing["seconds"]) if timing["seconds"] else None
+            results.append({
+                "case": case, "scale": str(scale), "n": n, "rows": timing["rows"],
+                "seconds": timing["seconds"], "best": best,
+                "median": float(np.median(timing["seconds"])) if timing["seconds"] else None,
+                "throughput": timing["rows"] / best if best else None,
+                "peak_rss_mb": timing["peak_rss"] / 2 ** 20 if timing["peak_rss"] else None,
+                "error": timing["error"],
+            })
+
+    metadata = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "repeat": repeat,
+        "versions": {pkg: installed_version(pkg) for pkg in RECORDED},
+    }
+
+    return {"metadata": metadata, "results": results}
+
+# Function to compare two benchmark result files
+def compare_results(baseline, current, tolerance=0.1):
+    """
+    Compares two benchmark runs case by case.
+
+    Parameters:
+    baseline (dict or str): Results (or path to a results file) to compare against
+    current (dict or str): Results (or path to a results file) to compare
+    tolerance (float, optional): Relative slowdown or peak RSS growth flagged as a
+        regression, defaults to 0.1
+
+    Returns:
+    pd.DataFrame: One row per case and scale that ran in both runs, with time and
+        peak RSS ratios (current / baseline) and a regression flag
+    """
+    runs = []
+    for results in (baseline, current):
+        if isinstance(results, str):
+            with open(results) as f:
+                results = json.load(f)
+        df = pd.DataFrame(results["results"])
+        runs.append(df[df["best"].notna()].set_index(["case", "scale"]))
+
+    base, cur = runs
+    cmp = base[["best", "peak_rss_mb"]].join(cur[["best", "peak_rss_mb"]], lsuffix="_baseline", how="inner")
+    cmp = cmp.rename(columns={"best": "best_current", "peak_rss_mb": "peak_rss_mb_current"})
+    cmp["time_ratio"] = cmp["best_current"] / cmp["best_baseline"]
+    cmp["rss_ratio"] = cmp["peak_rss_mb_current"] / cmp["peak_rss_mb_baseline"]
+    cmp["regression"] = (cmp["time_ratio"] > 1 + tolerance) | (cmp["rss_ratio"] > 1 + tolerance)
+
+    return cmp.reset_index()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark hydrofabric I/O and subsetting.")
+    parser.add_argument("--scales", nargs="+", default=["vpu"],
+                        help=f"fabric scales ({', '.join(SCALES)}) or divide counts")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="cases to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repeats per case")
+    parser.add_argument("--data-dir", help="directory holding the synthetic fabrics")
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed of the fabrics")
+    parser.add_argument("--out", default="benchmark.json", help="results file to write")
+    parser.add_argument("--compare", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative regression tolerance")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.cases, args.repeat, args.data_dir, args.seed)
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for r in results["results"]:
+        if r["error"]:
+            print(f"{r['case']:<28} {r['scale']:>8} failed: {r['error']}")
+            continue
+        print(f"{r['case']:<28} {r['scale']:>8} {r['best']:>10.3f}s {r['throughput'] or 0:>14.0f} rows/s "
+              f"{r['peak_rss_mb']:>9.1f} MB")
+
+    failed = any(r["error"] for r in results["results"])
+
+    if args.compare:
+        cmp = compare_results(args.compare, results, args.tolerance)
+        print(cmp.to_string(index=False))
+        return 1 if failed or cmp["regression"].any() else 0
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from .profiling import span
+from .utils import lazy_import
+
+# Heavy libraries are only imported once the cache is used
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+gpd = lazy_import("geopandas")
+shapely = lazy_import("shapely")
+
+# Default bound of the cache size in bytes
+MAX_BYTES = 8 << 30
+
+# Envelope columns stored next to the geometry of cached spatial layers
+BOUNDS = ["hf_xmin", "hf_ymin", "hf_xmax", "hf_ymax"]
+
+# Cache state. Set HYDROFABRIC_CACHE=<directory> to enable it at import (process
+# pool workers inherit it) and HYDROFABRIC_CACHE_BYTES to bound its size.
+_cache = None
+_lock = threading.Lock()
+
+# Cache of decoded layers stored as memory-mapped Arrow IPC files
+class LayerCache:
+    """
+    Size-bounded cache of decoded layers.
+
+    Each entry is one uncompressed Arrow IPC file named after its source, the
+    request (layer, projected columns) and the source's (mtime_ns, size) stamp.
+    Entries are memory mapped, so warm reads skip SQLite and Parquet decoding and
+    the pages are shared by every worker process using the same directory. Rows
+    are still converted to pandas, and geometries decoded from WKB, on every read
+    (after any bbox filter, so only for the rows returned). Entries mapped by
+    this process are kept in an in-process LRU; on disk, the least recently used
+    entries (by file modification time, refreshed on every hit) are evicted once
+    the directory exceeds max_bytes.
+
+    Parameters:
+    path (str): Cache directory, created if needed
+    max_bytes (int, optional): Size bound of the cache, defaults to MAX_BYTES
+    """
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = os.path.realpath(path)
+        self.max_bytes = int(max_bytes)
+        self._tables = OrderedDict()
+        self._bytes = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def entry(self, source, stamp, parts):
+        """
+        Returns the entry prefix of a request and its file name for a source stamp.
+
+        Parameters:
+        source (str): Resolved path of the source file or dataset
+        stamp (tuple): (mtime_ns, size) of the source
+        parts (tuple): Request the entry holds, e.g. ("gpkg", layer, columns)
+
+        Returns:
+        tuple: Prefix (str) and file name (str)
+        """
+        prefix = hashlib.sha1(repr((source, parts)).encode()).hexdigest()
+        return prefix, f"{prefix}-{stamp[0]}-{stamp[1]}.arrow"
+
+    def table(self, source, stamp, parts, load):
+        """
+        Returns the table of a request, materializing it with load on a miss.
+
+        Entries of the same request made for other stamps of the source are
+        stale and removed on a miss. The entry being returned is never evicted
+        to make room for itself; a table larger than max_bytes is returned
+        without being cached.
+
+        Parameters:
+        source (str): Resolved path of the source file or dataset
+        stamp (tuple): (mtime_ns, size) of the source
+        parts (tuple): Request the entry holds
+        load (callable): Function returning the pa.Table of the request
+
+        Returns:
+        pa.Table: Memory-mapped table (or the loaded table if it could not be cached)
+        """
+        prefix, name = self.entry(source, stamp, parts)
+        file = os.path.join(self.path, name)
+
+        with span("cache_read", source=source) as s:
+            table = self.get(name)
+            s.set(hit=table is not None)
+
+            if table is None:
+                self.invalidate(prefix, keep=name)
+                loaded = load()
+
+                if loaded.nbytes <= self.max_bytes:
+                    self.put(file, loaded)
+                    table = self.get(name)
+
+                # Too large to cache, or evicted by another process meanwhile
+                if table is None:
+                    table = loaded
+
+            s.set(rows=table.num_rows, bytes=table.nbytes)
+
+        return table
+
+    def get(self, name):
+        """
+        Returns a cached table, mapping its file if this process has not yet.
+
+        Parameters:
+        name (str): Entry file name
+
+        Returns:
+        pa.Table or None: Memory-mapped table, None on a miss
+        """
+        file = os.path.join(self.path, name)
+
+        with _lock:
+            table = self._tables.get(name)
+            if table is not None:
+                self._tables.move_to_end(name)
+
+        try:
+            # Refresh the entry in the shared LRU order
+            os.utime(file)
+        except FileNotFoundError:
+            if table is None:
+                return None
+
+        if table is None:
+            try:
+                table = pa.ipc.open_file(pa.memory_map(file)).read_all()
+            except (FileNotFoundError, pa.ArrowInvalid):
+                return None
+
+            with _lock:
+                if name not in self._tables:
+                    self._tables[name] = table
+                    self._bytes += table.nbytes
+                self._release()
+
+        return table
+
+    def put(self, file, table):
+        """
+        Writes a table as an entry, then evicts entries beyond the size bound.
+
+        The file is written under a temporary name and moved into place, so
+        other processes never map a partial entry.
+
+        Parameters:
+        file (str): Entry file
+        table (pa.Table): Table to store
+        """
+        tmp = f"{file}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+        try:
+            with span("cache_write", file=file) as s:
+                with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+                os.replace(tmp, file)
+                s.set(rows=table.num_rows, bytes=os.path.getsize(file))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        self.evict(keep=os.path.basename(file))
+
+    def invalidate(self, prefix, keep=None):
+        """
+        Removes the entries of a request, except keep.
+
+        Parameters:
+        prefix (str): Entry prefix of the request
+        keep (str, optional): Entry file name to keep, defaults to None
+        """
+        for name in os.listdir(self.path):
+            if name.startswith(prefix + "-") and name != keep:
+                self.remove(name)
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used entries until the directory fits max_bytes.
+
+        Parameters:
+        keep (str, optional): Entry file name never removed, defaults to None
+        """
+        entries = []
+        for item in os.scandir(self.path):
+            try:
+                st = item.stat()
+            except FileNotFoundError:
+                continue
+            if item.name.endswith(".arrow") and item.name != keep:
+                entries.append((st.st_mtime_ns, st.st_size, item.name))
+
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and os.path.exists(os.path.join(self.path, keep)):
+            total += os.path.getsize(os.path.join(self.path, keep))
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(name)
+            total -= size
+
+    def remove(self, name):
+        """
+        Removes an entry. Tables already mapped by other processes stay readable.
+        """
+        with _lock:
+            table = self._tables.pop(name, None)
+            if table is not None:
+                self._bytes -= table.nbytes
+
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        for name in os.listdir(self.path):
+            if name.endswith(".arrow"):
+                self.remove(name)
+
+    def _release(self):
+        # Unmap the least recently used tables beyond the size bound (lock held)
+        while self._bytes > self.max_bytes and len(self._tables) > 1:
+            _, table = self._tables.popitem(last=False)
+            self._bytes -= table.nbytes
+
+# Function to turn the layer cache on
+def enable_cache(path, max_bytes=MAX_BYTES):
+    """
+    Starts caching decoded layers read by read_sf_dataset_sqlite, read_parquet and
+    mask_hydrofabric.
+
+    Parameters:
+    path (str): Cache directory, shared by the processes using it
+    max_bytes (int, optional): Size bound of the cache, defaults to MAX_BYTES
+
+    Returns:
+    LayerCache: The cache
+    """
+    global _cache
+    _cache = LayerCache(path, max_bytes)
+    return _cache
+
+# Function to turn the layer cache off
+def disable_cache():
+    """
+    Stops caching. Entries are kept on disk for later use.
+    """
+    global _cache
+    _cache = None
+
+def get_cache():
+    return _cache
+
+if os.environ.get("HYDROFABRIC_CACHE"):
+    enable_cache(os.environ["HYDROFABRIC_CACHE"], int(os.environ.get("HYDROFABRIC_CACHE_BYTES", MAX_BYTES)))
+
+# Function to stamp a source file or dataset directory
+def source_stamp(path, files=None):
+    """
+    Returns the (mtime_ns, size) stamp cache entries are invalidated by.
+
+    Datasets are stamped by their latest file modification time and total size.
+
+    Parameters:
+    path (str): Source file or dataset directory
+    files (list, optional): Files of a dataset, defaults to None (path itself)
+
+    Returns:
+    tuple: (mtime_ns, size)
+    """
+    stats = [os.stat(file) for file in (files or [path])]
+    return max(st.st_mtime_ns for st in stats), sum(st.st_size for st in stats)
+
+# Function to convert a (Geo)DataFrame into a cacheable arrow table
+def frame_to_table(df):
+    """
+    Converts a layer into an arrow table, encoding its geometry as WKB with the
+    GeoParquet metadata and adding its envelopes as the BOUNDS columns.
+
+    Parameters:
+    df (pd.DataFrame or gpd.GeoDataFrame): Layer
+
+    Returns:
+    pa.Table: Table
+    """
+    if not isinstance(df, gpd.GeoDataFrame):
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    table = pa.table(df.to_arrow(index=False, geometry_encoding="WKB"))
+    bounds = shapely.bounds(df.geometry.values)
+
+    for i, name in enumerate(BOUNDS):
+        table = table.append_column(name, pa.array(bounds[:, i]))
+
+    return table
+
+# Function to convert a cached arrow table back into a (Geo)DataFrame
+def table_to_frame(table):
+    """
+    Converts a table made by frame_to_table back into a (Geo)DataFrame.
+
+    Parameters:
+    table (pa.Table): Table
+
+    Returns:
+    pd.DataFrame or gpd.GeoDataFrame: Layer
+    """
+    table = table.drop_columns([name for name in BOUNDS if name in table.column_names])
+
+    # Geometry columns are tagged with their geoarrow extension type
+    if any((field.metadata or {}).get(b"ARROW:extension:name", b"").startswith(b"geoarrow.") for field in table.schema):
+        return gpd.GeoDataFrame.from_arrow(table)
+
+    return table.to_pandas()
+
+# Function to select the rows of a cached table intersecting a bounding box
+def filter_bbox(table, bbox):
+    """
+    Keeps the rows whose envelope intersects a bounding box, as the rtree does.
+
+    Parameters:
+    table (pa.Table): Table made by frame_to_table
+    bbox (tuple): (xmin, ymin, xmax, ymax)
+
+    Returns:
+    pa.Table: Matching rows
+    """
+    xmin, ymin, xmax, ymax = map(float, bbox)
+    keep = pc.and_(
+        pc.and_(pc.less_equal(table["hf_xmin"], xmax), pc.greater_equal(table["hf_xmax"], xmin)),
+        pc.and_(pc.less_equal(table["hf_ymin"], ymax), pc.greater_equal(table["hf_ymax"], ymin)),
+    )
+    return table.filter(keep)
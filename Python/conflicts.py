@@ -1,56 +1,122 @@
-import importlib
-import inspect
+import sys
+import weakref
 from collections import defaultdict
 from typing import List, Dict, Optional
 
 core = ["dplyr", "climateR", "nhdplusTools", "hydrofab", "zonal", 
         "hfsubsetR", "ngen.hydrofab", "sf", "terra"]
 
-def ls_env(module_name: str) -> List[str]:
+# Cached exports of indexed modules: module name -> (identity, public names)
+_exports = {}
+
+# Modules exporting each name: name -> {module name: identity of the exported callable}
+_index = defaultdict(dict)
+
+def ls_env(module_name: str, module=None) -> List[str]:
+    if module is None:
+        module = sys.modules.get(module_name)
+    if module is None:
+        return []
+
+    # vars() rather than dir()/getattr so lazily resolved attributes are not loaded
     try:
-        module = importlib.import_module(module_name)
-    except ImportError:
+        x = [item for item in vars(module) if not item.startswith("_")]
+    except TypeError:
         return []
-    
-    x = dir(module)
 
     # Simulate removing specific functions based on environment
     if module_name in ["dplyr", "lubridate"]:
         x = [item for item in x if item not in ["intersect", "setdiff", "setequal", "union"]]
-    
+
     if module_name == "lubridate":
         x = [item for item in x if item not in ["as_difftime", "date"]]
-    
+
     return x
 
-def hydrofabric_conflicts(only: Optional[List[str]] = None) -> Dict[str, List[str]]:
-    # Get list of loaded modules (simulating environments)
-    loaded_modules = list(sys.modules.keys())
-    
-    if only:
-        only = set(only).union(core)
-        loaded_modules = [mod for mod in loaded_modules if mod in only]
+def export_identity(obj) -> Optional[tuple]:
+    # id() is stable here: the indexed module keeps the object alive until it is re-indexed
+    if not callable(obj):
+        return None
+    return (id(obj), getattr(obj, "__module__", None), getattr(obj, "__qualname__", None))
 
-    # Check objects across environments and find conflicts
-    objs = defaultdict(list)
-    
-    for module_name in loaded_modules:
-        module_objects = ls_env(module_name)
-        for obj in module_objects:
-            objs[obj].append(module_name)
-    
-    # Find conflicts (objects that exist in more than one module)
-    conflicts = {k: v for k, v in objs.items() if len(v) > 1}
+def module_identity(module) -> tuple:
+    # A weak reference rather than id(), which a replacement module may reuse
+    return (weakref.ref(module), getattr(module, "__version__", None))
+
+def is_indexed(module_name: str, module) -> bool:
+    cached = _exports.get(module_name)
+    if cached is None or module is None:
+        return cached is None and module is None
+
+    ref, version = cached[0]
+    return ref() is module and version == getattr(module, "__version__", None)
+
+def index_module(module_name: str, module=None) -> None:
+    """
+    Adds a loaded module to the conflict index, or refreshes it if the module was
+    reloaded or replaced since it was indexed.
+    """
+    if module is None:
+        module = sys.modules.get(module_name)
+
+    if is_indexed(module_name, module):
+        return
+
+    cached = _exports.get(module_name)
+    if cached is not None:
+        for name in cached[1]:
+            _index[name].pop(module_name, None)
 
-    # Filter conflicts involving core hydrofabric packages
-    hydrofabric_pkgs = [pkg for pkg in loaded_modules if pkg in core]
-    conflicts = {k: v for k, v in conflicts.items() if any(pkg in hydrofabric_pkgs for pkg in v)}
+    if module is None:
+        _exports.pop(module_name, None)
+        return
 
-    # Filter out common base libraries and return conflicts
+    exports = ls_env(module_name, module)
+    namespace = vars(module)
+    for name in exports:
+        _index[name][module_name] = export_identity(namespace.get(name))
+
+    _exports[module_name] = (module_identity(module), exports)
+
+def update_conflict_index(packages: List[str]) -> None:
+    """
+    Indexes the given packages that were loaded (or reloaded) since the last update
+    and drops the ones that were unloaded. Other modules are never scanned.
+    """
+    for module_name in packages:
+        index_module(module_name, sys.modules.get(module_name))
+
+def hydrofabric_conflicts(only: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """
+    Finds the names exported by more than one of the core packages (and the
+    packages in `only`), listing the packages in that order.
+
+    Only packages that are already imported are reported on (like attached
+    packages in R): checking for conflicts never imports a package.
+    """
+    scope = list(dict.fromkeys(core + list(only or [])))
+    update_conflict_index(scope)
+
+    # Filter out common base libraries
     excluded_pkgs = {'hydrofabric', 'base', 'stats', 'graphics', 'utils', 'grDevices', 'testthat'}
-    filtered_conflicts = {k: [pkg for pkg in v if pkg not in excluded_pkgs] for k, v in conflicts.items()}
-    
-    return {k: v for k, v in filtered_conflicts.items() if len(v) > 1}
+
+    # Only names exported by loaded core packages can conflict
+    conflicts = {}
+    for pkg in core:
+        if pkg not in _exports:
+            continue
+
+        for name in _exports[pkg][1]:
+            if name in conflicts:
+                continue
+            pkgs = [
+                mod for mod in scope
+                if mod in _index[name] and mod not in excluded_pkgs
+            ]
+            if len(pkgs) > 1:
+                conflicts[name] = pkgs
+
+    return conflicts
 
 def hydrofabric_conflict_message(conflicts: Dict[str, List[str]]) -> str:
     if not conflicts:
@@ -72,24 +138,24 @@ def print_hydrofabric_conflicts(conflicts: Dict[str, List[str]], startup: bool =
     print(message)
 
 def confirm_conflict(packages: List[str], name: str) -> Optional[List[str]]:
-    objs = []
-    
-    # Retrieve functions dynamically from the loaded packages
-    for pkg in packages:
-        try:
-            module = importlib.import_module(pkg)
-            obj = getattr(module, name, None)
-            if callable(obj):
-                objs.append(obj)
-        except ImportError:
-            continue
+    """
+    Confirms that packages export different callables under a name.
+
+    The answer comes from the index: the identity of each export is recorded when
+    its module is indexed, and modules are only re-indexed when they are
+    replaced, reloaded or change version. Packages that are not loaded are
+    skipped, they are never imported.
+    """
+    update_conflict_index(packages)
+
+    # Identities of the callables exported under the name
+    exported = _index.get(name, {})
+    identities = [exported[pkg] for pkg in packages if exported.get(pkg) is not None]
+
+    # Filter out identical functions
+    if len(identities) > 1 and any(identity != identities[0] for identity in identities[1:]):
+        return packages
 
-    # Filter out identical functions (based on memory address comparison)
-    if len(objs) > 1:
-        unique_objs = list({id(obj): obj for obj in objs}.values())
-        if len(unique_objs) > 1:
-            return packages
-    
     return None
 
 """Example usage
@@ -0,0 +1,179 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import repeat
+import numpy as np
+import pandas as pd
+
+from .package import read_parquet, write_parquet
+from .zonal import weight_matrix
+
+# Maximum number of grid values held per read (time steps x variables x covered cells)
+BLOCK_SIZE = 1 << 27
+
+# Function to load forcing weights as a sparse matrix over the covered cells
+def forcing_matrix(weights, ncells, ID="divide_id", grid_id=None):
+    """
+    Loads a forcing weights Parquet (e.g. forcing_weights.parquet) as a sparse matrix.
+
+    Only the cells covered by at least one divide are kept as columns, and rows are
+    summed to normalize the divide means.
+
+    Parameters:
+    weights (str or pd.DataFrame): Path to the weights, or the weights themselves
+    ncells (int): Number of cells of the forcing grid
+    ID (str, optional): Divide id column, defaults to "divide_id"
+    grid_id (str, optional): Grid to keep when the weights hold several, defaults to None
+
+    Returns:
+    tuple: Divide ids, covered cells (0-based), weight matrix and its row sums
+    """
+    if isinstance(weights, str):
+        filters = {"grid_id": grid_id} if grid_id else None
+        weights = read_parquet(weights, columns=[ID, "cell", "coverage_fraction"], filters=filters)
+    elif grid_id:
+        weights = weights[weights["grid_id"] == grid_id]
+
+    ids, W = weight_matrix(weights, ncells, ID)
+    cells = np.flatnonzero(W.getnnz(axis=0))
+    W = W[:, cells].astype(np.float32)
+
+    return ids, cells, W, np.asarray(W.sum(axis=1)).ravel()
+
+# Function to load forcing weights from a path once per process
+@lru_cache(maxsize=4)
+def read_forcing_matrix(path, ncells, ID="divide_id", grid_id=None):
+    return forcing_matrix(path, ncells, ID, grid_id)
+
+# Function to find the gridded variables of a forcing file
+def forcing_variables(nc, variables=None):
+    """
+    Finds the (time, y, x) variables of an open NetCDF forcing file.
+    """
+    if variables is None:
+        variables = [k for k, v in nc.variables.items() if v.ndim == 3]
+
+    missing = [v for v in variables if v not in nc.variables]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} not in {nc.filepath()}.")
+
+    return variables
+
+# Function to read the time coordinate of a forcing variable
+def forcing_times(nc, var):
+    """
+    Reads the time coordinate of a forcing variable as datetimes.
+    """
+    import netCDF4
+
+    dim = var.dimensions[0]
+
+    if dim not in nc.variables:
+        return pd.RangeIndex(var.shape[0])
+
+    t = nc.variables[dim]
+    return pd.DatetimeIndex(netCDF4.num2date(
+        t[:], t.units, getattr(t, "calendar", "standard"),
+        only_use_cftime_datetimes=False, only_use_python_datetimes=True
+    ))
+
+# Function to aggregate one forcing file onto divides
+def aggregate_forcing_file(file, weights, outfile, variables=None, ID="divide_id", grid_id=None):
+    """
+    Aggregates the gridded variables of one NetCDF forcing file onto divides.
+
+    The file is streamed in blocks of time steps; each block of every variable is
+    reduced to the covered cells and all variables are aggregated together with one
+    sparse matrix product. Missing cells are excluded from the divide means.
+
+    Parameters:
+    file (str): Path to the NetCDF forcing file
+    weights (str or pd.DataFrame): Forcing weights (see forcing_matrix)
+    outfile (str): Parquet file to write the divide time series to
+    variables (list, optional): Variables to aggregate, defaults to all (time, y, x) variables
+    ID (str, optional): Divide id column, defaults to "divide_id"
+    grid_id (str, optional): Grid to keep when the weights hold several, defaults to None
+
+    Returns:
+    str: outfile
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(file) as nc:
+        variables = forcing_variables(nc, variables)
+        first = nc.variables[variables[0]]
+        nt, ny, nx = first.shape
+        times = forcing_times(nc, first)
+
+        # Cells are numbered from the top-left corner; NetCDF forcings usually store y ascending
+        ydim = first.dimensions[1]
+        flip = ydim in nc.variables and nc.variables[ydim].size > 1 and nc.variables[ydim][1] > nc.variables[ydim][0]
+
+        load = read_forcing_matrix if isinstance(weights, str) else forcing_matrix
+        ids, cells, W, total = load(weights, ny * nx, ID, grid_id)
+        if flip:
+            rows, cols = np.divmod(cells, nx)
+            read = (ny - 1 - rows) * nx + cols
+        else:
+            read = cells
+
+        step = max(1, BLOCK_SIZE // max(1, len(cells) * len(variables)))
+
+        def chunks():
+            for t0 in range(0, nt, step):
+                t1 = min(nt, t0 + step)
+                X = np.empty((len(cells), (t1 - t0) * len(variables)), dtype=np.float32)
+
+                for i, v in enumerate(variables):
+                    block = nc.variables[v][t0:t1]
+                    block = np.ma.filled(block.astype(np.float32), np.nan).reshape(t1 - t0, -1)
+                    X[:, i::len(variables)] = block[:, read].T
+
+                missing = np.isnan(X)
+                if missing.any():
+                    out = (W @ np.where(missing, 0, X)) / (W @ (~missing).astype(np.float32))
+                else:
+                    out = (W @ X) / total[:, None]
+
+                out = out.reshape(len(ids), t1 - t0, len(variables))
+                df = pd.DataFrame({
+                    ID: np.tile(ids, t1 - t0),
+                    "time": np.repeat(times[t0:t1], len(ids))
+                })
+                for i, v in enumerate(variables):
+                    df[v] = out[:, :, i].T.ravel()
+
+                yield df
+
+        write_parquet(chunks(), outfile)
+
+    return outfile
+
+# Function to aggregate many forcing files onto divides
+def aggregate_forcing(files, weights, outdir, variables=None, ID="divide_id", grid_id=None, workers=None):
+    """
+    Aggregates a series of NetCDF forcing files onto divides, one Parquet per file.
+
+    Files are processed in parallel across a process pool. Pass the weights as a path
+    so each worker reads them once and reuses them for all of its files.
+
+    Parameters:
+    files (list): Paths to NetCDF forcing files
+    weights (str or pd.DataFrame): Forcing weights (e.g. forcing_weights.parquet)
+    outdir (str): Directory to write {file name}.parquet to
+    variables (list, optional): Variables to aggregate, defaults to all (time, y, x) variables
+    ID (str, optional): Divide id column, defaults to "divide_id"
+    grid_id (str, optional): Grid to keep when the weights hold several, defaults to None
+    workers (int, optional): Number of processes, defaults to None (serial)
+
+    Returns:
+    list: Paths to the written Parquet files
+    """
+    os.makedirs(outdir, exist_ok=True)
+    outfiles = [os.path.join(outdir, f"{os.path.splitext(os.path.basename(f))[0]}.parquet") for f in files]
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+        return list(run(aggregate_forcing_file, files, repeat(weights), outfiles,
+                        repeat(variables), repeat(ID), repeat(grid_id)))
@@ -0,0 +1,351 @@
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .profiling import span
+from .sqlite import read_sql
+from .writer import register_gpkg_functions
+
+# Identifier columns rewritten by the global ID stage and the ID space each one is in
+ID_COLUMNS = {"id": "id", "toid": "id", "divide_id": "id", "poi_id": "poi"}
+
+# Columns defining the identifiers of each ID space (toid only refers to them)
+ID_SOURCES = {"id": ["id", "divide_id"], "poi": ["poi_id"]}
+
+# Feature and attribute tables that are not hydrofabric layers (QGIS styles and projects)
+NON_HYDROFABRIC = {"layer_styles", "qgis_projects"}
+
+# Function to list the layers of a GeoPackage holding identifier columns
+def id_layers(conn, layers=None):
+    """
+    Lists the hydrofabric layers of a GeoPackage and the identifier columns
+    (ID_COLUMNS) they hold.
+
+    Only feature and attribute tables are considered, leaving out tiles and the
+    NON_HYDROFABRIC tables (e.g. layer_styles, whose id is its own primary key).
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to the GeoPackage
+    layers (list, optional): Layers to consider, defaults to None (all hydrofabric layers)
+
+    Returns:
+    dict: Identifier columns keyed by layer name
+    """
+    tables = [
+        table for (table,) in conn.execute(
+            "SELECT table_name FROM gpkg_contents WHERE data_type IN ('features', 'attributes')"
+        )
+        if table not in NON_HYDROFABRIC and (layers is None or table in layers)
+    ]
+
+    out = {}
+    for table in tables:
+        cols = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        present = [col for col in ID_COLUMNS if col in cols]
+        if present:
+            out[table] = present
+    return out
+
+# Function to read the identifier columns of every layer of a GeoPackage
+def read_id_columns(conn, layers):
+    """
+    Reads the rowid and identifier columns of each layer, without any geometry.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to the GeoPackage
+    layers (dict): Identifier columns keyed by layer name (see id_layers)
+
+    Returns:
+    dict: DataFrames with hf_rowid and the identifier columns keyed by layer name
+    """
+    out = {}
+    for layer, cols in layers.items():
+        select = ", ".join(f'"{col}"' for col in cols)
+        out[layer] = read_sql(f'SELECT rowid AS hf_rowid, {select} FROM "{layer}"', conn, layer=layer)
+    return out
+
+# Function to get the sorted unique identifiers of a set of columns
+def unique_ids(values):
+    """
+    Returns the sorted unique non-missing values of a list of identifier arrays.
+
+    Parameters:
+    values (list): Identifier arrays
+
+    Returns:
+    np.ndarray: Sorted unique identifiers
+    """
+    if not values:
+        return np.array([])
+
+    ids = pd.Series(np.concatenate(values)).dropna().unique()
+    return np.sort(ids)
+
+# Function to remap identifiers to their position in a sorted set
+def remap_ids(values, ids, offset):
+    """
+    Maps identifiers to offset + 1 + their position in a sorted unique set.
+
+    Identifiers found through np.searchsorted; missing values and identifiers not
+    in the set map to 0 (no identifier, e.g. a terminal toid).
+
+    Parameters:
+    values (array-like): Identifiers to remap
+    ids (np.ndarray): Sorted unique identifiers (see unique_ids)
+    offset (int): Global identifier preceding the first one of the set
+
+    Returns:
+    np.ndarray: Global identifiers (int64)
+    """
+    values = pd.Series(values)
+    valid = values.notna().to_numpy()
+    out = np.zeros(len(values), dtype=np.int64)
+
+    if not len(ids) or not valid.any():
+        return out
+
+    present = values[valid].to_numpy()
+    pos = np.searchsorted(ids, present)
+    found = ids[np.minimum(pos, len(ids) - 1)] == present
+
+    hit = np.flatnonzero(valid)[found]
+    out[hit] = offset + 1 + pos[found]
+    return out
+
+# Function to match reference COMIDs to the flowpaths holding them
+def member_flowpaths(flowpaths, comids):
+    """
+    Finds the flowpaths whose member_comid list holds any of a set of COMIDs.
+
+    Split flowlines are listed as COMID.part; they are matched on their COMID,
+    keeping the first flowpath (lowest id) holding each COMID.
+
+    Parameters:
+    flowpaths (pd.DataFrame): id and member_comid (comma separated) columns
+    comids (array-like): Reference COMIDs
+
+    Returns:
+    pd.DataFrame: comid and id columns
+    """
+    members = flowpaths[["id", "member_comid"]].dropna()
+    members = members.assign(comid=members["member_comid"].astype(str).str.split(",")).explode("comid")
+    members["comid"] = pd.to_numeric(members["comid"].str.strip(), errors="coerce").fillna(-1).astype(np.int64)
+
+    members = members[members["comid"].isin(np.asarray(comids, dtype=np.int64))]
+    return members.sort_values(["comid", "id"]).drop_duplicates("comid")[["comid", "id"]]
+
+# Function to collect the identifier sets of a GeoPackage (process pool entry point)
+def scan_identifiers(gpkg, comids=None, flowpath_layer="flowpaths", layers=None):
+    """
+    Reads the identifier sets of a GeoPackage.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    comids (np.ndarray, optional): COMIDs of the cross-VPU modifications, defaults to None
+    flowpath_layer (str, optional): Layer holding member_comid, defaults to "flowpaths"
+    layers (list, optional): Layers to read, defaults to None (see id_layers)
+
+    Returns:
+    dict: Sorted unique identifiers per ID space ("id", "poi") and the flowpaths
+        holding the COMIDs ("members")
+    """
+    conn = sqlite3.connect(Path(gpkg).resolve().as_uri() + "?mode=ro", uri=True)
+
+    try:
+        with span("scan_identifiers", gpkg=gpkg) as s:
+            layers = id_layers(conn, layers)
+            data = read_id_columns(conn, layers)
+
+            out = {
+                space: unique_ids([df[col].to_numpy() for df in data.values() for col in cols if col in df.columns])
+                for space, cols in ID_SOURCES.items()
+            }
+            s.set(rows=sum(len(df) for df in data.values()))
+
+            out["members"] = pd.DataFrame(columns=["comid", "id"])
+            if comids is not None and len(comids) and flowpath_layer in layers:
+                cols = [row[1] for row in conn.execute(f'PRAGMA table_info("{flowpath_layer}")')]
+                if "member_comid" in cols:
+                    fp = read_sql(f'SELECT "id", "member_comid" FROM "{flowpath_layer}"', conn, layer=flowpath_layer)
+                    out["members"] = member_flowpaths(fp, comids)
+    finally:
+        conn.close()
+
+    return out
+
+# Function to rewrite the identifiers of a GeoPackage in place (process pool entry point)
+def rewrite_identifiers(gpkg, ids, offsets, toids=None, outfile=None, layers=None):
+    """
+    Rewrites the identifier columns of the hydrofabric layers of a GeoPackage with
+    global identifiers.
+
+    Each layer's identifier columns are read, remapped in bulk (see remap_ids;
+    missing identifiers stay NULL),
+    loaded into a temporary table and written back with a single UPDATE ... FROM
+    per layer, all in one transaction. Geometries are never read.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    ids (dict): Sorted unique local identifiers per ID space
+    offsets (dict): Global identifier preceding the first one of each ID space
+    toids (pd.DataFrame, optional): Local id and global toid of the flowpaths draining
+        to another VPU, overriding their toid, defaults to None
+    outfile (str, optional): Path to write the rewritten GeoPackage to, defaults to
+        None (in place)
+    layers (list, optional): Layers to rewrite, defaults to None (see id_layers)
+
+    Returns:
+    int: Number of rows rewritten
+    """
+    if outfile is not None and os.path.realpath(outfile) != os.path.realpath(gpkg):
+        shutil.copyfile(gpkg, outfile)
+        gpkg = outfile
+
+    conn = sqlite3.connect(gpkg, isolation_level=None)
+    register_gpkg_functions(conn)
+    rows = 0
+
+    try:
+        with span("rewrite_identifiers", gpkg=gpkg) as s:
+            layers = id_layers(conn, layers)
+            data = read_id_columns(conn, layers)
+
+            conn.execute("BEGIN")
+            for layer, cols in layers.items():
+                df = data[layer]
+                new = {col: remap_ids(df[col].to_numpy(), ids[ID_COLUMNS[col]], offsets[ID_COLUMNS[col]])
+                       for col in cols}
+                missing = {col: df[col].isna().to_numpy() for col in cols}
+
+                # Cross-VPU connections
+                if toids is not None and len(toids) and "id" in cols and "toid" in cols:
+                    pos = pd.Index(toids["id"]).get_indexer(df["id"].to_numpy())
+                    new["toid"] = np.where(pos >= 0, toids["toid"].to_numpy()[pos], new["toid"])
+                    missing["toid"] = missing["toid"] & (pos < 0)
+
+                # Missing identifiers stay NULL
+                new = {col: np.where(missing[col], None, new[col]) for col in cols}
+
+                conn.execute("DROP TABLE IF EXISTS temp.hf_global")
+                conn.execute(f"CREATE TEMP TABLE hf_global (rid INTEGER PRIMARY KEY, {', '.join(f'c{i}' for i in range(len(cols)))})")
+                conn.executemany(
+                    f"INSERT INTO temp.hf_global VALUES ({', '.join('?' * (len(cols) + 1))})",
+                    zip(df["hf_rowid"].tolist(), *(new[col].tolist() for col in cols))
+                )
+
+                assign = ", ".join(f'"{col}" = g.c{i}' for i, col in enumerate(cols))
+                conn.execute(f'UPDATE "{layer}" SET {assign} FROM temp.hf_global g WHERE "{layer}".rowid = g.rid')
+                conn.execute(
+                    "UPDATE gpkg_contents SET last_change = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE table_name = ?",
+                    (layer,)
+                )
+                rows += len(df)
+
+            conn.execute("DROP TABLE IF EXISTS temp.hf_global")
+            conn.execute("COMMIT")
+            s.set(rows=rows)
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return rows
+
+# Function to assign global identifiers across VPU GeoPackages
+def assign_global_identifiers(gpkgs, outfiles=None, modifications=None, flowpath_layer="flowpaths", workers=None,
+                              layers=None):
+    """
+    Assigns contiguous global integer identifiers across a set of VPU GeoPackages.
+
+    Python counterpart of hydrofab::assign_global_identifiers (runners/05_global_id.R).
+    The identifiers of each VPU (union of its id and divide_id values, and its
+    poi_id values) are sorted and numbered after those of the previous VPUs, and
+    every id, toid, divide_id and poi_id column is remapped with np.searchsorted.
+    toids not found in their VPU become 0. Flowpaths draining to another VPU, as
+    listed in modifications, get the global id of the flowpath they drain to as toid.
+
+    Only the hydrofabric feature and attribute layers are rewritten (see id_layers),
+    so tables such as layer_styles keep their own keys and do not take identifiers.
+    Only identifier columns are read, so memory scales with them rather than the
+    geometries. VPUs are scanned and rewritten in parallel with a process pool.
+
+    Parameters:
+    gpkgs (list): Paths to the VPU GeoPackages
+    outfiles (list, optional): Paths to write the rewritten GeoPackages to, defaults
+        to None (rewrite in place)
+    modifications (pd.DataFrame, optional): Cross-VPU connections with from and to
+        COMID columns (the VPUID != toVPUID rows of the RouteLink VPU table), defaults to None
+    flowpath_layer (str, optional): Layer holding member_comid, defaults to "flowpaths"
+    workers (int, optional): Number of processes used, defaults to None (serial)
+    layers (list, optional): Layers to rewrite, defaults to None (all hydrofabric layers)
+
+    Returns:
+    pd.DataFrame: One row per GeoPackage with its identifier ranges and counts
+    """
+    gpkgs = list(gpkgs)
+    outfiles = list(outfiles) if outfiles is not None else [None] * len(gpkgs)
+
+    if len(outfiles) != len(gpkgs):
+        raise ValueError("gpkgs and outfiles must have the same length.")
+
+    comids = None
+    if modifications is not None and len(modifications):
+        comids = pd.unique(np.concatenate([
+            modifications["from"].to_numpy(dtype=np.int64), modifications["to"].to_numpy(dtype=np.int64)
+        ]))
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+
+        scans = list(run(scan_identifiers, gpkgs, repeat(comids), repeat(flowpath_layer), repeat(layers)))
+
+        # Contiguous ranges: each VPU starts after the previous ones
+        counts = {space: np.array([len(scan[space]) for scan in scans], dtype=np.int64) for space in ID_SOURCES}
+        starts = {space: np.concatenate([[0], np.cumsum(n)[:-1]]) for space, n in counts.items()}
+
+        # Global ids of the flowpaths holding the modification COMIDs
+        members = []
+        for i, scan in enumerate(scans):
+            m = scan["members"]
+            if len(m):
+                members.append(m.assign(vpu=i, global_id=remap_ids(m["id"].to_numpy(), scan["id"], starts["id"][i])))
+        members = pd.concat(members, ignore_index=True) if members else pd.DataFrame(columns=["comid", "id", "vpu", "global_id"])
+
+        toids = [None] * len(gpkgs)
+        if comids is not None and len(members):
+            mods = (
+                modifications[["from", "to"]].astype(np.int64)
+                .merge(members.rename(columns={"comid": "from"}), on="from")
+                .merge(members[["comid", "global_id"]].rename(columns={"comid": "to", "global_id": "toid"}), on="to")
+            )
+            for i, group in mods.groupby("vpu"):
+                toids[i] = group.drop_duplicates("id")[["id", "toid"]]
+
+        rows = list(run(
+            rewrite_identifiers, gpkgs,
+            [{space: scan[space] for space in ID_SOURCES} for scan in scans],
+            [{space: starts[space][i] for space in ID_SOURCES} for i in range(len(gpkgs))],
+            toids, outfiles, repeat(layers)
+        ))
+
+    return pd.DataFrame({
+        "gpkg": gpkgs,
+        "outfile": [out or gpkg for gpkg, out in zip(gpkgs, outfiles)],
+        "rows": rows,
+        "ids": counts["id"],
+        "id_start": starts["id"] + 1,
+        "id_end": starts["id"] + counts["id"],
+        "pois": counts["poi"],
+        "poi_start": starts["poi"] + 1,
+        "poi_end": starts["poi"] + counts["poi"],
+        "modified": [0 if t is None else len(t) for t in toids],
+    })
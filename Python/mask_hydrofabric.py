@@ -1,62 +1,582 @@
 import geopandas as gpd
+import numpy as np
 import os
-from shapely.geometry import Polygon
 import pandas as pd
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from pathlib import Path
+from .cache import get_cache, table_to_frame
+from .profiling import profiled, span
+from .writer import write_gpkg
+from .sqlite import (
+    cached_layer, connection_gpkg, get_gpkg, layer_frame, read_sf_dataset_sqlite,
+    read_sf_dataset_sqlite_chunks, read_sql
+)
+
+# Identifier columns used to link spatial and aspatial layers
+id_cols = ['COMID', 'FEATUREID', 'divide_id', 'id', 'ds_id', "ID"]
+
+# Function to join a spatial layer against mask geometries using the GPKG rtree
+def query_masked_layer(gpkg, layer, mask, chunksize=None):
+    """
+    Finds the features of a GeoPackage layer that intersect each mask geometry.
+
+    The mask envelope is pushed into the read as a bbox filter, which is answered
+    from the layer's rtree_<layer>_<geom> index, so only candidate features are
+    loaded. The exact intersection is then run on that small set. With a chunksize
+    the candidates are streamed in chunks and only the intersecting features of
+    each chunk are kept, so peak memory stays bounded regardless of layer size.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    layer (str): Spatial layer to read
+    mask (gpd.GeoDataFrame): Mask geometries
+    chunksize (int, optional): Number of candidate features read at a time, defaults
+        to None (all at once)
+
+    Returns:
+    tuple: Candidate features (gpd.GeoDataFrame) and the (mask, feature) positional
+        index pairs (np.ndarray of shape (2, n)) of the intersections
+    """
+    if chunksize:
+        return query_masked_layer_chunks(gpkg, layer, mask, chunksize)
+
+    if get_cache() is not None:
+        return query_cached_layer(gpkg, layer, mask)
+
+    # Read the layer CRS without reading any features
+    crs = gpd.read_file(gpkg, layer=layer, rows=0).crs
+
+    # Transform mask CRS if needed
+    if crs is not None and not mask.crs.equals(crs):
+        with span("crs_transform", layer=layer) as s:
+            mask = mask.to_crs(crs)
+            s.set(rows=len(mask))
+
+    # Candidate features from the spatial index
+    with span("read", layer=layer) as s:
+        layer_gdf = gpd.read_file(gpkg, layer=layer, bbox=tuple(mask.total_bounds))
+        s.set(rows=len(layer_gdf))
+
+    if layer_gdf.empty:
+        return layer_gdf, np.empty((2, 0), dtype=np.intp)
+
+    # Exact intersection on the candidates
+    with span("sjoin", layer=layer) as s:
+        idx = layer_gdf.sindex.query(mask.geometry, predicate='intersects')
+        s.set(rows=idx.shape[1])
+
+    return layer_gdf, idx
+
+# Function to give a layer read through sqlite.py the layout of gpd.read_file
+def read_file_layout(handle, layer, layer_gdf):
+    """
+    Drops the primary key of a layer and moves its geometry last as "geometry",
+    the layout gpd.read_file returns.
+
+    Parameters:
+    handle (GeoPackage): Handle to the GeoPackage
+    layer (str): Layer the features were read from
+    layer_gdf (gpd.GeoDataFrame): Features read with read_sf_dataset_sqlite(_chunks)
+
+    Returns:
+    gpd.GeoDataFrame: Features in the layout of gpd.read_file
+    """
+    _, pk = handle.columns(layer)
+    if pk in layer_gdf.columns:
+        layer_gdf = layer_gdf.drop(columns=pk)
+    if layer_gdf.geometry.name != "geometry":
+        layer_gdf = layer_gdf.rename_geometry("geometry")
+    return layer_gdf[[col for col in layer_gdf.columns if col != "geometry"] + ["geometry"]]
+
+# Function to join a spatial layer against mask geometries through the layer cache
+def query_cached_layer(gpkg, layer, mask):
+    """
+    Version of query_masked_layer reading the candidate features from the layer
+    cache (see cache.enable_cache) instead of the GeoPackage.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    layer (str): Spatial layer to read
+    mask (gpd.GeoDataFrame): Mask geometries
+
+    Returns:
+    tuple: Candidate features (gpd.GeoDataFrame) and the (mask, feature) positional
+        index pairs (np.ndarray of shape (2, n)) of the intersections
+    """
+    handle = get_gpkg(gpkg)
+    crs = handle.crs(layer)
+
+    # Transform mask CRS if needed
+    if crs is not None and not mask.crs.equals(crs):
+        with span("crs_transform", layer=layer) as s:
+            mask = mask.to_crs(crs)
+            s.set(rows=len(mask))
+
+    with span("read", layer=layer) as s:
+        layer_gdf = read_sf_dataset_sqlite(handle.connect(), layer, bbox=tuple(mask.total_bounds))
+        s.set(rows=len(layer_gdf))
+
+    layer_gdf = read_file_layout(handle, layer, layer_gdf)
+
+    if layer_gdf.empty:
+        return layer_gdf, np.empty((2, 0), dtype=np.intp)
+
+    with span("sjoin", layer=layer) as s:
+        idx = layer_gdf.sindex.query(mask.geometry, predicate='intersects')
+        s.set(rows=idx.shape[1])
+
+    return layer_gdf, idx
+
+# Function to join a spatial layer against mask geometries one chunk at a time
+def query_masked_layer_chunks(gpkg, layer, mask, chunksize):
+    """
+    Chunked version of query_masked_layer.
+
+    Only the features of each chunk that intersect the mask are kept, so the
+    returned features are the intersecting ones rather than all candidates.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    layer (str): Spatial layer to read
+    mask (gpd.GeoDataFrame): Mask geometries
+    chunksize (int): Number of candidate features read at a time
+
+    Returns:
+    tuple: Intersecting features (gpd.GeoDataFrame) and the (mask, feature) positional
+        index pairs (np.ndarray of shape (2, n)) of the intersections
+    """
+    handle = get_gpkg(gpkg)
+    crs = handle.crs(layer)
+
+    # Transform mask CRS if needed
+    if crs is not None and not mask.crs.equals(crs):
+        with span("crs_transform", layer=layer) as s:
+            mask = mask.to_crs(crs)
+            s.set(rows=len(mask))
+
+    parts, m_parts, f_parts = [], [], []
+    offset = 0
+
+    for chunk in read_sf_dataset_sqlite_chunks(handle.connect(), layer, chunksize, bbox=tuple(mask.total_bounds)):
+        if chunk.empty:
+            continue
+
+        with span("sjoin", layer=layer) as s:
+            m_idx, f_idx = chunk.sindex.query(mask.geometry, predicate='intersects')
+            s.set(rows=len(f_idx))
+        keep = np.unique(f_idx)
+
+        parts.append(chunk.iloc[keep])
+        m_parts.append(m_idx)
+        f_parts.append(np.searchsorted(keep, f_idx) + offset)
+        offset += len(keep)
+
+    if not parts:
+        empty = read_sf_dataset_sqlite(handle.connect(), layer, where="0")
+        return read_file_layout(handle, layer, empty), np.empty((2, 0), dtype=np.intp)
+
+    layer_gdf = read_file_layout(handle, layer, pd.concat(parts, ignore_index=True))
+    return layer_gdf, np.vstack([np.concatenate(m_parts), np.concatenate(f_parts)])
+
+# Function to read only the features of a spatial layer that intersect a mask
+def read_masked_layer(gpkg, layer, mask, chunksize=None):
+    """
+    Reads the features of a GeoPackage layer that intersect a mask.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    layer (str): Spatial layer to read
+    mask (gpd.GeoDataFrame): Mask geometries
+    chunksize (int, optional): Number of candidate features read at a time, defaults
+        to None (all at once)
+
+    Returns:
+    gpd.GeoDataFrame: Features of the layer intersecting the mask
+    """
+    layer_gdf, (_, idx) = query_masked_layer(gpkg, layer, mask, chunksize)
+    return layer_gdf.iloc[np.unique(idx)]
+
+# Function to collect the unique identifiers of a layer
+def collect_ids(df):
+    """
+    Collects the unique, non-missing identifiers found in the ID columns of a layer.
+
+    Parameters:
+    df (pd.DataFrame): Layer to collect identifiers from
+
+    Returns:
+    np.ndarray: Unique identifiers
+    """
+    cols = [col for col in id_cols if col in df.columns]
+    return union_ids([df[col].dropna().to_numpy() for col in cols])
+
+# Function to union ID arrays
+def union_ids(ids):
+    """
+    Unions a list of ID arrays into a single array of unique IDs.
+
+    Parameters:
+    ids (list): Arrays of identifiers
+
+    Returns:
+    np.ndarray: Unique identifiers
+    """
+    if not ids:
+        return np.array([], dtype=object)
+
+    return pd.unique(np.concatenate(ids))
+
+# Function to open a GeoPackage read-only and register a set of IDs as a temp table
+def connect_ids(gpkg, ids):
+    """
+    Opens a read-only SQLite connection to a GeoPackage holding the IDs in a temp table.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    ids (np.ndarray): Identifiers to register
+
+    Returns:
+    sqlite3.Connection: Connection with the IDs in temp.hf_ids
+    """
+    conn = sqlite3.connect(Path(gpkg).resolve().as_uri() + "?mode=ro", uri=True)
+    conn.execute("CREATE TEMP TABLE hf_ids (id)")
+    conn.executemany("INSERT INTO temp.hf_ids VALUES (?)", ((id_,) for id_ in ids.tolist()))
+    return conn
+
+# Function to subset an aspatial layer by the registered IDs inside SQLite
+def filter_layer_by_ids(conn, layer):
+    """
+    Reads the rows of a layer where any of its ID columns is in temp.hf_ids.
+
+    Only the ID columns the layer actually has are used. Geometries of spatial
+    layers are decoded. Layers without any ID column return None.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection returned by connect_ids
+    layer (str): Layer to subset
+
+    Returns:
+    pd.DataFrame or None: Matching rows
+    """
+    info = conn.execute(f'PRAGMA table_info("{layer}")').fetchall()
+    cols = [row[1] for row in info if not row[5]]  # Drop the fid primary key
+    present = [col for col in id_cols if col in cols]
+
+    if not present:
+        return None
+
+    select = ", ".join(f'"{col}"' for col in cols)
+    where = " OR ".join(f'"{col}" IN (SELECT id FROM temp.hf_ids)' for col in present)
+    data = read_sql(f'SELECT {select} FROM "{layer}" WHERE {where}', conn, layer=layer)
+    return layer_frame(connection_gpkg(conn), layer, data, quiet=True)
+
+# Function to open a GeoPackage read-only and register the IDs of many masks as a temp table
+def connect_mask_ids(gpkg, mask_ids):
+    """
+    Opens a read-only SQLite connection to a GeoPackage holding (mask, id) pairs in a temp table.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    mask_ids (list): Arrays of identifiers, one per mask
+
+    Returns:
+    sqlite3.Connection: Connection with the pairs in temp.hf_mask_ids
+    """
+    conn = sqlite3.connect(Path(gpkg).resolve().as_uri() + "?mode=ro", uri=True)
+    conn.execute("CREATE TEMP TABLE hf_mask_ids (mask INTEGER, id)")
+    conn.executemany(
+        "INSERT INTO temp.hf_mask_ids VALUES (?, ?)",
+        ((i, id_) for i, ids in enumerate(mask_ids) for id_ in ids.tolist())
+    )
+    conn.execute("CREATE INDEX temp.hf_mask_ids_id ON hf_mask_ids (id)")
+    return conn
+
+# Function to subset an aspatial layer for many masks in a single query
+def filter_layer_by_mask_ids(conn, layer):
+    """
+    Reads the rows of a layer matching the IDs of each mask in temp.hf_mask_ids.
+
+    Rows matching several masks are returned once per mask, tagged with the
+    positional mask index in the hf_mask column. Layers without any ID column
+    return None.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection returned by connect_mask_ids
+    layer (str): Layer to subset
+
+    Returns:
+    pd.DataFrame or None: Matching rows
+    """
+    info = conn.execute(f'PRAGMA table_info("{layer}")').fetchall()
+    cols = [row[1] for row in info if not row[5]]  # Drop the fid primary key
+    present = [col for col in id_cols if col in cols]
+
+    if not present:
+        return None
+
+    hits = " UNION ".join(
+        f'SELECT m.mask AS mask, t.rowid AS rid FROM "{layer}" t '
+        f'JOIN temp.hf_mask_ids m ON t."{col}" = m.id'
+        for col in present
+    )
+    select = ", ".join(f't."{col}"' for col in cols)
+    return read_sql(
+        f'WITH hits AS ({hits}) SELECT hits.mask AS hf_mask, {select} '
+        f'FROM hits JOIN "{layer}" t ON t.rowid = hits.rid',
+        conn, layer=layer
+    )
+
+# Function to subset an aspatial layer for many masks on its own connection (process pool entry point)
+def subset_layer_by_mask_ids(gpkg, layer, mask_ids):
+    """
+    Subsets an aspatial layer of a GeoPackage by the IDs of many masks.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    layer (str): Layer to subset
+    mask_ids (list): Arrays of identifiers, one per mask
+
+    Returns:
+    pd.DataFrame or None: Matching rows tagged with hf_mask
+    """
+    if get_cache() is not None:
+        return cached_layer_by_mask_ids(gpkg, layer, mask_ids)
+
+    conn = connect_mask_ids(gpkg, mask_ids)
+    try:
+        return filter_layer_by_mask_ids(conn, layer)
+    finally:
+        conn.close()
+
+# Function to find the rows of a cached layer matching any of a set of IDs
+def match_cached_ids(handle, layer, ids):
+    """
+    Matches the ID columns of a cached layer against a set of IDs.
+
+    Parameters:
+    handle (GeoPackage): Handle to the GeoPackage
+    layer (str): Layer to match
+    ids (np.ndarray): Unique identifiers
+
+    Returns:
+    tuple: Cached table without its primary key (pa.Table) and, per ID column,
+        the position of each row's ID in ids (-1 where absent); None if the
+        layer has no ID column
+    """
+    table = cached_layer(handle, layer)
+    keys = [row[1] for row in handle.table_info(layer) if row[5]]
+    table = table.drop_columns([col for col in keys if col in table.column_names])
+
+    present = [col for col in id_cols if col in table.column_names]
+    if not present:
+        return None
+
+    index = pd.Index(ids)
+    return table, [index.get_indexer(table[col].to_numpy(zero_copy_only=False)) for col in present]
+
+# Function to subset an aspatial layer by IDs through the layer cache
+def cached_layer_by_ids(gpkg, layer, ids):
+    """
+    Version of subset_layer_by_ids filtering the cached layer (see cache.enable_cache).
+    """
+    matched = match_cached_ids(get_gpkg(gpkg), layer, pd.unique(ids))
+    if matched is None:
+        return None
+
+    table, codes = matched
+    keep = np.logical_or.reduce([code >= 0 for code in codes])
+    return table_to_frame(table.filter(keep))
+
+# Function to subset an aspatial layer for many masks through the layer cache
+def cached_layer_by_mask_ids(gpkg, layer, mask_ids):
+    """
+    Version of subset_layer_by_mask_ids matching the cached layer (see cache.enable_cache).
+    """
+    flat = np.concatenate(mask_ids) if mask_ids else np.array([], dtype=object)
+    ids = pd.unique(flat)
+
+    matched = match_cached_ids(get_gpkg(gpkg), layer, ids)
+    if matched is None:
+        return None
+
+    table, codes = matched
+
+    # (mask, id position) pairs joined with the (row, id position) pairs of each column
+    pairs = pd.DataFrame({
+        "hf_mask": np.repeat(np.arange(len(mask_ids)), [len(m) for m in mask_ids]),
+        "code": pd.Index(ids).get_indexer(flat),
+    })
+    rows = pd.concat([
+        pd.DataFrame({"rid": np.flatnonzero(code >= 0), "code": code[code >= 0]}) for code in codes
+    ])
+    hits = pairs.merge(rows, on="code")[["hf_mask", "rid"]].drop_duplicates()
+
+    data = table_to_frame(table.take(hits["rid"].to_numpy()))
+    data.insert(0, "hf_mask", hits["hf_mask"].to_numpy())
+    return data
+
+# Function to subset an aspatial layer by IDs on its own connection (process pool entry point)
+def subset_layer_by_ids(gpkg, layer, ids):
+    """
+    Subsets an aspatial layer of a GeoPackage by a set of IDs.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    layer (str): Layer to subset
+    ids (np.ndarray): Identifiers to keep
+
+    Returns:
+    pd.DataFrame or None: Matching rows
+    """
+    if get_cache() is not None:
+        return cached_layer_by_ids(gpkg, layer, ids)
+
+    conn = connect_ids(gpkg, ids)
+    try:
+        return filter_layer_by_ids(conn, layer)
+    finally:
+        conn.close()
+
+# Function to write subset layers to a GeoPackage
+def write_layers(layers, outfile):
+    """
+    Writes a set of layers to a GeoPackage in a single transaction (see write_gpkg).
+
+    Parameters:
+    layers (dict): Layers keyed by name
+    outfile (str): Path to the GeoPackage
+
+    Returns:
+    str: Path to the GeoPackage
+    """
+    return write_gpkg(layers, outfile)
+
+@profiled()
+def mask_hydrofabric(gpkg: str, mask: gpd.GeoDataFrame, outfile: str = None, workers: int = None,
+                     chunksize: int = None) -> dict:
+    """
+    Subsets all layers of a GeoPackage to the features intersecting a mask.
+
+    Spatial layers are filtered by the mask, and aspatial layers by the union of the
+    IDs found in the spatial subsets.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    mask (gpd.GeoDataFrame): Mask geometries
+    outfile (str, optional): GeoPackage to write the subset to, defaults to None
+    workers (int, optional): Number of processes used to subset layers in parallel,
+        defaults to None (serial)
+    chunksize (int, optional): Number of candidate features of a spatial layer read
+        at a time, defaults to None (all at once)
+
+    Returns:
+    dict or str: Layers keyed by name, or outfile if provided
+    """
+    # List GeoPackage layers
+    lyrs = gpd.list_layers(gpkg)
+
+    s_lyrs = lyrs['name'][lyrs['geometry_type'].notna()].tolist()
+    as_lyrs = lyrs['name'][lyrs['geometry_type'].isna()].tolist()
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+
+        # Process spatial layers
+        s_data = list(run(read_masked_layer, repeat(gpkg), s_lyrs, repeat(mask), repeat(chunksize)))
 
-def mask_hydrofabric(gpkg: str, mask: gpd.GeoDataFrame, outfile: str = None) -> dict:
-    # Load GeoPackage layers
-    gdf = gpd.read_file(gpkg, layer=None)
-    layers = gdf.keys()
-
-    s_lyrs = [layer for layer in layers if gdf[layer].geometry is not None]
-    as_lyrs = [layer for layer in layers if gdf[layer].geometry is None]
-    
-    hydrofabric = {}
-    ids = []
-
-    # Process spatial layers
-    for s_lyr in s_lyrs:
-        layer_gdf = gpd.read_file(gpkg, layer=s_lyr)
-        
-        # Transform mask CRS if needed
-        if not mask.crs.equals(layer_gdf.crs):
-            mask = mask.to_crs(layer_gdf.crs)
-        
-        # Filter spatial data by mask
-        tmp = gpd.sjoin(layer_gdf, mask, how='inner', op='intersects')
-        
         # Collect unique IDs
-        id_cols = ['COMID', 'FEATUREID', 'divide_id', 'id', 'ds_id', "ID"]
-        id_values = tmp[id_cols].apply(pd.Series.dropna, axis=1).unstack().unique()
-        ids.append(set(id_values))
-
-        # Write or store results
-        if outfile:
-            tmp.to_file(outfile, layer=s_lyr, driver='GPKG')
-        else:
-            hydrofabric[s_lyr] = tmp
-
-    # Process aspatial layers
-    all_ids = set.union(*ids)  # Collect all unique IDs
-    all_ids = {id_ for id_ in all_ids if pd.notna(id_)}  # Remove NaN values
-
-    for as_lyr in as_lyrs:
-        layer_df = gpd.read_file(gpkg, layer=as_lyr)
-        
-        # Filter by IDs
-        filtered_df = layer_df[layer_df['COMID'].isin(all_ids) |
-                               layer_df['FEATUREID'].isin(all_ids) |
-                               layer_df['divide_id'].isin(all_ids) |
-                               layer_df['id'].isin(all_ids) |
-                               layer_df['ds_id'].isin(all_ids) |
-                               layer_df['ID'].isin(all_ids)]
-        
-        if outfile:
-            filtered_df.to_file(outfile, layer=as_lyr, driver='GPKG')
-        else:
-            hydrofabric[as_lyr] = filtered_df
+        all_ids = union_ids([collect_ids(tmp) for tmp in s_data])
 
+        # Process aspatial layers
+        as_data = list(run(subset_layer_by_ids, repeat(gpkg), as_lyrs, repeat(all_ids)))
+
+    hydrofabric = {lyr: tmp for lyr, tmp in zip(s_lyrs + as_lyrs, s_data + as_data) if tmp is not None}
+
+    # Write or store results
     if outfile:
-        return outfile
+        return write_layers(hydrofabric, outfile)
     else:
-        return hydrofabric
\ No newline at end of file
+        return hydrofabric
+
+@profiled()
+def mask_hydrofabric_batch(gpkg: str, masks: gpd.GeoDataFrame, id_col: str = None,
+                           outdir: str = None, workers: int = None, chunksize: int = None) -> dict:
+    """
+    Subsets all layers of a GeoPackage for many masks in a single pass.
+
+    Each spatial layer is read once over the envelope of all masks and joined
+    against every mask with one indexed query. Each aspatial layer is then read
+    once, matched against the IDs of all masks inside SQLite.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    masks (gpd.GeoDataFrame): Mask geometries, one row per subset
+    id_col (str, optional): Column naming each mask, defaults to None (the index)
+    outdir (str, optional): Directory to write one <name>.gpkg per mask to, defaults to None
+    workers (int, optional): Number of processes used to subset layers in parallel,
+        defaults to None (serial)
+    chunksize (int, optional): Number of candidate features of a spatial layer read
+        at a time, defaults to None (all at once)
+
+    Returns:
+    dict: Layers keyed by mask name and layer name, or GeoPackage paths keyed by
+        mask name if outdir is provided
+    """
+    keys = masks[id_col].tolist() if id_col else masks.index.tolist()
+
+    if len(set(keys)) != len(keys):
+        raise ValueError("mask names must be unique.")
+
+    # List GeoPackage layers
+    lyrs = gpd.list_layers(gpkg)
+
+    s_lyrs = lyrs['name'][lyrs['geometry_type'].notna()].tolist()
+    as_lyrs = lyrs['name'][lyrs['geometry_type'].isna()].tolist()
+
+    hydrofabric = {key: {} for key in keys}
+    mask_ids = [[] for _ in keys]
+    bins = np.arange(len(keys) + 1)
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+
+        # Process spatial layers: one indexed join per layer
+        for s_lyr, (layer_gdf, (m_idx, f_idx)) in zip(s_lyrs, run(query_masked_layer, repeat(gpkg), s_lyrs, repeat(masks), repeat(chunksize))):
+            order = np.argsort(m_idx, kind='stable')
+            m_idx, f_idx = m_idx[order], f_idx[order]
+            bounds = np.searchsorted(m_idx, bins)
+
+            for i, key in enumerate(keys):
+                tmp = layer_gdf.iloc[f_idx[bounds[i]:bounds[i + 1]]]
+                mask_ids[i].append(collect_ids(tmp))
+                hydrofabric[key][s_lyr] = tmp
+
+        # Collect unique IDs per mask
+        mask_ids = [union_ids(ids) for ids in mask_ids]
+
+        # Process aspatial layers: one query per layer for all masks
+        for as_lyr, tmp in zip(as_lyrs, run(subset_layer_by_mask_ids, repeat(gpkg), as_lyrs, repeat(mask_ids))):
+            if tmp is None:
+                continue
+
+            groups = tmp.groupby('hf_mask').indices
+            tmp = tmp.drop(columns='hf_mask')
+            empty = tmp.iloc[:0]
+
+            for i, key in enumerate(keys):
+                hydrofabric[key][as_lyr] = tmp.iloc[groups[i]] if i in groups else empty
+
+    if not outdir:
+        return hydrofabric
+
+    # Write one GeoPackage per mask
+    os.makedirs(outdir, exist_ok=True)
+    outfiles = {}
+
+    for key, layers in hydrofabric.items():
+        outfiles[key] = write_layers(layers, os.path.join(outdir, f"{key}.gpkg"))
+
+    return outfiles
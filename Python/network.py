@@ -0,0 +1,215 @@
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy.sparse import csr_matrix
+
+from .mask_hydrofabric import collect_ids, subset_layer_by_ids, union_ids, write_layers
+from .package import read_parquet
+
+# Compiled id/toid network: node ids and CSR adjacency in both directions
+NetworkIndex = namedtuple("NetworkIndex", ["path", "nodes", "downstream", "upstream"])
+
+# Files making up a network index
+INDEX_FILES = ["nodes", "down_indptr", "down_indices", "up_indptr", "up_indices"]
+
+# Function to compile an id/toid network into a CSR network index on disk
+def build_network_index(network, path, id_col="id", toid_col="toid"):
+    """
+    Compiles the id/toid edges of a network table into an integer-encoded CSR index.
+
+    Node ids are sorted and encoded as integers; edges are stored as CSR adjacency
+    in both the downstream (id -> toid) and upstream (toid -> id) directions. Each
+    array is saved as a .npy file so it can be memory-mapped by load_network_index.
+
+    Parameters:
+    network (pd.DataFrame or str): Network table, or path to a parquet file/dataset
+        (e.g. conus_network)
+    path (str): Directory to write the index to
+    id_col (str, optional): Column holding the feature id, defaults to "id"
+    toid_col (str, optional): Column holding the downstream id, defaults to "toid"
+
+    Returns:
+    str: Path to the index directory
+    """
+    if isinstance(network, str):
+        network = read_parquet(network, columns=[id_col, toid_col])
+
+    ids = network[id_col].to_numpy()
+    toids = network[toid_col].to_numpy()
+
+    keep = pd.notna(ids)
+    ids, toids = ids[keep], toids[keep]
+    has_to = pd.notna(toids)
+
+    # Encode node ids as integers (strings are stored fixed-width so they can be memory-mapped)
+    nodes = np.unique(np.concatenate([ids, toids[has_to]]))
+    if nodes.dtype == object:
+        nodes = np.unique(nodes.astype(str))
+        ids, toids = ids.astype(str), toids.astype(str)
+
+    src = np.searchsorted(nodes, ids[has_to]).astype(np.int32)
+    dst = np.searchsorted(nodes, toids[has_to]).astype(np.int32)
+
+    # Drop self loops and duplicate edges
+    edges = np.unique(np.stack([src, dst], axis=1)[src != dst], axis=0)
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "nodes.npy"), nodes)
+
+    for name, (a, b) in {"down": (edges[:, 0], edges[:, 1]), "up": (edges[:, 1], edges[:, 0])}.items():
+        order = np.argsort(a, kind="stable")
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(a, minlength=len(nodes)))]).astype(np.int32)
+        np.save(os.path.join(path, f"{name}_indptr.npy"), indptr)
+        np.save(os.path.join(path, f"{name}_indices.npy"), b[order].astype(np.int32))
+
+    with open(os.path.join(path, "index.json"), "w") as f:
+        json.dump({"id_col": id_col, "toid_col": toid_col, "nodes": len(nodes), "edges": len(edges)}, f)
+
+    return path
+
+# Function to load a network index
+def load_network_index(path):
+    """
+    Loads a network index built by build_network_index.
+
+    The arrays are memory-mapped, so loading is cheap and the pages are shared
+    between processes reading the same index.
+
+    Parameters:
+    path (str): Directory of the index
+
+    Returns:
+    NetworkIndex: Node ids and CSR adjacency matrices
+    """
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in INDEX_FILES}
+    n = len(arrays["nodes"])
+
+    def adjacency(direction):
+        indices = arrays[f"{direction}_indices"]
+        return csr_matrix((np.ones(len(indices)), indices, arrays[f"{direction}_indptr"]), shape=(n, n))
+
+    return NetworkIndex(path, arrays["nodes"], adjacency("down"), adjacency("up"))
+
+# Function to encode node ids
+def encode_ids(index, ids):
+    """
+    Encodes node ids as their integer positions in a network index.
+
+    Parameters:
+    index (NetworkIndex): Network index
+    ids (array-like): Node ids
+
+    Returns:
+    np.ndarray: Integer node positions
+    """
+    ids = np.atleast_1d(np.asarray(ids))
+    if index.nodes.dtype.kind == "U":
+        ids = ids.astype(str)
+
+    pos = np.searchsorted(index.nodes, ids).clip(0, len(index.nodes) - 1)
+    missing = index.nodes[pos] != ids
+
+    if missing.any():
+        raise ValueError(f"{', '.join(map(str, ids[missing][:5]))} not in network.")
+
+    return pos
+
+# Function to traverse a network index
+def navigate(index, origins, direction="upstream"):
+    """
+    Finds all nodes upstream or downstream of one or many origins (origins included).
+
+    All origins are traversed at once by a breadth-first search seeded with all of
+    them. Each step gathers the neighbors of the whole frontier from the CSR arrays,
+    so only the rows of reached nodes are read from the memory-mapped index and the
+    graph is never copied.
+
+    Parameters:
+    index (NetworkIndex): Network index from load_network_index
+    origins (array-like): Origin node ids
+    direction (str, optional): "upstream" or "downstream", defaults to "upstream"
+
+    Returns:
+    np.ndarray: Ids of the reached nodes
+    """
+    if direction not in ("upstream", "downstream"):
+        raise ValueError("direction must be 'upstream' or 'downstream'.")
+
+    graph = index.upstream if direction == "upstream" else index.downstream
+    indptr, indices = graph.indptr, graph.indices
+
+    frontier = np.unique(encode_ids(index, origins))
+    visited = np.zeros(graph.shape[0], dtype=bool)
+    visited[frontier] = True
+
+    while len(frontier):
+        starts = indptr[frontier].astype(np.int64)
+        counts = indptr[frontier + 1] - starts
+
+        # Positions of the frontier's edges in indices
+        pos = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        neighbors = np.unique(indices[pos])
+
+        frontier = neighbors[~visited[neighbors]]
+        visited[frontier] = True
+
+    return np.asarray(index.nodes[visited])
+
+# Function to subset a hydrofabric by network traversal
+def subset_network(gpkg, index, origins, direction="upstream", outfile=None, workers=None):
+    """
+    Subsets all layers of a GeoPackage to the features upstream or downstream of origins.
+
+    The traversal runs on the network index. As in mask_hydrofabric, the spatial
+    layers are filtered first, by the reached ids over their ID columns; the
+    aspatial layers are then filtered by the union of the reached ids and the ids
+    found in the spatial subsets, so tables keyed only by e.g. divide_id are kept.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    index (NetworkIndex or str): Network index, or path to one
+    origins (array-like): Origin node ids (e.g. the flowpath of a gauge/hydrolocation)
+    direction (str, optional): "upstream" or "downstream", defaults to "upstream"
+    outfile (str, optional): GeoPackage to write the subset to, defaults to None
+    workers (int, optional): Number of processes used to subset layers in parallel,
+        defaults to None (serial)
+
+    Returns:
+    dict or str: Layers keyed by name, or outfile if provided
+    """
+    if isinstance(index, str):
+        index = load_network_index(index)
+
+    ids = navigate(index, origins, direction)
+
+    # List GeoPackage layers
+    lyrs = gpd.list_layers(gpkg)
+    lyrs = lyrs[lyrs["name"] != "layer_styles"]
+
+    s_lyrs = lyrs["name"][lyrs["geometry_type"].notna()].tolist()
+    as_lyrs = lyrs["name"][lyrs["geometry_type"].isna()].tolist()
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+
+        # Process spatial layers: features reached by the traversal
+        s_data = list(run(subset_layer_by_ids, repeat(gpkg), s_lyrs, repeat(ids)))
+
+        # Collect unique IDs
+        all_ids = union_ids([ids.astype(object)] + [collect_ids(tmp) for tmp in s_data if tmp is not None])
+
+        # Process aspatial layers
+        as_data = list(run(subset_layer_by_ids, repeat(gpkg), as_lyrs, repeat(all_ids)))
+
+    hydrofabric = {lyr: tmp for lyr, tmp in zip(s_lyrs + as_lyrs, s_data + as_data) if tmp is not None}
+
+    if outfile:
+        return write_layers(hydrofabric, outfile)
+    else:
+        return hydrofabric
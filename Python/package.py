@@ -1,15 +1,36 @@
 # Import necessary packages
 
+import json
+import os
+import warnings
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import repeat
+
 # Database interaction
 import sqlite3  # Equivalent of DBI and RSQLite
-from pyarrow import parquet as pq  # Equivalent to arrow in R
 
 # String interpolation (equivalent to glue)
 from string import Template
 
+from .cache import get_cache, source_stamp
+from .sqlite import get_gpkg, read_sf_dataset_sqlite, read_sf_dataset_sqlite_chunks, read_sql
+from .utils import lazy_import
+
+# Heavy dependencies are imported on first use, so importing this module stays cheap
+np = lazy_import("numpy")
+pa = lazy_import("pyarrow")
+pc = lazy_import("pyarrow.compute")
+ds = lazy_import("pyarrow.dataset")
+pq = lazy_import("pyarrow.parquet")  # Equivalent to arrow in R
+pd = lazy_import("pandas")
+
 # Other geospatial and scientific libraries
-import geopandas as gpd  # Equivalent to sf
-import dask.dataframe as dd  # Similar to handling big data like arrow::open_dataset
+gpd = lazy_import("geopandas")  # Equivalent to sf
+pyproj = lazy_import("pyproj")
+shapely = lazy_import("shapely")
+dask = lazy_import("dask")
+dd = lazy_import("dask.dataframe")  # Similar to handling big data like arrow::open_dataset
 
 # Custom Imports (equivalents)
 # Assuming these packages are custom or correspond to similar Python libraries
@@ -20,25 +41,786 @@ import dask.dataframe as dd  # Similar to handling big data like arrow::open_dat
 # import rasterio as rio  # terra equivalent for raster data handling
 
 # Define data handling functionality
-def read_parquet(file_path):
+def read_parquet(file_path, columns=None, filters=None, bbox=None):
     """
-    Reads a parquet file and returns it as a dataframe.
+    Reads a parquet file (or dataset directory) and returns it as a dataframe.
+
+    Filters and bbox are used to prune partitions and row groups (from their
+    statistics, or for bbox from the row group index of the dataset) before any
+    data is read. See dataset_filter and indexed_fragments.
+
+    While the layer cache is enabled (see cache.enable_cache), unfiltered reads of
+    the requested columns are read once into the cache. Filtered and bbox reads
+    bypass it, as caching them would read the row groups they prune.
+
+    HTTP(S) URLs are read with range requests (see remote.read_remote_parquet).
     """
-    return pq.read_table(file_path).to_pandas()
+    if str(file_path).startswith(("http://", "https://")):
+        from .remote import read_remote_parquet
+        return read_remote_parquet(file_path, columns, filters, bbox)
+
+    dataset = parquet_dataset(file_path)
+    expr = dataset_filter(dataset, filters, bbox)
+    cache = get_cache()
+
+    if cache is None or expr is not None:
+        indexed = indexed_fragments(dataset, file_path, bbox, expr) if bbox is not None else None
+        if indexed is not None:
+            dataset = ds.FileSystemDataset(indexed, dataset.schema, dataset.format, dataset.filesystem)
+        return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+    cached = None if columns is None else tuple(columns)
+    source = os.path.realpath(file_path)
+    table = cache.table(
+        source, source_stamp(source, dataset.files), ("parquet", cached),
+        lambda: dataset.to_table(columns=columns)
+    )
+
+    return table.to_pandas()
 
 def write_parquet(df, file_path):
     """
-    Writes a dataframe to a parquet file.
+    Writes a dataframe, or an iterable of dataframe chunks, to a parquet file.
+
+    Chunks (e.g. from read_sf_dataset_sqlite_chunks) are written one row group at
+    a time, so peak memory is bounded by the chunk size.
+    """
+    if isinstance(df, pd.DataFrame):
+        pq.write_table(to_arrow(df), file_path)
+        return
+
+    writer = None
+    try:
+        for chunk in df:
+            table = to_arrow(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(file_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def to_arrow(df):
+    """
+    Converts a dataframe to an arrow table, encoding any geometry column as WKB.
+    """
+    if isinstance(df, gpd.GeoDataFrame):
+        return pa.table(df.to_arrow(index=False, geometry_encoding="WKB"))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+# Arrow type factories of the declared GeoPackage column types
+SQLITE_TYPES = {
+    "BOOLEAN": "bool_", "TINYINT": "int8", "SMALLINT": "int16", "MEDIUMINT": "int32",
+    "INT": "int64", "INTEGER": "int64", "FLOAT": "float32", "DOUBLE": "float64",
+    "REAL": "float64", "TEXT": "string", "BLOB": "binary", "DATE": "string",
+    "DATETIME": "string"
+}
+
+def sqlite_type(declared):
+    """
+    Returns the arrow type of a declared GeoPackage column type (string if unknown).
+    """
+    return getattr(pa, SQLITE_TYPES.get(declared.split("(")[0].strip().upper(), "string"))()
+
+@lru_cache(maxsize=None)
+def bbox_type():
+    """
+    Returns the type of the covering bbox column written next to the geometry.
+    """
+    return pa.struct([(name, pa.float64()) for name in ("xmin", "ymin", "xmax", "ymax")])
+
+# Hive partition value used for missing keys
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+
+# Row group index written next to spatial datasets
+ROW_GROUP_INDEX = "_rowgroups.parquet"
+
+# Hilbert layout: curve order (bits per axis) and default rows per row group
+HILBERT_ORDER = 16
+HILBERT_ROW_GROUP_SIZE = 16384
+
+class GeoParquetWriter:
+    """
+    Writes a single GeoParquet file in fixed size row groups.
+
+    Rows are buffered until a row group is full. The GeoParquet "geo" metadata
+    (geometry types, bbox, crs and bbox covering) is accumulated while writing and
+    added to the footer when the file is closed.
+
+    The Arrow schema is not stored in the file (its plain column types round trip
+    without it), so readers take the schema metadata from the footer and see the
+    geo metadata, as gpd.read_parquet requires for dataset directories.
+    """
+    def __init__(self, path, schema, geometry=None, crs=None, row_group_size=122880, compression="zstd"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.geometry = geometry
+        self.crs = crs
+        self.row_group_size = row_group_size
+        self.writer = pq.ParquetWriter(path, schema, compression=compression, store_schema=False)
+        self.buffer = []
+        self.bounds = []
+        self.rows = 0
+        self.bbox = np.array([np.inf, np.inf, -np.inf, -np.inf])
+        self.geometry_types = set()
+        self.row_groups = []
+
+    def write(self, table, bounds=None, geometry_types=()):
+        """
+        Buffers a table, writing out every full row group.
+        """
+        self.buffer.append(table)
+        self.rows += table.num_rows
+
+        if bounds is not None:
+            self.bounds.append(bounds)
+
+        # Chunks of null geometries only have NaN bounds, which fmin/fmax ignore
+        if bounds is not None and len(bounds):
+            with np.errstate(invalid="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                self.bbox = np.concatenate([
+                    np.fmin(self.bbox[:2], np.nanmin(bounds[:, :2], axis=0)),
+                    np.fmax(self.bbox[2:], np.nanmax(bounds[:, 2:], axis=0))
+                ])
+        self.geometry_types.update(geometry_types)
+
+        while self.rows >= self.row_group_size:
+            self.flush(self.row_group_size)
+
+    def flush(self, n=None):
+        """
+        Writes n buffered rows (all by default) as one row group.
+        """
+        table = pa.concat_tables(self.buffer)
+        n = table.num_rows if n is None else n
+
+        if n:
+            self.writer.write_table(table.slice(0, n), row_group_size=n)
+
+            # Extent of the row group for the row group index
+            if self.bounds:
+                bounds = np.concatenate(self.bounds)
+                with np.errstate(invalid="ignore"), warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    extent = np.r_[np.nanmin(bounds[:n, :2], axis=0), np.nanmax(bounds[:n, 2:], axis=0)]
+                self.row_groups.append((len(self.row_groups), n, *extent))
+                self.bounds = [bounds[n:]]
+
+        self.buffer = [table.slice(n)]
+        self.rows = table.num_rows - n
+
+    def close(self):
+        """
+        Writes the remaining rows and the geo metadata, and closes the file.
+        """
+        if self.rows:
+            self.flush()
+
+        if self.geometry is not None:
+            self.writer.add_key_value_metadata({"geo": json.dumps(self.geo_metadata())})
+
+        self.writer.close()
+
+    def geo_metadata(self):
+        """
+        Returns the GeoParquet 1.1 file metadata.
+        """
+        column = {
+            "encoding": "WKB",
+            "geometry_types": sorted(self.geometry_types),
+            "covering": {"bbox": {name: ["bbox", name] for name in ("xmin", "ymin", "xmax", "ymax")}}
+        }
+
+        if np.isfinite(self.bbox).all():
+            column["bbox"] = self.bbox.tolist()
+
+        if self.crs is not None:
+            column["crs"] = self.crs
+
+        return {"version": "1.1.0", "primary_column": self.geometry, "columns": {self.geometry: column}}
+
+# Function to describe the GeoParquet layout of a GeoPackage layer
+def layer_schema(handle, layer, partitioning="vpuid"):
+    """
+    Builds the GeoParquet schema of a GeoPackage layer from its declared column types.
+
+    Parameters:
+    handle (GeoPackage): Handle to the GeoPackage
+    layer (str): Layer name
+    partitioning (str, optional): Column used for Hive partitioning, defaults to "vpuid"
+
+    Returns:
+    dict: Columns read ("cols"), attribute columns ("attrs") and their schema
+        ("attr_schema"), file schema ("schema"), partitioning column ("part"),
+        primary key ("pk"), geometry column ("geom_col") and PROJJSON CRS ("crs")
+    """
+    geom = handle.geometry_columns.get(layer)
+    geom_col = geom["column"] if geom else None
+    names, pk = handle.columns(layer)
+    types = handle.column_types(layer)
+
+    cols = [col for col in names if col != pk]
+    part = partitioning if partitioning in cols else None
+
+    # File schema from the declared column types
+    attrs = [col for col in cols if col != geom_col]
+    attr_schema = pa.schema([
+        (col, sqlite_type(types[col])) for col in attrs
+    ])
+    schema = pa.schema([field for field in attr_schema if field.name != part])
+    crs = None
+
+    if geom_col:
+        schema = schema.append(pa.field(geom_col, pa.binary())).append(pa.field("bbox", bbox_type()))
+        definition = handle.crs(layer)
+        crs = pyproj.CRS.from_user_input(definition).to_json_dict() if definition else None
+
+    return {"cols": cols, "attrs": attrs, "attr_schema": attr_schema, "schema": schema,
+            "part": part, "pk": pk, "geom_col": geom_col, "crs": crs}
+
+# Function to convert a chunk of a layer into a GeoParquet table
+def chunk_table(chunk, layout):
+    """
+    Converts a chunk read from a GeoPackage layer into a table of the layer's
+    GeoParquet schema (WKB geometry and bbox covering column).
+
+    Parameters:
+    chunk (gpd.GeoDataFrame or pd.DataFrame): Rows of the layer
+    layout (dict): Layer layout (see layer_schema)
+
+    Returns:
+    tuple: Table (pa.Table), feature bounds (np.ndarray or None) and geometry types (np.ndarray)
+    """
+    geom_col = layout["geom_col"]
+    table = pa.Table.from_pandas(pd.DataFrame(chunk[layout["attrs"]]), schema=layout["attr_schema"], preserve_index=False)
+    bounds = None
+    geometry_types = np.array([], dtype=object)
+
+    if geom_col:
+        geometry = chunk[geom_col].values
+        bounds = shapely.bounds(geometry)
+        geometry_types = np.asarray(geometry.geom_type, dtype=object)
+        table = table.append_column(geom_col, pa.array(shapely.to_wkb(geometry), pa.binary()))
+        table = table.append_column("bbox", pa.StructArray.from_arrays(
+            [pa.array(bounds[:, i]) for i in range(4)], fields=list(bbox_type())
+        ))
+
+    return table, bounds, geometry_types
+
+# Function to compute Hilbert curve positions
+def hilbert_index(x, y, extent, order=HILBERT_ORDER):
+    """
+    Computes the position of points along a Hilbert curve covering an extent.
+
+    The extent is divided into a 2^order x 2^order grid; the index of each point's
+    cell along the curve is computed for all points at once, one bit level at a time.
+    Missing coordinates are placed at the end of the curve.
+
+    Parameters:
+    x (np.ndarray): X coordinates
+    y (np.ndarray): Y coordinates
+    extent (tuple): (xmin, ymin, xmax, ymax) of the curve
+    order (int, optional): Curve order (bits per axis), defaults to HILBERT_ORDER
+
+    Returns:
+    np.ndarray: Hilbert indices (uint64)
+    """
+    side = (1 << order) - 1
+    xmin, ymin, xmax, ymax = extent
+    width, height = max(xmax - xmin, 1e-12), max(ymax - ymin, 1e-12)
+
+    valid = np.isfinite(x) & np.isfinite(y)
+    xi = np.clip(np.nan_to_num((x - xmin) / width * side), 0, side).astype(np.uint64)
+    yi = np.clip(np.nan_to_num((y - ymin) / height * side), 0, side).astype(np.uint64)
+    d = np.zeros(len(xi), dtype=np.uint64)
+
+    s = np.uint64(1 << (order - 1))
+    while s > 0:
+        rx = (xi & s) > 0
+        ry = (yi & s) > 0
+        d += s * s * ((3 * rx.astype(np.uint64)) ^ ry.astype(np.uint64))
+
+        # Rotate the quadrant
+        flip = ~ry & rx
+        xi = np.where(flip, np.uint64(side) - xi, xi)
+        yi = np.where(flip, np.uint64(side) - yi, yi)
+        swap = ~ry
+        xi, yi = np.where(swap, yi, xi), np.where(swap, xi, yi)
+        s >>= np.uint64(1)
+
+    d[~valid] = np.iinfo(np.uint64).max
+    return d
+
+# Function to cut a Hilbert-sorted layer into row groups of neighboring features
+def hilbert_row_groups(keys, max_rows, order=HILBERT_ORDER):
+    """
+    Splits sorted Hilbert indices into row groups following the curve's cells.
+
+    Curve cells (quadrants, then their quadrants...) holding more than max_rows
+    features are split until they fit. Consecutive cells are then merged while
+    they fit in max_rows and stay within the parent cell of the largest one (and
+    within one quadrant of the extent). Each row group thus covers at most twice
+    the side of its largest cell, instead of an arbitrary run of max_rows features.
+
+    Parameters:
+    keys (np.ndarray): Sorted Hilbert indices
+    max_rows (int): Maximum rows per row group
+    order (int, optional): Curve order of the indices, defaults to HILBERT_ORDER
+
+    Returns:
+    np.ndarray: Row group boundaries (start positions and the total count)
+    """
+    cells = []
+    stack = [(0, len(keys), 0)]
+
+    while stack:
+        start, end, level = stack.pop()
+        if end - start <= max_rows:
+            cells.append((start, end, level))
+        elif level >= order:
+            cells.extend((a, min(a + max_rows, end), order) for a in range(start, end, max_rows))
+        else:
+            shift = np.uint64(2 * (order - level - 1))
+            cell = keys[start] >> shift >> np.uint64(2) << np.uint64(2)
+            bounds = start + np.searchsorted(keys[start:end], (cell + np.arange(1, 4, dtype=np.uint64)) << shift)
+            edges = np.r_[start, bounds, end]
+            stack.extend((a, b, level + 1) for a, b in reversed(list(zip(edges[:-1], edges[1:]))) if b > a)
+
+    def common_level(a, b):
+        # Number of leading quadrant digits two curve positions share
+        diff = int(keys[a]) ^ int(keys[b])
+        return order - (diff.bit_length() + 1) // 2
+
+    # Merge consecutive cells while they fit, in rows and in extent
+    cuts = [0]
+    first, top = 0, None
+    for start, end, level in cells:
+        if top is not None:
+            top_ = min(top, level)
+            if end - cuts[-1] <= max_rows and common_level(first, end - 1) >= max(1, top_ - 1):
+                top = top_
+                continue
+            cuts.append(start)
+        first, top = start, level
+
+    return np.unique(np.r_[cuts, len(keys)]).astype(np.int64)
+
+# Function to write the row group index of a dataset
+def write_row_group_index(base, writers):
+    """
+    Writes the extents of the row groups of a dataset to {base}/_rowgroups.parquet.
+
+    Files starting with an underscore are ignored by pyarrow datasets, so the
+    index sits next to the data without being read as part of it.
+
+    Parameters:
+    base (str): Dataset directory
+    writers (list): GeoParquetWriter of each file of the dataset
+
+    Returns:
+    str: Path to the index
+    """
+    rows = [(os.path.relpath(w.path, base), *rg) for w in writers for rg in w.row_groups]
+    index = pd.DataFrame(rows, columns=["path", "row_group", "rows", "xmin", "ymin", "xmax", "ymax"])
+    path = os.path.join(base, ROW_GROUP_INDEX)
+    pq.write_table(pa.Table.from_pandas(index, preserve_index=False), path)
+    return path
+
+# Function to convert one GeoPackage layer into a partitioned GeoParquet dataset
+def layer_to_geoparquet(gpkg, layer, outdir, partitioning="vpuid", row_group_size=None,
+                        compression="zstd", chunksize=100000, sort=None):
+    """
+    Streams a GeoPackage layer into a Hive-partitioned GeoParquet dataset.
+
+    Writes {outdir}/{layer}/{partitioning}={value}/part-0.parquet, or
+    {outdir}/{layer}/part-0.parquet if the layer has no partitioning column.
+    Spatial layers also get a row group index ({outdir}/{layer}/_rowgroups.parquet)
+    holding the extent of every row group, used by open_dataset and read_parquet
+    to read only the row groups intersecting a bbox.
+
+    With sort="hilbert", features are written along a Hilbert curve over the layer
+    extent and row groups are cut on curve cells (see hilbert_row_groups), so each
+    covers a compact area and small-area reads touch few row groups.
+    row_group_size defaults to 122880 rows, or 16384 for the Hilbert layout.
     """
-    table = pq.Table.from_pandas(df)
-    pq.write_table(table, file_path)
+    handle = get_gpkg(gpkg)
+    layout = layer_schema(handle, layer, partitioning)
+
+    if sort == "hilbert" and layout["geom_col"] and layout["pk"]:
+        return layer_to_hilbert_geoparquet(handle, layer, outdir, layout, row_group_size or HILBERT_ROW_GROUP_SIZE,
+                                           compression, chunksize)
+    elif sort not in (None, "hilbert"):
+        raise ValueError(f"unknown sort: {sort}")
+
+    row_group_size = row_group_size or 122880
+    part, geom_col = layout["part"], layout["geom_col"]
+    writers = {}
+    base = os.path.join(outdir, layer)
+
+    def writer(key):
+        if key not in writers:
+            path = os.path.join(base, f"{part}={key}" if part else "", "part-0.parquet")
+            writers[key] = GeoParquetWriter(path, layout["schema"], geom_col, layout["crs"], row_group_size, compression)
+        return writers[key]
+
+    try:
+        for chunk in read_sf_dataset_sqlite_chunks(handle.connect(), layer, chunksize, columns=layout["cols"]):
+            if chunk.empty:
+                continue
+
+            table, bounds, geometry_types = chunk_table(chunk, layout)
+
+            if not part:
+                writer(None).write(table, bounds, set(geometry_types[pd.notna(geometry_types)]))
+                continue
+
+            # Split the chunk by partition value
+            keys = chunk[part].astype(object).where(chunk[part].notna(), HIVE_NULL).astype(str)
+            table = table.drop_columns([part])
+
+            for key, idx in keys.groupby(keys).indices.items():
+                types_ = geometry_types[idx] if geom_col else geometry_types
+                writer(key).write(
+                    table.take(idx),
+                    bounds[idx] if bounds is not None else None,
+                    set(types_[pd.notna(types_)])
+                )
+    finally:
+        for w in writers.values():
+            w.close()
+
+    if geom_col and writers:
+        write_row_group_index(base, list(writers.values()))
 
-def open_dataset(folder_path):
+    return sorted(w.path for w in writers.values())
+
+# Function to write a GeoPackage layer along a Hilbert curve
+def layer_to_hilbert_geoparquet(handle, layer, outdir, layout, row_group_size, compression, chunksize):
+    """
+    Writes the Hilbert-sorted layout of layer_to_geoparquet in two passes.
+
+    The first pass streams the primary key, partition value and bounds of every
+    feature (see feature_bounds); the second reads the features of each row group
+    by primary key, in curve order, so memory is bounded by the row group size.
+    """
+    part, pk, geom_col = layout["part"], layout["pk"], layout["geom_col"]
+    conn = handle.connect()
+
+    # Pass 1: keys, partitions and bounds
+    keys, parts, bounds = [], [], []
+    for chunk, chunk_bounds in feature_bounds(handle, layer, pk, part, geom_col, chunksize):
+        keys.append(chunk[pk].to_numpy())
+        parts.append(chunk[part].astype(object).where(chunk[part].notna(), HIVE_NULL).astype(str).to_numpy()
+                     if part else np.full(len(chunk), None, dtype=object))
+        bounds.append(chunk_bounds)
+
+    base = os.path.join(outdir, layer)
+    if not keys:
+        return []
+
+    keys, parts, bounds = np.concatenate(keys), np.concatenate(parts), np.concatenate(bounds)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        extent = (*np.nanmin(bounds[:, :2], axis=0), *np.nanmax(bounds[:, 2:], axis=0))
+    curve = hilbert_index((bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2, extent)
+
+    # Pass 2: each partition in curve order, one row group at a time
+    writers = []
+    order = np.lexsort((curve, parts.astype(str)))
+    groups = pd.Series(parts[order]).groupby(parts[order], sort=True, dropna=False).indices
+
+    for key, idx in groups.items():
+        idx = order[idx]
+        path = os.path.join(base, f"{part}={key}" if part else "", "part-0.parquet")
+        writer = GeoParquetWriter(path, layout["schema"], geom_col, layout["crs"], row_group_size, compression)
+        writers.append(writer)
+
+        try:
+            cuts = hilbert_row_groups(curve[idx], row_group_size)
+            for start, end in zip(cuts[:-1], cuts[1:]):
+                ids = keys[idx[start:end]]
+                chunk = read_sf_dataset_sqlite(
+                    conn, layer, columns=[pk] + layout["cols"],
+                    where=f'"{pk}" IN (SELECT value FROM json_each(?))', params=[json.dumps(ids.tolist())]
+                )
+                chunk = chunk.iloc[pd.Index(chunk[pk]).get_indexer(ids)]
+
+                table, chunk_bounds, geometry_types = chunk_table(chunk, layout)
+                if part:
+                    table = table.drop_columns([part])
+                writer.write(table, chunk_bounds, set(geometry_types[pd.notna(geometry_types)]))
+                writer.flush()
+        finally:
+            writer.close()
+
+    write_row_group_index(base, writers)
+    return sorted(w.path for w in writers)
+
+# Function to stream the bounds of the features of a layer
+def feature_bounds(handle, layer, pk, part, geom_col, chunksize):
+    """
+    Streams the primary key, partition value and bounds of the features of a layer.
+
+    Bounds come from the layer's rtree index (minx, maxx, miny, maxy of each
+    feature), paged by primary key, so no geometry is decoded. Layers without an
+    rtree index fall back to decoding their geometries. Features missing from the
+    index (NULL or empty geometries) get NaN bounds.
+
+    Yields:
+    tuple: Chunk (pd.DataFrame of pk and part) and its (xmin, ymin, xmax, ymax) bounds (np.ndarray)
+    """
+    conn = handle.connect()
+    rtree = handle.rtree(layer)
+
+    if rtree is None:
+        for chunk in read_sf_dataset_sqlite_chunks(conn, layer, chunksize, columns=[pk] + ([part] if part else [])):
+            yield chunk, shapely.bounds(chunk[geom_col].values)
+        return
+
+    select = ", ".join([f't."{pk}"'] + ([f't."{part}"'] if part else []))
+    query = (
+        f'SELECT {select}, r.minx, r.miny, r.maxx, r.maxy FROM "{layer}" t '
+        f'LEFT JOIN "{rtree}" r ON r.id = t."{pk}" WHERE t."{pk}" > ? ORDER BY t."{pk}" LIMIT {int(chunksize)}'
+    )
+    after = -2 ** 63
+
+    while True:
+        data = read_sql(query, conn, [after], layer=layer)
+        if data.empty:
+            return
+
+        after = int(data[pk].iloc[-1])
+        yield data, data[["minx", "miny", "maxx", "maxy"]].to_numpy(dtype=np.float64)
+
+        if len(data) < chunksize:
+            return
+
+# Function to convert a GeoPackage into partitioned GeoParquet datasets
+def gpkg_to_geoparquet(gpkg, outdir, layers=None, partitioning="vpuid", row_group_size=None,
+                       compression="zstd", chunksize=100000, workers=None, sort=None):
+    """
+    Converts the layers of a GeoPackage into Hive-partitioned GeoParquet datasets.
+
+    Layers are streamed out of the GeoPackage in chunks and converted in parallel.
+    Each file carries GeoParquet 1.1 metadata and a bbox covering column.
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+    outdir (str): Directory to write one dataset per layer to
+    layers (list, optional): Layers to convert, defaults to None (all feature and attribute layers)
+    partitioning (str, optional): Column used for Hive partitioning, defaults to "vpuid"
+    row_group_size (int, optional): Rows per row group, defaults to None (122880, or
+        16384 for the Hilbert layout)
+    compression (str, optional): Parquet compression codec, defaults to "zstd"
+    chunksize (int, optional): Rows read from the GeoPackage at a time, defaults to 100000
+    workers (int, optional): Number of processes converting layers in parallel,
+        defaults to None (serial)
+    sort (str, optional): "hilbert" to write spatial layers along a Hilbert curve
+        (see layer_to_geoparquet), defaults to None (GeoPackage order)
+
+    Returns:
+    dict: Written files keyed by layer name
+    """
+    from concurrent.futures import ProcessPoolExecutor  # Pulls in multiprocessing, only needed here
+
+    if layers is None:
+        layers = gpd.list_layers(gpkg)["name"].tolist()
+        layers = [layer for layer in layers if layer != "layer_styles"]
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+        files = run(
+            layer_to_geoparquet, repeat(gpkg), layers, repeat(outdir), repeat(partitioning),
+            repeat(row_group_size), repeat(compression), repeat(chunksize), repeat(sort)
+        )
+        return dict(zip(layers, files))
+
+def open_dataset(folder_path, columns=None, filters=None, bbox=None):
     """
     Opens a parquet dataset from a directory.
+
+    Filters and bbox prune partitions and row groups up front (bbox through the
+    row group index when the dataset has one); each remaining row group becomes
+    one lazily read partition of the dask dataframe.
     """
-    return dd.read_parquet(folder_path)
-    
+    dataset = parquet_dataset(folder_path)
+    expr = dataset_filter(dataset, filters, bbox)
+    meta = dataset.schema.empty_table().to_pandas()
+
+    if columns is not None:
+        meta = meta[list(columns)]
+
+    indexed = indexed_fragments(dataset, folder_path, bbox, expr) if bbox is not None else None
+
+    if indexed is not None:
+        fragments = [
+            fragment.subset(row_group_ids=[row_group.id])
+            for fragment in indexed
+            for row_group in fragment.row_groups
+        ]
+    elif expr is None:
+        fragments = list(dataset.get_fragments())
+    else:
+        fragments = [
+            row_group
+            for fragment in dataset.get_fragments(filter=expr)
+            for row_group in fragment.split_by_row_group(expr, schema=dataset.schema)
+        ]
+
+    # dask converts object columns to strings by default, which fails on the WKB
+    # geometry and mangles the bbox struct; their values stay bytes and dicts
+    with dask.config.set({"dataframe.convert-string": False}):
+        if not fragments:
+            return dd.from_pandas(meta, npartitions=1)
+
+        return dd.from_map(
+            read_fragment, fragments, schema=dataset.schema, columns=columns, expr=expr, meta=meta
+        )
+
+def read_fragment(fragment, schema, columns=None, expr=None):
+    """
+    Reads one dataset fragment (file or row group) as a dataframe.
+    """
+    return fragment.to_table(schema=schema, columns=columns, filter=expr).to_pandas()
+
+def parquet_dataset(path):
+    """
+    Opens a parquet file or a Hive-partitioned directory as a pyarrow dataset.
+
+    Partition keys are read as strings so VPU ids such as "01" or "10L" keep their form.
+    """
+    keys = []
+    folder = path
+
+    while os.path.isdir(folder):
+        parts = sorted(entry for entry in os.listdir(folder)
+                       if "=" in entry and os.path.isdir(os.path.join(folder, entry)))
+        if not parts:
+            break
+        keys.append(parts[0].split("=", 1)[0])
+        folder = os.path.join(folder, parts[0])
+
+    partitioning = ds.partitioning(pa.schema([(key, pa.string()) for key in keys]), flavor="hive") if keys else None
+    return ds.dataset(path, format="parquet", partitioning=partitioning)
+
+def dataset_filter(dataset, filters=None, bbox=None):
+    """
+    Builds the pyarrow filter expression of a query.
+
+    Parameters:
+    dataset (ds.Dataset): Dataset to filter
+    filters (dict, list or ds.Expression, optional): Row filters. A dict maps columns to
+        a value or a list of values (e.g. {"vpuid": "01", "id": [...]}); a list holds
+        DNF (column, op, value) tuples as in pq.read_table; expressions are used as is.
+    bbox (tuple, optional): (xmin, ymin, xmax, ymax) matched against the bbox covering
+        column of the GeoParquet metadata
+
+    Returns:
+    ds.Expression or None: Filter expression
+    """
+    terms = []
+
+    if isinstance(filters, dict):
+        for col, value in filters.items():
+            if isinstance(value, (list, tuple, set, np.ndarray, pd.Series)):
+                terms.append(pc.field(col).isin(list(value)))
+            else:
+                terms.append(pc.field(col) == value)
+    elif isinstance(filters, list):
+        terms.append(pq.filters_to_expression(filters))
+    elif filters is not None:
+        terms.append(filters)
+
+    if bbox is not None:
+        terms += bbox_terms(bbox_covering(dataset), bbox)
+
+    expr = None
+    for term in terms:
+        expr = term if expr is None else expr & term
+    return expr
+
+def bbox_terms(covering, bbox):
+    """
+    Returns the filter terms matching rows whose bbox covering intersects a bbox.
+
+    Parameters:
+    covering (dict): Covering column paths (see bbox_covering)
+    bbox (tuple): (xmin, ymin, xmax, ymax)
+
+    Returns:
+    list: ds.Expression terms
+    """
+    xmin, ymin, xmax, ymax = map(float, bbox)
+    return [
+        pc.field(*covering["xmin"]) <= xmax,
+        pc.field(*covering["xmax"]) >= xmin,
+        pc.field(*covering["ymin"]) <= ymax,
+        pc.field(*covering["ymax"]) >= ymin,
+    ]
+
+def indexed_fragments(dataset, path, bbox, expr=None):
+    """
+    Selects the row groups intersecting a bbox from the row group index of a dataset
+    (see layer_to_geoparquet), without reading the footers of the other files.
+
+    Parameters:
+    dataset (ds.Dataset): Dataset opened on path
+    path (str): Dataset directory
+    bbox (tuple): (xmin, ymin, xmax, ymax)
+    expr (ds.Expression, optional): Filter used to prune partitions, defaults to None
+
+    Returns:
+    list or None: File fragments restricted to their intersecting row groups, None
+        if the dataset has no row group index
+    """
+    index_path = os.path.join(path, ROW_GROUP_INDEX)
+    if not os.path.isfile(index_path):
+        return None
+
+    index = pq.read_table(index_path).to_pandas()
+    xmin, ymin, xmax, ymax = map(float, bbox)
+    hits = index[(index["xmin"] <= xmax) & (index["xmax"] >= xmin) & (index["ymin"] <= ymax) & (index["ymax"] >= ymin)]
+    row_groups = hits.groupby("path")["row_group"].agg(list).to_dict()
+
+    fragments = []
+    for fragment in dataset.get_fragments(filter=expr):
+        ids = row_groups.get(os.path.relpath(fragment.path, path))
+        if ids:
+            fragments.append(fragment.subset(row_group_ids=ids))
+    return fragments
+
+def bbox_covering(dataset):
+    """
+    Returns the bbox covering column paths of a GeoParquet dataset.
+    """
+    fragment = next(dataset.get_fragments(), None)
+    metadata = fragment.metadata.metadata if fragment is not None else None
+    return geo_covering(metadata, dataset.schema.names)
+
+def geo_covering(metadata, names):
+    """
+    Returns the bbox covering column paths from the key-value metadata of a
+    GeoParquet file, falling back to a "bbox" struct column.
+
+    Parameters:
+    metadata (dict or None): Key-value metadata of the file footer
+    names (list): Top-level column names
+
+    Returns:
+    dict: Column path of xmin, ymin, xmax and ymax
+    """
+    if metadata and b"geo" in metadata:
+        geo = json.loads(metadata[b"geo"])
+        covering = geo["columns"][geo["primary_column"]].get("covering", {}).get("bbox")
+        if covering:
+            return covering
+
+    if "bbox" in names:
+        return {name: ["bbox", name] for name in ("xmin", "ymin", "xmax", "ymax")}
+
+    raise ValueError("dataset has no bbox covering column.")
+
 # String interpolation (glue equivalent)
 def glue(template_str, **kwargs):
     """
@@ -0,0 +1,313 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+import pandas as pd
+
+# A pipeline step: func builds the `output` column from the `inputs` columns (or literal paths).
+# Steps with across=True run once over all VPUs (e.g. assign_global_identifiers in 05_global_id.R).
+Step = namedtuple("Step", ["name", "func", "inputs", "output", "params", "across"], defaults=[None, False])
+
+# Suffix of the build records written next to each output
+RECORD_SUFFIX = ".build.json"
+
+# Block size used to hash inputs
+HASH_BLOCK = 1 << 23
+
+# Function to build the pipeline table of runners/config.R
+def pipeline_table(base, version, vpus, corrected_vpus=()):
+    """
+    Builds the per-VPU pipeline table of runners/config.R.
+
+    Parameters:
+    base (str): Base directory (e.g. {dir}/conus-hydrofabric/v{version})
+    version (str): Hydrofabric version
+    vpus (list): VPUs to process
+    corrected_vpus (list, optional): VPUs with a corrected refactor, defaults to ()
+
+    Returns:
+    pd.DataFrame: One row per VPU with the path of every pipeline product
+    """
+    vpus = list(vpus)
+    return pd.DataFrame({
+        "vpus": vpus,
+        "uniform": [f"{base}/uniform/uniform_{v}.gpkg" for v in vpus],
+        "uniform_global": [f"{base}/global_uniform/uniform_{v}.gpkg" for v in vpus],
+        "nextgen": [f"{base}/{version}/gpkg/nextgen_{v}.gpkg" for v in vpus],
+        "cfe": [f"{base}/cfe/cfe_noahowp_{v}.parquet" for v in vpus],
+        "atts": [f"{base}/{version}/model_attributes/nextgen_{v}.parquet" for v in vpus],
+        "corrected_refactor": [f"{base}/corrected_refactor/corrected_refactor_{v}.gpkg" if v in corrected_vpus else None
+                               for v in vpus]
+    })
+
+# Function to normalize a missing path (None, or NaN once stored in the pipeline table) to None
+def as_path(value):
+    return None if pd.isna(value) else value
+
+# Function to hash a file (or a directory of files, e.g. a parquet dataset)
+def hash_path(path, previous=None):
+    """
+    Computes the content hash of a file or directory.
+
+    The hash of a previous build record is reused when the size and modification
+    time of the path are unchanged, so unchanged inputs are not read again.
+
+    Parameters:
+    path (str): Path to hash
+    previous (dict, optional): Entry of the path in a previous build record, defaults to None
+
+    Returns:
+    dict: size, mtime_ns and sha256 of the path (None if the path does not exist)
+    """
+    path = as_path(path)
+    if path is None or not os.path.exists(path):
+        return None
+
+    if os.path.isdir(path):
+        files = sorted(os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs)
+        stats = [os.stat(f) for f in files]
+        size = sum(s.st_size for s in stats)
+        mtime = max([s.st_mtime_ns for s in stats], default=os.stat(path).st_mtime_ns)
+    else:
+        files = [path]
+        st = os.stat(path)
+        size, mtime = st.st_size, st.st_mtime_ns
+
+    if previous and previous.get("size") == size and previous.get("mtime_ns") == mtime:
+        return previous
+
+    h = hashlib.sha256()
+    for f in files:
+        h.update(os.path.relpath(f, path).encode())
+        with open(f, "rb") as src:
+            for block in iter(lambda: src.read(HASH_BLOCK), b""):
+                h.update(block)
+
+    return {"size": size, "mtime_ns": mtime, "sha256": h.hexdigest()}
+
+# Function to version the code of a step
+def code_version(func, version=None):
+    """
+    Hashes the source of a step function (and an optional release/commit version).
+    """
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}"
+
+    return hashlib.sha256(f"{version}\n{source}".encode()).hexdigest()
+
+# Function to read the build record of an output
+def read_record(output):
+    try:
+        with open(output + RECORD_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# Function to describe the current state of a step's inputs
+def build_state(step, inputs, version=None, previous=None):
+    """
+    Collects the input hashes, parameters and code version of a step.
+    """
+    prev = (previous or {}).get("inputs", {})
+    return {
+        "step": step.name,
+        "inputs": {p: hash_path(p, prev.get(p)) for p in map(as_path, inputs) if p is not None},
+        "params": json.loads(json.dumps(step.params or {}, sort_keys=True, default=str)),
+        "code": code_version(step.func, version)
+    }
+
+# Function to check if an output is current
+def is_current(outputs, state, previous):
+    """
+    An output is current when it exists and its record matches the current state.
+    """
+    if previous is None or not all(os.path.exists(o) for o in outputs):
+        return False
+
+    same_inputs = {p: (h or {}).get("sha256") for p, h in previous.get("inputs", {}).items()} == \
+                  {p: (h or {}).get("sha256") for p, h in state["inputs"].items()}
+
+    return same_inputs and previous.get("params") == state["params"] and previous.get("code") == state["code"]
+
+# Function to get a temporary sibling path of an output
+def temp_path(output):
+    root, ext = os.path.splitext(output)
+    return f"{os.path.dirname(output) or '.'}/.{os.path.basename(root)}.{os.getpid()}.tmp{ext}"
+
+# Function to replace an output (and its build record) atomically
+def commit_output(tmp, output, state):
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    if os.path.isdir(output) and not os.path.isdir(tmp):
+        shutil.rmtree(output)
+    os.replace(tmp, output)
+
+    state = dict(state, output=hash_path(output))
+    with open(temp_path(output + RECORD_SUFFIX), "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(f.name, output + RECORD_SUFFIX)
+
+# Function to remove a temporary output
+def remove_temp(tmp):
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp, ignore_errors=True)
+    elif os.path.exists(tmp):
+        os.remove(tmp)
+
+# Function to resolve the inputs of a step for one VPU
+def step_inputs(step, row):
+    return [as_path(row[i]) if i in row.index else i for i in step.inputs]
+
+# Function to run one step
+def run_step(step, inputs, outputs, vpu=None, version=None, force=False, dry_run=False, dirty=False):
+    """
+    Runs one step if its outputs are stale, writing them atomically.
+
+    The step function is called with the input paths, the temporary output path(s)
+    as `outfile` (`outfiles` for across steps), the VPU (per-VPU steps) and the
+    step parameters. Outputs only replace the previous ones once the function
+    returns, so an interrupted build never leaves a partial output behind. In a
+    dry run, `dirty` marks steps whose inputs are themselves stale. Missing inputs
+    and outputs (None) are passed on as None; across steps get None as the
+    temporary output of VPUs without one. Any error, including one hashing the
+    inputs, fails the step rather than the run.
+
+    Returns:
+    tuple: status ("current", "stale", "built", "skipped" or "failed") and error message
+    """
+    present = [o for o in outputs if o is not None]
+    if not present:
+        return "skipped", "no output"
+
+    try:
+        previous = read_record(present[0])
+        flat = [as_path(p) for i in inputs for p in (i if isinstance(i, list) else [i])]
+        state = build_state(step, flat, version, previous)
+    except Exception as e:
+        return "failed", f"{type(e).__name__}: {e}"
+
+    if not force and not dirty and is_current(present, state, previous):
+        return "current", None
+
+    if dry_run:
+        return "stale", None
+
+    missing = [p for p in flat if p is not None and state["inputs"].get(p) is None]
+    if missing:
+        return "failed", f"missing input(s): {', '.join(missing)}"
+
+    tmps = [temp_path(o) if o is not None else None for o in outputs]
+
+    try:
+        for o in present:
+            os.makedirs(os.path.dirname(o) or ".", exist_ok=True)
+
+        if step.across:
+            step.func(*inputs, outfiles=tmps, **(step.params or {}))
+        else:
+            step.func(*inputs, outfile=tmps[0], vpu=vpu, **(step.params or {}))
+
+        for tmp, o in zip(tmps, outputs):
+            if o is not None:
+                commit_output(tmp, o, state)
+    except Exception as e:
+        return "failed", f"{type(e).__name__}: {e}"
+    finally:
+        for tmp in tmps:
+            if tmp is not None:
+                remove_temp(tmp)
+
+    return "built", None
+
+# Function to run a chain of per-VPU steps for one VPU (process pool entry point)
+def run_vpu(row, steps, version=None, force=False, dry_run=False, failed=False, stale=()):
+    out = []
+    stale = set(stale)
+    for step in steps:
+        if failed or as_path(row[step.output]) is None:
+            out.append((row["vpus"], step.name, "skipped", None))
+            continue
+
+        status, error = run_step(step, step_inputs(step, row), [row[step.output]],
+                                 row["vpus"], version, force, dry_run, bool(stale & set(step.inputs)))
+        failed = status == "failed"
+        if status == "stale":
+            stale.add(step.output)
+        out.append((row["vpus"], step.name, status, error))
+
+    return out
+
+# Function to run the pipeline
+def run_pipeline(pipeline, steps, workers=None, version=None, force=False, dry_run=False):
+    """
+    Runs the pipeline steps over all VPUs, rebuilding only stale outputs.
+
+    Each output gets a build record ({output}.build.json) holding the hashes of its
+    inputs, the step parameters and the step code version. An output is rebuilt
+    when it is missing, has no record, or any of these changed; since rebuilt
+    outputs get new hashes, their downstream steps are rebuilt as well. Consecutive
+    per-VPU steps run as independent VPU chains across a process pool, and across
+    steps run once all VPUs reached them.
+
+    Parameters:
+    pipeline (pd.DataFrame): Pipeline table (see pipeline_table)
+    steps (list): Steps in dependency order
+    workers (int, optional): Number of VPUs built concurrently, defaults to None (serial)
+    version (str, optional): Code version (e.g. a release or commit) folded into the
+        step code versions, defaults to None
+    force (bool, optional): Rebuild every output, defaults to False
+    dry_run (bool, optional): Only report which outputs are stale, defaults to False
+
+    Returns:
+    pd.DataFrame: vpus, step, status and error of every VPU step
+    """
+    rows = [row for _, row in pipeline.iterrows()]
+    failed = {row["vpus"]: False for row in rows}
+    stale = {row["vpus"]: set() for row in rows}
+    out = []
+
+    # Group consecutive per-VPU steps into stages separated by across steps
+    stages = []
+    for step in steps:
+        if step.across or not stages or stages[-1][0].across:
+            stages.append([step])
+        else:
+            stages[-1].append(step)
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+
+        for stage in stages:
+            if stage[0].across:
+                step = stage[0]
+                if any(failed.values()):
+                    status, error = "skipped", "upstream VPU step failed"
+                else:
+                    inputs = [[as_path(r[i]) for r in rows] if i in pipeline.columns else i for i in step.inputs]
+                    dirty = any(set(step.inputs) & s for s in stale.values())
+                    status, error = run_step(step, inputs, [as_path(r[step.output]) for r in rows],
+                                             None, version, force, dry_run, dirty)
+                out.extend((r["vpus"], step.name, status if as_path(r[step.output]) is not None else "skipped", error)
+                           for r in rows)
+                if status == "failed":
+                    failed = {k: True for k in failed}
+                if status == "stale":
+                    stale = {k: s | {step.output} for k, s in stale.items()}
+                continue
+
+            results = run(run_vpu, rows, repeat(stage), repeat(version), repeat(force), repeat(dry_run),
+                          [failed[r["vpus"]] for r in rows], [stale[r["vpus"]] for r in rows])
+
+            for result in results:
+                out.extend(result)
+                vpu = result[0][0]
+                failed[vpu] = failed[vpu] or any(r[2] == "failed" for r in result)
+                stale[vpu] |= {step.output for step, r in zip(stage, result) if r[2] == "stale"}
+
+    return pd.DataFrame(out, columns=["vpus", "step", "status", "error"])
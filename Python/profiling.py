@@ -0,0 +1,264 @@
+import functools
+import itertools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+
+from .utils import msg
+
+# Profiling state. Set HYDROFABRIC_PROFILE=1 to enable it at import (process pool
+# workers inherit it), or HYDROFABRIC_PROFILE=log to also log every span.
+_enabled = os.environ.get("HYDROFABRIC_PROFILE", "").lower() not in ("", "0", "false")
+_log = os.environ.get("HYDROFABRIC_PROFILE", "").lower() == "log"
+
+# Number of finished spans kept in memory; older spans are dropped (hooks still
+# see every span, so long runs should stream to an exporter through register_hook)
+MAX_SPANS = 100000
+
+# Finished span records, registered hooks and the open spans of each thread
+_spans = deque(maxlen=MAX_SPANS)
+_hooks = []
+_local = threading.local()
+_lock = threading.Lock()
+_ids = itertools.count(1)
+
+# Function to turn profiling on
+def enable_profiling(log=False, max_spans=None):
+    """
+    Starts recording spans.
+
+    Parameters:
+    log (bool, optional): Also log each finished span as a JSON line through
+        utils.msg (silenced by quiet mode), defaults to False
+    max_spans (int, optional): Number of most recent spans kept in memory,
+        defaults to None (keep the current limit, initially MAX_SPANS)
+    """
+    global _enabled, _log, _spans
+    _enabled, _log = True, log
+
+    if max_spans is not None and max_spans != _spans.maxlen:
+        with _lock:
+            _spans = deque(_spans, maxlen=max_spans)
+
+# Function to turn profiling off
+def disable_profiling():
+    """
+    Stops recording spans. Recorded spans are kept until clear_spans.
+    """
+    global _enabled, _log
+    _enabled, _log = False, False
+
+def profiling_enabled():
+    return _enabled
+
+# Function to register a callback receiving every finished span
+def register_hook(hook):
+    """
+    Registers a callable called with the record (dict) of every finished span,
+    e.g. to forward timings to a metrics system. Errors raised by hooks are ignored.
+
+    Parameters:
+    hook (callable): Function taking a span record
+
+    Returns:
+    callable: The hook, so this can be used as a decorator
+    """
+    with _lock:
+        _hooks.append(hook)
+    return hook
+
+def unregister_hook(hook):
+    with _lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+# Function to read the resident set size of the current process
+def current_rss():
+    """
+    Returns the resident set size of the current process in bytes.
+
+    Falls back to the peak RSS where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+class Span:
+    """
+    A timed stage. Spans opened inside another span on the same thread are
+    recorded as its children.
+
+    Parameters:
+    name (str): Stage name, e.g. "sql_read"
+    attrs (dict): Attributes recorded with the span
+    """
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.rows = None
+        self.bytes = None
+
+    def set(self, rows=None, bytes=None, **attrs):
+        """
+        Records the rows and bytes handled by the stage and extra attributes.
+        """
+        if rows is not None:
+            self.rows = int(rows)
+        if bytes is not None:
+            self.bytes = int(bytes)
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+
+        self.id = next(_ids)
+        self.parent = stack[-1].id if stack else None
+        stack.append(self)
+
+        self.rss = current_rss()
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.t0
+        _local.stack.pop()
+
+        record = {
+            "name": self.name, "id": self.id, "parent": self.parent,
+            "pid": os.getpid(), "tid": threading.get_ident(),
+            "start": self.start, "duration": duration,
+            "rows": self.rows, "bytes": self.bytes,
+            "rss_delta": current_rss() - self.rss,
+            "attrs": self.attrs,
+            "error": repr(exc) if exc is not None else None,
+        }
+
+        with _lock:
+            _spans.append(record)
+            hooks = list(_hooks)
+
+        if _log:
+            msg(json.dumps(record, default=str), startup=True)
+
+        for hook in hooks:
+            try:
+                hook(record)
+            except Exception:
+                pass
+
+        return False
+
+class _NoSpan:
+    """
+    Span stand-in used while profiling is off.
+    """
+    def set(self, rows=None, bytes=None, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_no_span = _NoSpan()
+
+# Function to time a stage
+def span(name, **attrs):
+    """
+    Returns a context manager timing a stage when profiling is enabled.
+
+    Records wall time, RSS delta and, through Span.set, the rows and bytes
+    handled by the stage. Costs a single flag check when profiling is off.
+
+    Parameters:
+    name (str): Stage name
+    attrs: Attributes recorded with the span (e.g. layer="divides")
+
+    Returns:
+    Span: Context manager
+
+    Example:
+    with span("sql_read", layer=lyr) as s:
+        data = pd.read_sql(query, conn)
+        s.set(rows=len(data))
+    """
+    return Span(name, attrs) if _enabled else _no_span
+
+# Decorator timing every call of a function
+def profiled(name=None):
+    """
+    Decorates a function so each call is timed as a span named after it.
+
+    Spans recorded inside process pool workers stay in the worker process.
+
+    Parameters:
+    name (str, optional): Span name, defaults to None (the function name)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_spans():
+    with _lock:
+        return list(_spans)
+
+def clear_spans():
+    with _lock:
+        _spans.clear()
+
+# Function to write the recorded spans as JSON lines
+def export_spans(path):
+    """
+    Writes the recorded spans to a file, one JSON record per line.
+
+    Parameters:
+    path (str): Output file
+
+    Returns:
+    str: Output file
+    """
+    with open(path, "w") as f:
+        for record in get_spans():
+            f.write(json.dumps(record, default=str) + "\n")
+    return path
+
+# Function to write the recorded spans as a Chrome trace
+def export_chrome_trace(path):
+    """
+    Writes the recorded spans in the Chrome trace event format, which can be
+    opened in chrome://tracing or Perfetto.
+
+    Parameters:
+    path (str): Output file
+
+    Returns:
+    str: Output file
+    """
+    events = []
+    for record in get_spans():
+        args = {key: record[key] for key in ("rows", "bytes", "rss_delta", "error") if record[key] is not None}
+        args.update(record["attrs"])
+        events.append({
+            "name": record["name"], "ph": "X", "pid": record["pid"], "tid": record["tid"],
+            "ts": record["start"] * 1e6, "dur": record["duration"] * 1e6, "args": args,
+        })
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+    return path
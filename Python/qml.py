@@ -1,98 +1,199 @@
-import geopandas as gpd
-import pandas as pd
 import os
-from datetime import datetime
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, nullcontext
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import repeat
+from pathlib import Path
+import pandas as pd
+
+# Default QML directory (inst/qml of the package)
+QML_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'inst', 'qml')
+
+# Columns of the QGIS layer_styles table
+STYLE_COLUMNS = ['f_table_catalog', 'f_table_schema', 'f_table_name', 'f_geometry_column', 'styleName',
+                 'styleQML', 'styleSLD', 'useAsDefault', 'description', 'owner', 'ui', 'update_time']
+
+# Table definition used when a GeoPackage has no layer_styles yet
+STYLE_TABLE = """
+CREATE TABLE IF NOT EXISTS layer_styles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    f_table_catalog TEXT(256), f_table_schema TEXT(256), f_table_name TEXT(256),
+    f_geometry_column TEXT(256), styleName TEXT(30), styleQML TEXT, styleSLD TEXT,
+    useAsDefault BOOLEAN, description TEXT, owner TEXT(30), ui TEXT(30), update_time DATETIME
+)
+"""
 
 # Function to read a QML file
+@lru_cache(maxsize=None)
 def read_qml(qml_file):
     """
-    Reads in a QML file.
-    
+    Reads in a QML file (cached, as the same styles are appended to every VPU).
+
     Parameters:
     qml_file (str): Path to the QML file
-    
+
     Returns:
     str: Contents of the QML file as a string
     """
     with open(qml_file, 'r') as file:
         return file.read()
 
+# Function to list the geometry columns of a GeoPackage
+def geometry_columns(conn):
+    """
+    Reads gpkg_geometry_columns once.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to the GeoPackage
+
+    Returns:
+    dict: Geometry column keyed by table name
+    """
+    return dict(conn.execute("SELECT table_name, column_name FROM gpkg_geometry_columns").fetchall())
+
+# Function to create a style record
+def style_record(layer_name, geom_col, style_name, style_qml):
+    return {
+        'f_table_catalog': "",
+        'f_table_schema': "",
+        'f_table_name': layer_name,
+        'f_geometry_column': geom_col,
+        'styleName': style_name,
+        'styleQML': style_qml,
+        'styleSLD': "",
+        'useAsDefault': True,
+        'description': "Generated for hydrofabric",
+        'owner': "",
+        'ui': None,
+        'update_time': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    }
+
 # Function to create a style row (as a pandas DataFrame row)
 def create_style_row(gpkg_path, layer_name, style_name, style_qml):
     """
     Creates a style row for the layer.
-    
+
     Parameters:
     gpkg_path (str): Path to the GeoPackage
     layer_name (str): Name of the layer
     style_name (str): Name of the style
     style_qml (str): QML style content
-    
+
     Returns:
     pd.DataFrame: DataFrame representing the style row
     """
-    query = f"SELECT column_name FROM gpkg_geometry_columns WHERE table_name = '{layer_name}'"
-    geom_col = gpd.read_postgis(query, con=gpkg_path).iloc[0, 0]
-    
-    return pd.DataFrame({
-        'f_table_catalog': [""],
-        'f_table_schema': [""],
-        'f_table_name': [layer_name],
-        'f_geometry_column': [geom_col],
-        'styleName': [style_name],
-        'styleQML': [style_qml],
-        'styleSLD': [""],
-        'useAsDefault': [True],
-        'description': ["Generated for hydrofabric"],
-        'owner': [""],
-        'ui': [None],
-        'update_time': [datetime.now()]
-    })
+    with closing(sqlite3.connect(Path(gpkg_path).resolve().as_uri() + "?mode=ro", uri=True)) as conn:
+        geom_col = geometry_columns(conn).get(layer_name)
 
-# Function to append style to GPKG
-def append_style(gpkg_path, qml_dir=None, layer_names=None):
+    return pd.DataFrame([style_record(layer_name, geom_col, style_name, style_qml)])
+
+# Function to write style rows to a GeoPackage
+def write_styles(gpkg_path, records):
     """
-    Appends styles to a GeoPackage.
-    
+    Upserts style rows into layer_styles in a single transaction.
+
+    layer_styles is created (and registered in gpkg_contents) if needed; existing
+    rows with the same layer and style name are replaced, other styles are kept.
+
     Parameters:
     gpkg_path (str): Path to the GeoPackage
-    qml_dir (str): Directory path to the QML files
-    layer_names (list): List of layer names to populate
-    
+    records (list): Style records (see style_record)
+    """
+    with closing(sqlite3.connect(gpkg_path, timeout=60)) as conn, conn:
+        insert_styles(conn, records)
+
+# Function to upsert style rows on an open connection
+def insert_styles(conn, records):
+    """
+    Upserts style rows into layer_styles within the caller's transaction (see write_styles).
+
+    Parameters:
+    conn (sqlite3.Connection): Writable connection to the GeoPackage
+    records (list): Style records (see style_record)
+    """
+    conn.execute(STYLE_TABLE)
+    conn.execute(
+        "INSERT INTO gpkg_contents (table_name, data_type, identifier, description, last_change, srs_id) "
+        "SELECT 'layer_styles', 'attributes', 'layer_styles', '', strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM gpkg_contents WHERE table_name = 'layer_styles')"
+    )
+    conn.executemany(
+        "DELETE FROM layer_styles WHERE f_table_name = ? AND styleName = ?",
+        [(r['f_table_name'], r['styleName']) for r in records]
+    )
+    conn.executemany(
+        f"INSERT INTO layer_styles ({', '.join(STYLE_COLUMNS)}) VALUES ({', '.join('?' * len(STYLE_COLUMNS))})",
+        [tuple(r[c] for c in STYLE_COLUMNS) for r in records]
+    )
+
+    # GDAL caches feature counts; let it recount layer_styles
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'gpkg_ogr_contents'").fetchone():
+        conn.execute("UPDATE gpkg_ogr_contents SET feature_count = NULL WHERE table_name = 'layer_styles'")
+
+# Function to build the style records of the layers that have a QML file
+def style_records(geom_cols, tables, qml_dir=None, layer_names=None):
+    """
+    Builds the hydrofabric style records of the layers that have a QML file.
+
+    Parameters:
+    geom_cols (dict): Geometry column keyed by table name
+    tables (set): Tables of the GeoPackage
+    qml_dir (str): Directory path to the QML files, defaults to inst/qml
+    layer_names (list): List of layer names to style, defaults to all layers with a QML file
+
     Returns:
-    str: Path to the GeoPackage with the appended styles
-    """
-    # Default qml_dir if not provided
-    if qml_dir is None:
-        qml_dir = os.path.join(os.path.dirname(__file__), 'qml')
-    
-    # Find QML files and corresponding layers
-    qml_files = [f for f in os.listdir(qml_dir) if f.endswith('.qml')]
-    good_layers = [os.path.splitext(os.path.basename(f))[0] for f in qml_files]
-    
+    list: Style records (see style_record)
+    """
+    qml_dir = qml_dir or QML_DIR
+
     # Filter layer names to only those with matching QML files
-    layer_names = [layer for layer in layer_names if layer in good_layers]
-    files = [os.path.join(qml_dir, f"{layer}.qml") for layer in layer_names]
-    
-    # Read QML files and create style names
-    styles = [read_qml(file) for file in files]
-    style_names = [f"{layer}__hydrofabric_style" for layer in layer_names]
-    
-    # Create style rows
-    style_rows = pd.concat(
-        [create_style_row(gpkg_path, layer, style_name, style) 
-         for layer, style_name, style in zip(layer_names, style_names, styles)]
-    )
-    
-    # Check if "layer_styles" exists, and delete if necessary
-    layers = gpd.read_file(gpkg_path, layer=None)
-    if "layer_styles" in layers:
-        gpd.io.file.fiona.drvsupport.supported_drivers['GPKG'] = 'rw'
-        with fiona.open(gpkg_path, 'r+') as src:
-            src.remove('layer_styles')
-
-    # Write the new styles to the GPKG
-    if not style_rows.empty:
-        style_rows.to_file(gpkg_path, layer='layer_styles', driver='GPKG')
+    good_layers = {os.path.splitext(f)[0] for f in os.listdir(qml_dir) if f.endswith('.qml')}
+    layer_names = [layer for layer in (layer_names or sorted(good_layers)) if layer in good_layers]
+
+    return [
+        style_record(layer, geom_cols.get(layer), f"{layer}__hydrofabric_style",
+                     read_qml(os.path.join(qml_dir, f"{layer}.qml")))
+        for layer in layer_names if layer in tables
+    ]
+
+# Function to append style to one GPKG
+def append_gpkg_style(gpkg_path, qml_dir=None, layer_names=None):
+    """
+    Appends styles to one GeoPackage (see append_style).
+    """
+    with closing(sqlite3.connect(Path(gpkg_path).resolve().as_uri() + "?mode=ro", uri=True)) as conn:
+        geom_cols = geometry_columns(conn)
+        tables = {r[0] for r in conn.execute("SELECT table_name FROM gpkg_contents")}
+
+    records = style_records(geom_cols, tables, qml_dir, layer_names)
+
+    if records:
+        write_styles(gpkg_path, records)
 
     return gpkg_path
+
+# Function to append style to GPKG
+def append_style(gpkg_path, qml_dir=None, layer_names=None, workers=None):
+    """
+    Appends styles to a GeoPackage.
+
+    Styles are upserted into layer_styles with direct SQLite, in one transaction
+    per GeoPackage. A list of GeoPackages is styled concurrently.
+
+    Parameters:
+    gpkg_path (str or list): Path to the GeoPackage, or a list of paths
+    qml_dir (str): Directory path to the QML files, defaults to inst/qml
+    layer_names (list): List of layer names to populate, defaults to all layers with a QML file
+    workers (int): Number of processes used to style a list of GeoPackages, defaults to None (serial)
+
+    Returns:
+    str or list: Path(s) to the GeoPackage(s) with the appended styles
+    """
+    if isinstance(gpkg_path, (str, os.PathLike)):
+        return append_gpkg_style(gpkg_path, qml_dir, layer_names)
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+        return list(run(append_gpkg_style, gpkg_path, repeat(qml_dir), repeat(layer_names)))
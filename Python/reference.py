@@ -0,0 +1,254 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import shapely
+from pyarrow import parquet as pq
+
+from .profiling import span
+from .sqlite import as_sqlite, read_sf_dataset_sqlite_chunks, read_sql
+
+# Reference flowline columns and their network names (runners/02_reference_to_parquet.R)
+FLOWLINE_COLUMNS = {
+    "comid": "id", "tocomid": "toid", "terminalpa": "terminalpa", "levelpathi": "mainstemlp",
+    "vpuid": "vpuid", "reachcode": "reachcode", "frommeas": "frommeas", "tomeas": "tomeas",
+    "lengthkm": "lengthkm", "areasqkm": "areasqkm", "streamorde": "streamorde",
+    "totdasqkm": "totdasqkm", "hydroseq": "hydroseq", "dnhydroseq": "dnhydroseq"
+}
+
+# Reference catchment columns and their network names
+DIVIDE_COLUMNS = {"featureid": "divide_id", "vpuid": "vpuid", "areasqkm": "areasqkm"}
+
+# Hydrolocation schema (runners/config.R)
+HL_SCHEMA = ["poi_id", "hl_source", "hl_reference", "hl_link", "hl_position", "X", "Y", "hf_id", "hf_source"]
+
+# Function to extract the start and end nodes of flowlines
+def flowline_nodes(geometry):
+    """
+    Extracts the start (inlet) and end (outlet) node coordinates of flowlines.
+
+    Equivalent to nhdplusTools::get_node(position = "start" / "end") for all
+    flowlines at once: the first point of the first part and the last point of
+    the last part of each (multi)linestring. Missing or empty geometries give NaN.
+
+    Parameters:
+    geometry (array-like): LineString or MultiLineString geometries
+
+    Returns:
+    pd.DataFrame: inlet_X, inlet_Y, outlet_X and outlet_Y columns
+    """
+    geometry = np.asarray(geometry, dtype=object)
+    multi = shapely.get_type_id(geometry) == 5
+
+    first, last = geometry.copy(), geometry.copy()
+    first[multi] = shapely.get_geometry(geometry[multi], 0)
+    last[multi] = shapely.get_geometry(geometry[multi], -1)
+
+    inlet = shapely.get_point(first, 0)
+    outlet = shapely.get_point(last, -1)
+
+    return pd.DataFrame({
+        "inlet_X": shapely.get_x(inlet), "inlet_Y": shapely.get_y(inlet),
+        "outlet_X": shapely.get_x(outlet), "outlet_Y": shapely.get_y(outlet),
+    })
+
+# Function to read the reference flowline attributes and nodes
+def read_reference_flowlines(gpkg, layer="reference_flowline", columns=None, chunksize=500000):
+    """
+    Reads the attributes and inlet/outlet nodes of the reference flowlines.
+
+    The layer is streamed in chunks; node coordinates are extracted from each
+    chunk and the geometries dropped, so peak memory is bounded by the chunk size.
+
+    Parameters:
+    gpkg (str): Path to the reference GeoPackage
+    layer (str, optional): Flowline layer, defaults to "reference_flowline"
+    columns (dict, optional): Columns to read and their output names, defaults to FLOWLINE_COLUMNS
+    chunksize (int, optional): Flowlines read at a time, defaults to 500000
+
+    Returns:
+    pd.DataFrame: Flowline attributes with inlet_X/Y and outlet_X/Y
+    """
+    columns = columns or FLOWLINE_COLUMNS
+    conn = as_sqlite(gpkg, layer)
+    parts = []
+
+    for chunk in read_sf_dataset_sqlite_chunks(conn, layer, chunksize, columns=list(columns)):
+        with span("flowline_nodes", layer=layer) as s:
+            nodes = flowline_nodes(chunk.geometry.values)
+            s.set(rows=len(nodes))
+
+        attrs = pd.DataFrame(chunk[list(columns)]).rename(columns=columns).reset_index(drop=True)
+        parts.append(pd.concat([attrs, nodes], axis=1))
+
+    if not parts:
+        return pd.DataFrame(columns=list(columns.values()) + ["inlet_X", "inlet_Y", "outlet_X", "outlet_Y"])
+
+    return pd.concat(parts, ignore_index=True)
+
+# Function to read the reference divide attributes
+def read_reference_divides(gpkg, layer="reference_catchments", columns=None):
+    """
+    Reads the attributes of the reference catchments without decoding their geometry.
+
+    Parameters:
+    gpkg (str): Path to the reference catchment GeoPackage
+    layer (str, optional): Catchment layer, defaults to "reference_catchments"
+    columns (dict, optional): Columns to read and their output names, defaults to DIVIDE_COLUMNS
+
+    Returns:
+    pd.DataFrame: Divide attributes
+    """
+    columns = columns or DIVIDE_COLUMNS
+    select = ", ".join(f'"{col}" AS "{name}"' for col, name in columns.items())
+    return read_sql(f'SELECT {select} FROM "{layer}"', as_sqlite(gpkg, layer), layer=layer)
+
+# Function to build the reference network table
+def reference_network(fl, div, hl=None):
+    """
+    Joins the reference flowlines and divides into the reference network table.
+
+    Parameters:
+    fl (pd.DataFrame): Flowline attributes (see read_reference_flowlines)
+    div (pd.DataFrame): Divide attributes (see read_reference_divides)
+    hl (pd.DataFrame, optional): Hydrolocations keyed by id, defaults to None
+
+    Returns:
+    pd.DataFrame: Network with one row per divide and/or flowline (and hydrolocation)
+    """
+    net = (
+        div.drop(columns="vpuid", errors="ignore")
+        .assign(id=div["divide_id"])
+        .merge(fl.drop(columns="areasqkm", errors="ignore"), on="id", how="outer")
+    )
+    net["hf_id"] = net["id"]
+    net["topo"] = "fl-fl"
+
+    if hl is not None:
+        net = net.merge(hl.drop(columns=["vpuid", "X", "Y"], errors="ignore"), on="id", how="left")
+
+    return net
+
+# Function to find the RouteLink waterbody outlets and inlets
+def routelink_waterbodies(routelink, net):
+    """
+    Finds the outlet and inlet flowlines of the RouteLink waterbodies.
+
+    The outlet of a waterbody is its flowline(s) with the lowest hydroseq. Its
+    inlets are the flowlines draining into a waterbody flowline that no other
+    flowline of the same waterbody drains into. Both are found with sorted-array
+    and hash-join kernels over all waterbodies at once.
+
+    Parameters:
+    routelink (pd.DataFrame): hf_id (link) and hl_link (NHDWaterbodyComID) columns
+    net (pd.DataFrame): Reference network with id, toid, hf_id, hydroseq and outlet_X/Y
+
+    Returns:
+    pd.DataFrame: WBOut and WBIn hydrolocations in the HL_SCHEMA columns
+    """
+    rl = routelink[["hf_id", "hl_link"]]
+    rl = rl[rl["hl_link"] > 0].drop_duplicates()
+
+    topo = net[["hf_id", "toid", "hydroseq"]].drop_duplicates()
+    rl = rl.merge(topo, on="hf_id", how="left").dropna()
+
+    # Sort by waterbody, then hydroseq
+    order = np.lexsort((rl["hydroseq"].to_numpy(), rl["hl_link"].to_numpy()))
+    rl = rl.iloc[order].reset_index(drop=True)
+    link = rl["hl_link"].to_numpy()
+    hydroseq = rl["hydroseq"].to_numpy()
+
+    # Outlets: rows tied with the first (lowest) hydroseq of their waterbody
+    starts = np.flatnonzero(np.r_[True, link[1:] != link[:-1]])
+    counts = np.diff(np.r_[starts, len(link)])
+    outlets = rl[hydroseq == np.repeat(hydroseq[starts], counts)][["hl_link", "hf_id"]]
+    outlets = outlets.assign(hl_reference="WBOut")
+
+    # Inlets: upstream flowlines of waterbody flowlines no flowline of the same waterbody drains into
+    drained = pd.MultiIndex.from_arrays([rl["hl_link"], rl["toid"]])
+    top = rl[~pd.MultiIndex.from_arrays([rl["hl_link"], rl["hf_id"]]).isin(drained)]
+
+    edges = net[["id", "toid"]].dropna().drop_duplicates().rename(columns={"id": "fromid", "toid": "hf_id"})
+    inlets = top[["hl_link", "hf_id"]].merge(edges, on="hf_id")
+    inlets = inlets[["hl_link", "fromid"]].rename(columns={"fromid": "hf_id"}).assign(hl_reference="WBIn")
+
+    wbs = pd.concat([outlets, inlets], ignore_index=True)
+    wbs["hl_link"] = wbs["hl_link"].astype("int64").astype(str)
+    wbs["hf_source"] = "reference_features"
+    wbs["hl_source"] = "nwm_v3.0.9_routelink"
+    wbs["hl_position"] = "outlet"
+    wbs["poi_id"] = np.nan
+
+    # Node coordinates of the hydrolocation flowlines
+    xy = net[["hf_id", "outlet_X", "outlet_Y"]].drop_duplicates("hf_id").set_index("hf_id")
+    wbs["X"] = wbs["hf_id"].map(xy["outlet_X"])
+    wbs["Y"] = wbs["hf_id"].map(xy["outlet_Y"])
+
+    return wbs[HL_SCHEMA].drop_duplicates().reset_index(drop=True)
+
+# Function to read the waterbody links of a RouteLink file
+def read_routelink(path):
+    """
+    Reads the link and NHDWaterbodyComID variables of a NWM RouteLink NetCDF file.
+
+    Returns:
+    pd.DataFrame: hf_id and hl_link columns
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(path) as nc:
+        return pd.DataFrame({
+            "hf_id": np.asarray(nc.variables["link"][:]),
+            "hl_link": np.asarray(nc.variables["NHDWaterbodyComID"][:]),
+        })
+
+# Function to write a table as a Hive-partitioned parquet dataset
+def write_partitioned(df, path, partitioning="vpuid"):
+    """
+    Writes a table as a parquet dataset partitioned by a column (one directory per value).
+
+    Returns:
+    str: Path to the dataset
+    """
+    with span("write", path=path) as s:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        cols = [partitioning] if partitioning in df.columns else None
+        pq.write_to_dataset(table, path, partition_cols=cols, existing_data_behavior="delete_matching")
+        s.set(rows=len(df))
+    return path
+
+# Function to rebuild the reference network
+def build_reference_network(ref_gpkg, ref_div, outdir, routelink=None, hl=None,
+                            flowline_layer="reference_flowline", divide_layer="reference_catchments"):
+    """
+    Rebuilds the reference network (and RouteLink waterbody hydrolocations) as parquet.
+
+    Python counterpart of the network part of runners/02_reference_to_parquet.R
+    and the RouteLink part of runners/03_update_hydrolocations.R.
+
+    Parameters:
+    ref_gpkg (str): Reference GeoPackage holding the flowlines
+    ref_div (str): Reference GeoPackage holding the catchments
+    outdir (str): Directory to write conus_network (and routelink_hydrolocations) to
+    routelink (str or pd.DataFrame, optional): RouteLink file or its hf_id/hl_link table,
+        defaults to None
+    hl (pd.DataFrame, optional): Hydrolocations joined to the network by id, defaults to None
+    flowline_layer (str, optional): Flowline layer, defaults to "reference_flowline"
+    divide_layer (str, optional): Catchment layer, defaults to "reference_catchments"
+
+    Returns:
+    dict: Paths of the written datasets
+    """
+    fl = read_reference_flowlines(ref_gpkg, flowline_layer)
+    div = read_reference_divides(ref_div, divide_layer)
+    net = reference_network(fl, div, hl)
+
+    out = {"network": write_partitioned(net, os.path.join(outdir, "conus_network"))}
+
+    if routelink is not None:
+        if isinstance(routelink, str):
+            routelink = read_routelink(routelink)
+        wbs = routelink_waterbodies(routelink, net)
+        out["routelink"] = write_partitioned(wbs, os.path.join(outdir, "routelink_hydrolocations"), None)
+
+    return out
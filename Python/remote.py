@@ -0,0 +1,1117 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import ssl
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+from .package import HIVE_NULL, ROW_GROUP_INDEX, bbox_terms, dataset_filter, geo_covering
+from .profiling import span
+from .utils import lazy_import
+
+# Heavy libraries are only imported once a remote store is read
+pa = lazy_import("pyarrow")
+ds = lazy_import("pyarrow.dataset")
+pq = lazy_import("pyarrow.parquet")
+
+# Bytes read from the end of a file on open, enough for the footer of most files
+# (pyarrow reads the same amount when it opens a parquet file)
+FOOTER_SIZE = 64 << 10
+
+# Ranges closer than this are fetched in one request; the bytes in between cost
+# less than another request does
+COALESCE_GAP = 512 << 10
+
+# Longer ranges are split into requests of this size, fetched concurrently
+PART_SIZE = 16 << 20
+
+# Requests in flight at a time (and keep-alive connections kept) per store
+MAX_CONNECTIONS = 16
+
+# Seconds a request may take before it is retried
+TIMEOUT = 60
+
+# Retries of failed requests (connection errors and 5xx), with exponential backoff
+RETRIES = 3
+RETRY_DELAY = 0.1
+
+# Redirects followed per request
+MAX_REDIRECTS = 5
+
+# Default bound of the block cache size in bytes. Set HYDROFABRIC_REMOTE_CACHE to
+# move the cache directory.
+MAX_BYTES = 2 << 30
+
+Response = namedtuple("Response", ["status", "headers", "body"])
+
+# Function to check the status of a response
+def check_response(response, url):
+    """
+    Raises FileNotFoundError for a 404 and OSError for other failed requests.
+    """
+    if response.status == 404:
+        raise FileNotFoundError(url)
+    if response.status >= 400:
+        raise OSError(f"HTTP {response.status} reading {url}")
+
+# Function to parse a Content-Range header
+def content_range(response):
+    """
+    Returns the (start, end, size) of a 206 response, end excluded. size is None
+    if the server does not know it.
+    """
+    match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", response.headers.get("content-range", "").strip())
+    if match is None:
+        raise OSError(f"invalid Content-Range: {response.headers.get('content-range')!r}")
+    start, end, size = match.groups()
+    return int(start), int(end) + 1, None if size == "*" else int(size)
+
+# Minimal asyncio HTTP/1.1 client with keep-alive connection reuse
+class HTTPClient:
+    """
+    HTTP/1.1 client over asyncio streams, enough for range reads of static files
+    (plain HTTP, HTTPS, public object store endpoints and presigned URLs).
+
+    At most max_connections requests are in flight at a time. Connections are kept
+    alive and reused per origin, so a batch of range requests costs one TCP (and
+    TLS) handshake per connection rather than per request.
+
+    Parameters:
+    max_connections (int, optional): Concurrent requests, defaults to MAX_CONNECTIONS
+    timeout (float, optional): Seconds per request, defaults to TIMEOUT
+    retries (int, optional): Retries of failed requests, defaults to RETRIES
+    """
+    def __init__(self, max_connections=MAX_CONNECTIONS, timeout=TIMEOUT, retries=RETRIES):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.requests = 0
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle = {}
+        self._ssl = None
+
+    async def request(self, method, url, headers=None):
+        """
+        Sends a request, following redirects and retrying failures.
+
+        Parameters:
+        method (str): "GET" or "HEAD"
+        url (str): URL
+        headers (dict, optional): Request headers, defaults to None
+
+        Returns:
+        Response: status, headers (lower-cased names) and body
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._retry(method, url, headers or {})
+            location = response.headers.get("location")
+            if response.status not in (301, 302, 303, 307, 308) or not location:
+                return response
+            url = urljoin(url, location)
+
+        raise OSError(f"too many redirects reading {url}")
+
+    async def close(self):
+        """
+        Closes the idle connections.
+        """
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle.clear()
+
+    async def _retry(self, method, url, headers):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._slots:
+                    response = await asyncio.wait_for(self._send(method, url, headers), self.timeout)
+                if response.status < 500 or attempt == self.retries:
+                    return response
+            except (OSError, EOFError):
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(RETRY_DELAY * 2 ** attempt)
+
+    async def _send(self, method, url, headers):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {url}")
+
+        origin = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc.rpartition('@')[2]}",
+                 "User-Agent: hydrofabric", "Accept-Encoding: identity"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        message = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        idle = self._idle.setdefault(origin, [])
+
+        while True:
+            reused = bool(idle)
+            reader, writer = idle.pop() if reused else await self._connect(origin)
+            try:
+                writer.write(message)
+                await writer.drain()
+                response, keep = await self._receive(reader, method)
+            except (OSError, EOFError):
+                writer.close()
+                # Keep-alive connections may have been closed by the server meanwhile
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            self.requests += 1
+            if keep and len(idle) < self.max_connections:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def _connect(self, origin):
+        scheme, host, port = origin
+        context = None
+        if scheme == "https":
+            context = self._ssl = self._ssl or ssl.create_default_context()
+        return await asyncio.open_connection(host, port, ssl=context)
+
+    async def _receive(self, reader, method):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionResetError("connection closed by the server")
+        version, status = line.decode("latin-1").split(None, 2)[:2]
+        status = int(status)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep = version != "HTTP/1.0" and headers.get("connection", "").lower() != "close"
+
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked(reader)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep = False
+
+        return Response(status, headers, body), keep
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if size == 0:
+                # Skip the trailers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+# Function to merge nearby byte ranges
+def coalesce_ranges(ranges, gap=COALESCE_GAP, part_size=PART_SIZE):
+    """
+    Merges byte ranges separated by less than gap, then splits the merged ranges
+    into parts of at most part_size bytes.
+
+    Parameters:
+    ranges (list): (start, end) byte ranges, end excluded
+    gap (int, optional): Largest gap merged, defaults to COALESCE_GAP
+    part_size (int, optional): Largest request, defaults to PART_SIZE
+
+    Returns:
+    list: Sorted (start, end) ranges to request
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [
+        (offset, min(offset + part_size, end))
+        for start, end in merged
+        for offset in range(start, end, part_size)
+    ]
+
+# Local cache of the byte ranges fetched from remote files
+class BlockCache:
+    """
+    Size-bounded on-disk cache of the blocks (coalesced byte ranges) fetched from
+    remote files.
+
+    Blocks are named after the URL, the version of the file (its size and ETag)
+    and their byte range. The size and ETag of each URL are kept next to them, so
+    a later open revalidates the file with one conditional request and reads the
+    blocks it already has locally. Like the layer cache, the least recently used
+    blocks (by file modification time) are evicted once the directory exceeds
+    max_bytes.
+
+    Parameters:
+    path (str): Cache directory, created if needed
+    max_bytes (int, optional): Size bound of the cache, defaults to MAX_BYTES
+    """
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = os.path.realpath(path)
+        self.max_bytes = int(max_bytes)
+        self._blocks = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, url):
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def meta(self, url):
+        """
+        Returns the last known (size, etag) of a URL, or None.
+        """
+        try:
+            with open(os.path.join(self.path, f"{self.key(url)}.json")) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta["size"], meta["etag"]
+
+    def set_meta(self, url, size, etag):
+        """
+        Records the current (size, etag) of a URL and removes the blocks of its
+        other versions.
+        """
+        key = self.key(url)
+        self._write(os.path.join(self.path, f"{key}.json"), json.dumps({"url": url, "size": size, "etag": etag}).encode())
+
+        keep = f"{key}-{file_version(size, etag)}-"
+        for name in os.listdir(self.path):
+            if name.startswith(key + "-") and not name.startswith(keep):
+                self.remove(name)
+
+    def read(self, url, version, start, end):
+        """
+        Returns bytes [start, end) of a file version, or None unless blocks cover them.
+        """
+        prefix = f"{self.key(url)}-{version}"
+        pos, chunks = start, []
+
+        for first, last, name in self._index(prefix):
+            if last <= pos:
+                continue
+            if first > pos:
+                return None
+            try:
+                with open(os.path.join(self.path, name), "rb") as f:
+                    f.seek(pos - first)
+                    chunks.append(f.read(min(last, end) - pos))
+                os.utime(os.path.join(self.path, name))
+            except FileNotFoundError:
+                # Evicted by another process
+                self._forget(prefix, name)
+                return None
+            pos = min(last, end)
+            if pos >= end:
+                return b"".join(chunks)
+
+        return None
+
+    def put(self, url, version, start, data):
+        """
+        Stores bytes fetched from offset start of a file version.
+        """
+        prefix = f"{self.key(url)}-{version}"
+        name = f"{prefix}-{start}-{start + len(data)}.blk"
+        self._write(os.path.join(self.path, name), data)
+
+        with self._lock:
+            blocks = self._index(prefix)
+            if (start, start + len(data), name) not in blocks:
+                blocks.append((start, start + len(data), name))
+                blocks.sort()
+
+    def evict(self):
+        """
+        Removes the least recently used blocks until the directory fits max_bytes.
+        """
+        entries = []
+        for item in os.scandir(self.path):
+            try:
+                st = item.stat()
+            except FileNotFoundError:
+                continue
+            if item.name.endswith(".blk"):
+                entries.append((st.st_mtime_ns, st.st_size, item.name))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(name)
+            total -= size
+
+    def remove(self, name):
+        """
+        Removes a block (or the metadata of a URL).
+        """
+        self._forget(name.rsplit("-", 2)[0], name)
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Removes all blocks and URL metadata.
+        """
+        for name in os.listdir(self.path):
+            if name.endswith((".blk", ".json")):
+                self.remove(name)
+
+    def _index(self, prefix):
+        # Blocks of a file version as sorted (start, end, name), listed on first use
+        blocks = self._blocks.get(prefix)
+        if blocks is None:
+            blocks = []
+            for name in os.listdir(self.path):
+                if name.startswith(prefix + "-") and name.endswith(".blk"):
+                    start, end = name[len(prefix) + 1:-4].split("-")
+                    blocks.append((int(start), int(end), name))
+            blocks = self._blocks[prefix] = sorted(blocks)
+        return blocks
+
+    def _forget(self, prefix, name):
+        blocks = self._blocks.get(prefix)
+        if blocks:
+            self._blocks[prefix] = [block for block in blocks if block[2] != name]
+
+    def _write(self, file, data):
+        # Written under a temporary name and moved into place, so readers never
+        # see a partial block
+        tmp = f"{file}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, file)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+# Function to name a version of a remote file
+def file_version(size, etag):
+    return hashlib.sha1(f"{size}|{etag}".encode()).hexdigest()[:16]
+
+# Sparse local image of a remote file
+class RangeFile(io.RawIOBase):
+    """
+    Read-only file object over the byte ranges of a remote file loaded so far.
+
+    pyarrow reads footers and column chunks through it as from a local file.
+    Ranges are loaded ahead of the reads by RemoteStore.load; a read outside them
+    (e.g. a page index) is fetched on demand through the store's event loop, so
+    reads must happen on another thread (see asyncio.to_thread).
+
+    Parameters:
+    store (RemoteStore): Store the file is read through
+    url (str): URL of the file
+    size (int): Size of the file
+    etag (str): ETag (or Last-Modified) of the file version
+    """
+    def __init__(self, store, url, size, etag):
+        super().__init__()
+        self.store = store
+        self.url = url
+        self.size = size
+        self.etag = etag
+        self.version = file_version(size, etag)
+        self.misses = 0
+        self._segments = []
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    def add(self, start, data):
+        """
+        Adds the bytes loaded from offset start.
+        """
+        with self._lock:
+            if not self._covers(start, start + len(data)):
+                self._segments.append((start, start + len(data), data))
+                self._segments.sort(key=lambda segment: segment[:2])
+
+    def covers(self, start, end):
+        with self._lock:
+            return self._covers(start, end)
+
+    def pread(self, start, end):
+        """
+        Returns bytes [start, end), or None unless loaded ranges cover them.
+        """
+        with self._lock:
+            pos, chunks = start, []
+            for first, last, data in self._segments:
+                if last <= pos:
+                    continue
+                if first > pos:
+                    break
+                chunks.append(memoryview(data)[pos - first:min(last, end) - first])
+                pos = min(last, end)
+                if pos >= end:
+                    return chunks[0].tobytes() if len(chunks) == 1 else b"".join(chunks)
+            return b"" if start >= end else None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self.size}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self._pos + size)
+        data = self.pread(self._pos, end)
+
+        if data is None:
+            if threading.get_ident() == self.store.thread:
+                raise RuntimeError(f"bytes {self._pos}-{end} of {self.url} are not loaded.")
+            self.misses += 1
+            asyncio.run_coroutine_threadsafe(self.store.load(self, [(self._pos, end)]), self.store.loop).result()
+            data = self.pread(self._pos, end)
+
+        self._pos = end
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def _covers(self, start, end):
+        pos = start
+        for first, last, _ in self._segments:
+            if last <= pos:
+                continue
+            if first > pos:
+                return False
+            pos = last
+            if pos >= end:
+                return True
+        return start >= end
+
+# Function to list the byte ranges of the column chunks of row groups
+def column_chunk_ranges(metadata, row_groups, columns=None):
+    """
+    Returns the byte ranges pyarrow reads for columns of row groups.
+
+    Parameters:
+    metadata (pq.FileMetaData): Footer of the file
+    row_groups (list): Row group ids
+    columns (list, optional): Top-level columns, defaults to None (all)
+
+    Returns:
+    list: (start, end) byte ranges, end excluded
+    """
+    ranges = []
+    for i in row_groups:
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            if columns is not None and chunk.path_in_schema.split(".")[0] not in columns:
+                continue
+            start = chunk.data_page_offset
+            if chunk.has_dictionary_page and 0 < chunk.dictionary_page_offset < start:
+                start = chunk.dictionary_page_offset
+            ranges.append((start, start + chunk.total_compressed_size))
+    return ranges
+
+# Function to select the row groups intersecting a bbox from their statistics
+def row_group_hits(metadata, covering, bbox):
+    """
+    Returns the row groups whose bbox covering statistics intersect a bbox. Row
+    groups without statistics are kept.
+
+    Parameters:
+    metadata (pq.FileMetaData): Footer of the file
+    covering (dict): Covering column paths (see package.geo_covering)
+    bbox (tuple): (xmin, ymin, xmax, ymax)
+
+    Returns:
+    list: Row group ids
+    """
+    paths = {".".join(path): name for name, path in covering.items()}
+    xmin, ymin, xmax, ymax = map(float, bbox)
+    hits = []
+
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        extent = {}
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            name = paths.get(chunk.path_in_schema)
+            if name and chunk.is_stats_set and chunk.statistics.has_min_max:
+                extent[name] = chunk.statistics.min if name in ("xmin", "ymin") else chunk.statistics.max
+
+        if len(extent) < 4 or (extent["xmin"] <= xmax and extent["xmax"] >= xmin
+                               and extent["ymin"] <= ymax and extent["ymax"] >= ymin):
+            hits.append(i)
+
+    return hits
+
+# Function to read the Hive partition values of a relative path
+def hive_partition(path):
+    """
+    Returns the key=value directories of a relative path as a dict.
+    """
+    values = {}
+    for part in path.split("/")[:-1]:
+        if "=" in part:
+            key, value = part.split("=", 1)
+            value = unquote(value)
+            values[key] = None if value == HIVE_NULL else value
+    return values
+
+# Function to list the columns a filter reads
+def filter_columns(filters):
+    """
+    Returns the columns referenced by dict or DNF filters, None for expressions.
+    """
+    if filters is None:
+        return set()
+    if isinstance(filters, dict):
+        return set(filters)
+    if isinstance(filters, list):
+        return {term[0] for conj in filters for term in (conj if isinstance(conj, list) else [conj])}
+    return None
+
+# Function to decode the row groups of a remote file
+def decode_row_groups(parquet, row_groups, columns, partition):
+    """
+    Reads row groups whose column chunks are loaded, adding the partition columns.
+    """
+    if row_groups:
+        table = parquet.read_row_groups(row_groups, columns=columns)
+    else:
+        table = parquet.schema_arrow.empty_table()
+        table = table if columns is None else table.select(columns)
+
+    for key, value in partition.items():
+        table = table.append_column(key, pa.array([value] * table.num_rows, pa.string()))
+    return table
+
+# Concurrent range reader of remote parquet files and datasets
+class RemoteStore:
+    """
+    Reads parquet files and GeoParquet datasets over HTTP(S) with range requests.
+
+    A read costs a few round trips whatever the number of files: the row group
+    index of the dataset, then the footers of the files it selects (concurrent
+    tail requests), then the column chunks of the selected row groups (coalesced
+    and concurrent range requests). Fetched blocks are kept in a bounded local
+    BlockCache, so warm reads only revalidate the files.
+
+    Use it as an async context manager:
+
+        async with RemoteStore() as store:
+            table = await store.read_parquet(url, bbox=bbox)
+
+    Parameters:
+    cache_dir (str or bool, optional): Block cache directory, defaults to None
+        (HYDROFABRIC_REMOTE_CACHE, or hydrofabric-remote in the system temp
+        directory); False disables the cache
+    max_bytes (int, optional): Size bound of the block cache, defaults to MAX_BYTES
+    max_connections (int, optional): Concurrent requests, defaults to MAX_CONNECTIONS
+    gap (int, optional): Largest gap between merged ranges, defaults to COALESCE_GAP
+    part_size (int, optional): Largest request, defaults to PART_SIZE
+    timeout (float, optional): Seconds per request, defaults to TIMEOUT
+    """
+    def __init__(self, cache_dir=None, max_bytes=MAX_BYTES, max_connections=MAX_CONNECTIONS,
+                 gap=COALESCE_GAP, part_size=PART_SIZE, timeout=TIMEOUT):
+        if cache_dir is None:
+            cache_dir = os.environ.get("HYDROFABRIC_REMOTE_CACHE") or os.path.join(tempfile.gettempdir(), "hydrofabric-remote")
+
+        self.client = HTTPClient(max_connections, timeout)
+        self.cache = BlockCache(cache_dir, max_bytes) if cache_dir else None
+        self.gap = gap
+        self.part_size = part_size
+        self.loop = None
+        self.thread = None
+        self._versions = {}
+
+    async def __aenter__(self):
+        self._bind()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.close()
+
+    async def open(self, url, tail=FOOTER_SIZE):
+        """
+        Opens a remote file, loading its last tail bytes.
+
+        The first open of a URL by the store reads the tail with a suffix range
+        request, which also gives the size and ETag of the file. If the cache holds
+        blocks of the URL the request is conditional, and a 304 reads the tail
+        from the cache.
+
+        Parameters:
+        url (str): URL of the file
+        tail (int, optional): Bytes to load from the end, defaults to FOOTER_SIZE
+
+        Returns:
+        RangeFile: The file
+        """
+        self._bind()
+        known = self._versions.get(url)
+        file = None
+
+        if known is None:
+            meta = self.cache.meta(url) if self.cache else None
+            headers = {"Range": f"bytes=-{tail}"}
+            if meta and meta[1]:
+                headers["If-None-Match"] = meta[1]
+
+            response = await self.client.request("GET", url, headers)
+
+            if response.status == 304:
+                known = meta
+            else:
+                check_response(response, url)
+                if response.status == 206:
+                    start, _, size = content_range(response)
+                else:
+                    start, size = 0, len(response.body)
+                etag = response.headers.get("etag") or response.headers.get("last-modified", "")
+                known = (size, etag)
+
+                file = RangeFile(self, url, size, etag)
+                file.add(start, response.body)
+                if self.cache:
+                    self.cache.set_meta(url, size, etag)
+                    self.cache.put(url, file.version, start, response.body)
+                    self.cache.evict()
+
+            self._versions[url] = known
+
+        if file is None:
+            file = RangeFile(self, url, *known)
+            await self.load(file, [(max(0, file.size - tail), file.size)])
+
+        return file
+
+    async def load(self, file, ranges):
+        """
+        Loads byte ranges of a file, from the cache or with coalesced concurrent
+        range requests.
+
+        Parameters:
+        file (RangeFile): File to load into
+        ranges (list): (start, end) byte ranges, end excluded
+
+        Returns:
+        int: Bytes fetched from the server
+        """
+        missing = []
+        for start, end in ranges:
+            end = min(end, file.size)
+            if start >= end or file.covers(start, end):
+                continue
+            data = self.cache.read(file.url, file.version, start, end) if self.cache else None
+            if data is None:
+                missing.append((start, end))
+            else:
+                file.add(start, data)
+
+        if not missing:
+            return 0
+
+        parts = coalesce_ranges(missing, self.gap, self.part_size)
+        bodies = await asyncio.gather(*(self.fetch(file, start, end) for start, end in parts))
+
+        for (start, _), body in zip(parts, bodies):
+            file.add(start, body)
+            if self.cache:
+                self.cache.put(file.url, file.version, start, body)
+
+        if self.cache:
+            self.cache.evict()
+
+        return sum(len(body) for body in bodies)
+
+    async def fetch(self, file, start, end):
+        """
+        Fetches bytes [start, end) of a file with one range request.
+
+        Raises OSError if the file changed since it was opened.
+        """
+        response = await self.client.request("GET", file.url, {"Range": f"bytes={start}-{end - 1}"})
+        check_response(response, file.url)
+
+        etag = response.headers.get("etag") or response.headers.get("last-modified")
+        if etag and file.etag and etag != file.etag:
+            raise OSError(f"{file.url} changed while it was read.")
+
+        if response.status == 206:
+            first, last, _ = content_range(response)
+            if first > start or last < end:
+                raise OSError(f"server returned bytes {first}-{last} of {file.url} for {start}-{end}.")
+            return response.body[start - first:end - first]
+
+        # The server ignored the range
+        return response.body[start:end]
+
+    async def open_parquet(self, url):
+        """
+        Opens a remote parquet file, loading its footer.
+
+        Returns:
+        tuple: RangeFile and pq.ParquetFile reading through it
+        """
+        file = await self.open(url)
+        tail = file.pread(file.size - 8, file.size)
+
+        if file.size < 12 or tail[4:] != b"PAR1":
+            raise ValueError(f"{url} is not a parquet file.")
+
+        footer = int.from_bytes(tail[:4], "little") + 8
+        await self.load(file, [(max(0, file.size - footer), file.size)])
+        return file, await asyncio.to_thread(pq.ParquetFile, file)
+
+    async def read_index(self, url):
+        """
+        Reads the row group index of a remote dataset (see package.layer_to_geoparquet).
+
+        Returns:
+        pd.DataFrame or None: The index, None if the dataset has none
+        """
+        try:
+            file = await self.open(f"{url}/{ROW_GROUP_INDEX}")
+        except FileNotFoundError:
+            return None
+
+        await self.load(file, [(0, file.size)])
+        index = pq.read_table(pa.BufferReader(file.pread(0, file.size))).to_pandas()
+        index["path"] = index["path"].str.replace("\\", "/", regex=False)
+        return index
+
+    async def read_parquet(self, url, columns=None, filters=None, bbox=None, files=None):
+        """
+        Reads a remote parquet file or dataset.
+
+        Datasets are located through their row group index, which lists their files
+        (plain HTTP has no directory listing); without an index, pass the files of
+        the dataset. Partitions are pruned with dict filters on partition keys and
+        row groups with bbox (from the index, or else from the footer statistics of
+        the bbox covering column), so only the column chunks of intersecting row
+        groups are fetched.
+
+        Parameters:
+        url (str): URL of a parquet file or of a dataset directory
+        columns (list, optional): Columns to read, defaults to None (all)
+        filters (dict, list or ds.Expression, optional): Row filters, as in
+            package.read_parquet, defaults to None
+        bbox (tuple, optional): (xmin, ymin, xmax, ymax), defaults to None
+        files (list, optional): Files of the dataset relative to url (or URLs),
+            defaults to None (from the row group index)
+
+        Returns:
+        pa.Table: Matching rows
+        """
+        url = url.rstrip("/")
+
+        with span("remote_read", url=url) as s:
+            requests = self.client.requests
+            plan, first = await self._plan(url, files, bbox)
+
+            # Partitions pruned by dict filters on partition keys
+            if isinstance(filters, dict):
+                for key, value in filters.items():
+                    values = set(value) if isinstance(value, (list, tuple, set)) else {value}
+                    plan = [f for f in plan if key not in f["partition"] or f["partition"][key] in values]
+
+            # The schema of an empty result comes from the first file
+            plan = plan or [dict(first, row_groups=[])]
+
+            with span("remote_footers", files=len(plan)):
+                opened = await asyncio.gather(*(self.open_parquet(f["url"]) for f in plan))
+
+            needed = filter_columns(filters)
+            reads = []
+
+            for f, (file, parquet) in zip(plan, opened):
+                names = parquet.schema_arrow.names
+                covering = geo_covering(parquet.metadata.metadata, names) if bbox is not None else None
+                row_groups = f["row_groups"]
+                if row_groups is None:
+                    row_groups = (list(range(parquet.metadata.num_row_groups)) if bbox is None
+                                  else row_group_hits(parquet.metadata, covering, bbox))
+
+                read = None
+                if columns is not None and needed is not None:
+                    wanted = set(columns) | needed | {path[0] for path in (covering or {}).values()}
+                    read = [name for name in names if name in wanted]
+
+                reads.append((file, parquet, row_groups, read, f["partition"], covering))
+
+            with span("remote_fetch", files=len(reads)) as fetch:
+                fetched = await asyncio.gather(*(
+                    self.load(file, column_chunk_ranges(parquet.metadata, row_groups, read))
+                    for file, parquet, row_groups, read, _, _ in reads
+                ))
+                fetch.set(bytes=sum(fetched))
+
+            with span("remote_decode", files=len(reads)) as decode:
+                tables = await asyncio.gather(*(
+                    asyncio.to_thread(decode_row_groups, parquet, row_groups, read, partition)
+                    for _, parquet, row_groups, read, partition, _ in reads
+                ))
+                table = pa.concat_tables(tables, promote_options="default")
+
+                expr = dataset_filter(None, filters)
+                if bbox is not None:
+                    for term in bbox_terms(reads[0][5], bbox):
+                        expr = term if expr is None else expr & term
+                if expr is not None:
+                    table = ds.dataset(table).to_table(filter=expr)
+                if columns is not None:
+                    table = table.select(list(columns))
+                decode.set(rows=table.num_rows)
+
+            s.set(rows=table.num_rows, bytes=sum(fetched), requests=self.client.requests - requests)
+
+        return table
+
+    async def _plan(self, url, files, bbox):
+        # Files to read as dicts of url, partition values and row groups (None: from
+        # the footer), and the first file of the dataset
+        if files is not None:
+            plan = [
+                {"url": f if "://" in f else f"{url}/{quote(f, safe='/=')}",
+                 "partition": {} if "://" in f else hive_partition(f), "row_groups": None}
+                for f in files
+            ]
+        elif url.endswith(".parquet"):
+            plan = [{"url": url, "partition": {}, "row_groups": None}]
+        else:
+            with span("remote_index", url=url):
+                index = await self.read_index(url)
+            if index is None:
+                raise FileNotFoundError(f"{url} has no row group index ({ROW_GROUP_INDEX}); pass its files.")
+
+            hits = index
+            if bbox is not None:
+                xmin, ymin, xmax, ymax = map(float, bbox)
+                hits = index[(index["xmin"] <= xmax) & (index["xmax"] >= xmin)
+                             & (index["ymin"] <= ymax) & (index["ymax"] >= ymin)]
+
+            row_groups = hits.groupby("path", sort=False)["row_group"].agg(sorted).to_dict()
+            plan = [
+                {"url": f"{url}/{quote(path, safe='/=')}", "partition": hive_partition(path),
+                 "row_groups": [int(i) for i in row_groups.get(path, [])]}
+                for path in index["path"].unique()
+            ]
+            return [f for f in plan if f["row_groups"]], plan[0] if plan else None
+
+        return plan, plan[0] if plan else None
+
+    def _bind(self):
+        # RangeFile reads on worker threads fetch misses through this loop
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.thread = threading.get_ident()
+
+# Function to read a remote parquet file or dataset
+def read_remote_parquet(url, columns=None, filters=None, bbox=None, files=None, **kwargs):
+    """
+    Reads a parquet file or GeoParquet dataset over HTTP(S) into a dataframe.
+
+    Synchronous wrapper of RemoteStore.read_parquet (use the store directly from
+    code already running an event loop). package.read_parquet calls it for URLs.
+
+    Parameters:
+    url (str): URL of a parquet file or of a dataset directory
+    columns (list, optional): Columns to read, defaults to None (all)
+    filters (dict, list or ds.Expression, optional): Row filters, defaults to None
+    bbox (tuple, optional): (xmin, ymin, xmax, ymax), defaults to None
+    files (list, optional): Files of the dataset relative to url, defaults to None
+        (from the row group index)
+    kwargs: Options of RemoteStore (cache_dir, max_bytes, max_connections, ...)
+
+    Returns:
+    pd.DataFrame: Matching rows
+    """
+    async def read():
+        async with RemoteStore(**kwargs) as store:
+            return await store.read_parquet(url, columns, filters, bbox, files)
+
+    return asyncio.run(read()).to_pandas()
+
+# Request handler serving files with range requests
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the files of a directory the way object stores do: single byte ranges
+    (206 / 416), ETags with If-None-Match (304) and HTTP/1.1 keep-alive.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        self.server.record(self.command, self.path, self.headers.get("Range"))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        st = os.stat(path)
+        size = st.st_size
+        etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        byte_range = self.byte_range(size)
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+
+        if body:
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = f.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+    def byte_range(self, size):
+        # (start, end) of a single-range header, None to serve the whole file,
+        # False if unsatisfiable
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", (self.headers.get("Range") or "").strip())
+        if match is None or match.groups() == ("", ""):
+            return None
+
+        first, last = match.groups()
+        if not first:
+            return (max(0, size - int(last)), size) if int(last) > 0 else False
+
+        start = int(first)
+        end = min(size, int(last) + 1) if last else size
+        if start >= size or end <= start:
+            return False
+        return start, end
+
+    def log_message(self, format, *args):
+        pass
+
+# Local HTTP server standing in for a remote store
+class StandInServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server serving a directory with range requests, standing in for
+    a remote hydrofabric store in tests and benchmarks. Requests are recorded in
+    requests as (method, path, range).
+
+    Parameters:
+    path (str): Directory to serve
+    host (str, optional): Interface, defaults to "127.0.0.1"
+    port (int, optional): Port, defaults to 0 (any free port)
+    latency (float, optional): Seconds added to every request, to simulate the
+        round trip time of a remote store, defaults to 0
+    """
+    daemon_threads = True
+
+    # Accept a full batch of concurrent connections (socketserver queues 5)
+    request_queue_size = 128
+
+    def __init__(self, path, host="127.0.0.1", port=0, latency=0.0):
+        super().__init__((host, port), partial(RangeRequestHandler, directory=os.fspath(path)))
+        self.latency = latency
+        self.requests = []
+        self.url = f"http://{host}:{self.server_address[1]}"
+        self._requests_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, method, path, byte_range):
+        with self._requests_lock:
+            self.requests.append((method, path, byte_range))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Function to serve a directory over HTTP in the background
+def serve_directory(path, host="127.0.0.1", port=0, latency=0.0):
+    """
+    Serves a directory (e.g. a GeoParquet store written by gpkg_to_geoparquet)
+    over HTTP with range requests from a background thread.
+
+    Parameters:
+    path (str): Directory to serve
+    host (str, optional): Interface, defaults to "127.0.0.1"
+    port (int, optional): Port, defaults to 0 (any free port)
+    latency (float, optional): Seconds added to every request, defaults to 0
+
+    Returns:
+    StandInServer: Running server; its url attribute is the base URL. Close it
+        with close() or use it as a context manager.
+
+    Example:
+    with serve_directory(parquet_dir, latency=0.05) as server:
+        df = read_remote_parquet(f"{server.url}/divides", bbox=bbox)
+    """
+    return StandInServer(path, host, port, latency).start()
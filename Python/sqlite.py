@@ -1,68 +1,635 @@
+import os
+import re
 import sqlite3
-import pandas as pd
-import geopandas as gpd
+import threading
+from pathlib import Path
+
+from .cache import filter_bbox, frame_to_table, get_cache, table_to_frame
+from .profiling import span
+from .utils import lazy_import, msg
+
+# Heavy dependencies are imported on first use, so as_sqlite and the connection
+# pool do not pay for them
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+gpd = lazy_import("geopandas")
+pa = lazy_import("pyarrow")
+shapely = lazy_import("shapely")
+
+# Memory map size for pooled connections (bytes)
+MMAP_SIZE = 1 << 30
+
+# Size in bytes of the GeoPackage binary header envelope, by envelope indicator
+ENVELOPE_SIZES = (0, 32, 48, 48, 64, 0, 0, 0)
+
+# Registry of open GeoPackages keyed by resolved path, and pooled connections keyed by id
+_gpkgs = {}
+_connections = {}
+_lock = threading.Lock()
+
+# Read-only GeoPackage handle with cached metadata and one connection per thread
+class GeoPackage:
+    """
+    Read-only handle to a GeoPackage.
+
+    The layer list, geometry column metadata and spatial reference systems are read
+    once when the handle is created. Connections are opened lazily, one per thread,
+    read-only with memory mapping enabled. They are not opened as immutable, so
+    SQLite still sees in-place rewrites of the file (e.g. append_style or
+    global_id.rewrite_identifiers) made while the handle is pooled.
+
+    Parameters:
+    path (str): Resolved path to the GeoPackage
+    stamp (tuple): (mtime_ns, size) of the file when opened
+    """
+    def __init__(self, path, stamp):
+        self.path = path
+        self.stamp = stamp
+        self._local = threading.local()
+        self._conns = []
+        self._columns = {}
+
+        conn = self.connect()
+
+        self.tables = [
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")
+        ]
+
+        self.geometry_columns = {}
+        self.srs = {}
+
+        if "gpkg_geometry_columns" in self.tables:
+            for table, column, geometry_type, srs_id in conn.execute(
+                "SELECT table_name, column_name, geometry_type_name, srs_id FROM gpkg_geometry_columns"
+            ):
+                self.geometry_columns[table] = {"column": column, "geometry_type": geometry_type, "srs_id": srs_id}
+
+        if "gpkg_spatial_ref_sys" in self.tables:
+            self.srs = dict(conn.execute("SELECT srs_id, definition FROM gpkg_spatial_ref_sys"))
+
+    def connect(self):
+        """
+        Returns the connection of the calling thread, opening it if needed.
+
+        Returns:
+        sqlite3.Connection: Read-only connection to the GeoPackage
+        """
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None:
+            uri = Path(self.path).as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            self._local.conn = conn
+            with _lock:
+                self._conns.append(conn)
+                _connections[id(conn)] = self
+
+        return conn
+
+    def columns(self, lyr):
+        """
+        Returns the columns of a layer and its integer primary key.
+
+        Parameters:
+        lyr (str): Layer name
+
+        Returns:
+        tuple: Column names (list) and primary key column (str or None)
+        """
+        rows = self.table_info(lyr)
+        pk = next((row[1] for row in rows if row[5] and row[2].upper() == "INTEGER"), None)
+        return [row[1] for row in rows], pk
+
+    def column_types(self, lyr):
+        """
+        Returns the declared SQLite types of the columns of a layer.
+
+        Parameters:
+        lyr (str): Layer name
+
+        Returns:
+        dict: Declared type keyed by column name
+        """
+        return {row[1]: row[2] for row in self.table_info(lyr)}
+
+    def table_info(self, lyr):
+        """
+        Returns the cached PRAGMA table_info rows of a layer.
+
+        Parameters:
+        lyr (str): Layer name
+
+        Returns:
+        list: (cid, name, type, notnull, default, pk) rows
+        """
+        rows = self._columns.get(lyr)
+
+        if rows is None:
+            rows = self._columns[lyr] = self.connect().execute(f'PRAGMA table_info("{lyr}")').fetchall()
+
+        return rows
+
+    def rtree(self, lyr):
+        """
+        Returns the name of the rtree spatial index of a layer.
+
+        Parameters:
+        lyr (str): Layer name
+
+        Returns:
+        str or None: Name of the rtree table, None if the layer has no spatial index
+        """
+        geom = self.geometry_columns.get(lyr)
+
+        if geom is None:
+            return None
+
+        name = f"rtree_{lyr}_{geom['column']}"
+        return name if name in self.tables else None
+
+    def crs(self, lyr):
+        """
+        Returns the CRS definition of a spatial layer.
+
+        Parameters:
+        lyr (str): Layer name
+
+        Returns:
+        str or None: WKT definition of the layer SRS, None for aspatial layers
+        """
+        geom = self.geometry_columns.get(lyr)
+        return self.srs.get(geom["srs_id"]) if geom else None
+
+    def close(self):
+        """
+        Closes all connections opened by this handle.
+        """
+        with _lock:
+            conns, self._conns = self._conns, []
+            for conn in conns:
+                _connections.pop(id(conn), None)
+
+        for conn in conns:
+            conn.close()
+
+        self._local = threading.local()
+
+# Function to drop connections inherited from the parent in a forked process
+def _reset_after_fork():
+    global _lock
+    _gpkgs.clear()
+    _connections.clear()
+    _lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+# Function to get the pooled handle of a GeoPackage
+def get_gpkg(gpkg):
+    """
+    Returns the pooled read-only handle of a GeoPackage.
+
+    Handles are shared across threads and reopened when the file changes on disk
+    (modification time or size).
+
+    Parameters:
+    gpkg (str): Path to the GeoPackage
+
+    Returns:
+    GeoPackage: Handle to the GeoPackage
+    """
+    path = os.path.realpath(gpkg)
+
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"{gpkg} does not exist.")
+
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    with _lock:
+        handle = _gpkgs.get(path)
+        if handle is not None and handle.stamp == stamp:
+            return handle
+        stale = _gpkgs.pop(path, None)
+
+    if stale is not None:
+        stale.close()
+
+    with span("gpkg_open", path=path):
+        handle = GeoPackage(path, stamp)
+
+    with _lock:
+        current = _gpkgs.setdefault(path, handle)
+
+    # Another thread registered the file first
+    if current is not handle:
+        handle.close()
+
+    return current
+
+# Function to close all pooled GeoPackage connections
+def close_gpkgs():
+    """
+    Closes all pooled GeoPackage connections and empties the registry.
+    """
+    with _lock:
+        handles = list(_gpkgs.values())
+        _gpkgs.clear()
+
+    for handle in handles:
+        handle.close()
+
+# Function to find the pooled handle owning a connection
+def connection_gpkg(conn):
+    """
+    Returns the pooled handle a connection belongs to.
+
+    Connections that were not opened by the pool are resolved through the
+    database file they are attached to.
+
+    Parameters:
+    conn (sqlite3.Connection): SQLite connection to a GeoPackage
+
+    Returns:
+    GeoPackage: Handle to the GeoPackage
+    """
+    handle = _connections.get(id(conn))
+
+    if handle is None:
+        path = conn.execute("PRAGMA database_list").fetchone()[2]
+        handle = get_gpkg(path)
+
+    return handle
 
 # Function to connect to GeoPackage as SQLite and list layers or retrieve a specific layer
 def as_sqlite(gpkg, lyr=None, ignore="gpkg_|rtree_|sqlite_"):
     """
     Connects to a GeoPackage (GPKG) as an SQLite database and optionally retrieves a layer.
 
+    Connections come from a pool keyed by the GeoPackage path and are read-only.
+    They are owned by the pool and should not be closed by the caller (see close_gpkgs).
+
     Parameters:
     gpkg (str): Path to the GeoPackage
     lyr (str, optional): Specific layer to retrieve, defaults to None
     ignore (str, optional): Pattern for layers to be ignored, defaults to "gpkg_|rtree_|sqlite_"
-    
+
     Returns:
-    sqlite3.Connection: SQLite connection to the GeoPackage
+    sqlite3.Connection or list: SQLite connection to the GeoPackage, or the layer
+        names if no layer is given
     """
-    conn = sqlite3.connect(gpkg)
-    cursor = conn.cursor()
-    
+    handle = get_gpkg(gpkg)
+
     # If no specific layer is provided, list all the tables except those matching the ignore pattern
     if lyr is None:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [table[0] for table in cursor.fetchall()]
-        tables = [table for table in tables if not pd.Series(table).str.contains(ignore).any()]
-        print(tables)
-        conn.close()
-        return None
+        pattern = re.compile(ignore)
+        return [table for table in handle.tables if not pattern.search(table)]
+    elif lyr in handle.tables:
+        return handle.connect()
     else:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [table[0] for table in cursor.fetchall()]
-        if lyr in tables:
-            return conn
+        raise ValueError(f"{lyr} not in gpkg.")
+
+# Function to decode GeoPackage geometry blobs in bulk
+def decode_gpkg_geometry(blobs):
+    """
+    Decodes GeoPackage binary geometries (GP header plus WKB) in bulk.
+
+    All blobs are concatenated into a single NumPy buffer, the headers are parsed
+    and stripped with array operations, and the remaining WKB is handed to
+    shapely's vectorized from_wkb in one call.
+
+    Parameters:
+    blobs (array-like): GeoPackage geometry blobs, None for missing geometries
+
+    Returns:
+    tuple: Geometries (np.ndarray), SRS ids (np.ndarray, -1 where missing) and
+        header envelopes as (xmin, ymin, xmax, ymax) rows (np.ndarray, NaN where
+        the header has no envelope)
+    """
+    with span("wkb_decode") as s:
+        geometry, srs_id, envelope, nbytes = _decode_gpkg_geometry(blobs)
+        s.set(rows=len(geometry), bytes=nbytes)
+
+    return geometry, srs_id, envelope
+
+def _decode_gpkg_geometry(blobs):
+    blobs = np.asarray(blobs, dtype=object)
+    valid = pd.notna(blobs)
+    values = blobs[valid]
+    n = len(values)
+
+    geometry = np.full(len(blobs), None, dtype=object)
+    srs_id = np.full(len(blobs), -1, dtype=np.int32)
+    envelope = np.full((len(blobs), 4), np.nan)
+
+    if n == 0:
+        return geometry, srs_id, envelope, 0
+
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=n)
+    buf = np.frombuffer(b"".join(values), dtype=np.uint8)
+    starts = np.cumsum(lengths) - lengths
+
+    # Header flags: byte order (bit 0) and envelope indicator (bits 1-3)
+    flags = buf[starts + 3]
+    little = (flags & 1).astype(bool)
+    header = 8 + np.take(ENVELOPE_SIZES, (flags >> 1) & 7)
+
+    # SRS id (int32 at bytes 4-7)
+    raw = buf[starts[:, None] + np.arange(4, 8)]
+    raw[~little] = raw[~little, ::-1]
+    srs_id[valid] = raw.view("<i4").ravel()
+
+    # XY envelope (minx, maxx, miny, maxy as float64 at bytes 8-39)
+    has_env = header > 8
+    if has_env.any():
+        raw = buf[starts[has_env, None] + 8 + np.arange(32)].reshape(-1, 4, 8)
+        big = ~little[has_env]
+        raw[big] = raw[big, :, ::-1]
+        env = np.full((n, 4), np.nan)
+        env[has_env] = raw.reshape(-1, 32).view("<f8")[:, [0, 2, 1, 3]]
+        envelope[valid] = env
+
+    # Strip the headers and split the WKB without leaving C
+    keep = np.ones(buf.size, dtype=bool)
+    header_starts = np.cumsum(header) - header
+    keep[np.repeat(starts - header_starts, header) + np.arange(header.sum())] = False
+    offsets = np.concatenate([[0], np.cumsum(lengths - header)])
+    wkb = pa.LargeBinaryArray.from_buffers(
+        pa.large_binary(), n, [None, pa.py_buffer(offsets), pa.py_buffer(buf[keep])]
+    )
+
+    geometry[valid] = shapely.from_wkb(wkb.to_numpy(zero_copy_only=False))
+    return geometry, srs_id, envelope, buf.nbytes
+
+# Function to build the SQL query reading a layer
+def layer_query(handle, lyr, columns=None, where=None, params=None, bbox=None, chunksize=None):
+    """
+    Builds the query reading a layer with column projection and row filters.
+
+    Parameters:
+    handle (GeoPackage): Handle to the GeoPackage
+    lyr (str): Layer name
+    columns (list, optional): Columns to read, defaults to None (all). The geometry
+        column of spatial layers is always read.
+    where (str, optional): SQL condition rows must meet, defaults to None
+    params (list or dict, optional): Parameters bound to the placeholders in where
+    bbox (tuple, optional): (xmin, ymin, xmax, ymax) in the layer CRS; features whose
+        envelope intersects it are read using the layer's rtree index
+    chunksize (int, optional): Page size of a rowid-range query, defaults to None. The
+        query then also selects rowid as hf_rowid and pages with rowid > hf_after,
+        bound as the last positional parameter or as :hf_after.
+
+    Returns:
+    tuple: Query (str) and its parameters (list or dict)
+    """
+    names, pk = handle.columns(lyr)
+    geom = handle.geometry_columns.get(lyr)
+
+    if columns is None:
+        select = "*"
+    else:
+        columns = list(columns)
+        missing = [col for col in columns if col not in names]
+        if missing:
+            raise ValueError(f"{', '.join(missing)} not in {lyr}.")
+        if geom is not None and geom["column"] not in columns:
+            columns.append(geom["column"])
+        select = ", ".join(f'"{col}"' for col in columns)
+
+    conditions = []
+    params = dict(params) if isinstance(params, dict) else list(params or [])
+
+    if where:
+        conditions.append(f"({where})")
+
+    if bbox is not None:
+        rtree = handle.rtree(lyr)
+        if rtree is None or pk is None:
+            raise ValueError(f"{lyr} has no spatial index.")
+
+        xmin, ymin, xmax, ymax = map(float, bbox)
+        if isinstance(params, dict):
+            params.update(hf_xmin=xmin, hf_ymin=ymin, hf_xmax=xmax, hf_ymax=ymax)
+            marks = (":hf_xmax", ":hf_xmin", ":hf_ymax", ":hf_ymin")
         else:
-            conn.close()
-            raise ValueError(f"{lyr} not in gpkg.")
-    
-    return conn
+            params.extend([xmax, xmin, ymax, ymin])
+            marks = ("?",) * 4
+
+        conditions.append(
+            f'"{pk}" IN (SELECT id FROM "{rtree}" WHERE minx <= {marks[0]} AND maxx >= {marks[1]} '
+            f'AND miny <= {marks[2]} AND maxy >= {marks[3]})'
+        )
+
+    if chunksize is not None:
+        select = f"rowid AS hf_rowid, {select}"
+        if isinstance(params, dict):
+            params["hf_after"] = 0
+            conditions.append("rowid > :hf_after")
+        else:
+            params.append(0)
+            conditions.append("rowid > ?")
+
+    query = f'SELECT {select} FROM "{lyr}"'
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    if chunksize is not None:
+        query += f" ORDER BY rowid LIMIT {int(chunksize)}"
+
+    return query, params
 
 # Function to extract spatial data from an SQLite connection
-def read_sf_dataset_sqlite(conn, lyr):
+def read_sf_dataset_sqlite(conn, lyr, columns=None, where=None, params=None, bbox=None):
     """
     Extracts spatial data from an SQLite connection.
 
+    Only the requested columns and rows are read from SQLite. While the layer cache
+    is enabled (see cache.enable_cache), reads without a where condition are served
+    from the cached decoded layer instead.
+
+    Parameters:
+    conn (sqlite3.Connection): SQLite connection to the GeoPackage
+    lyr (str): Layer name to extract
+    columns (list, optional): Columns to read, defaults to None (all)
+    where (str, optional): SQL condition rows must meet, e.g. "vpuid = ?", defaults to None
+    params (list or dict, optional): Parameters bound to the placeholders in where, defaults to None
+    bbox (tuple, optional): (xmin, ymin, xmax, ymax) in the layer CRS served from the
+        layer's rtree index, defaults to None
+
+    Returns:
+    gpd.GeoDataFrame or pd.DataFrame: GeoDataFrame if spatial, DataFrame if non-spatial
+    """
+    # Get the geometry column and spatial reference system from the cached metadata
+    handle = connection_gpkg(conn)
+    geom = handle.geometry_columns.get(lyr)
+
+    if where is None and get_cache() is not None:
+        with span("read_sf_dataset_sqlite", layer=lyr, cached=True) as s:
+            table = cached_layer(handle, lyr, columns)
+            gdf = table_to_frame(filter_bbox(table, bbox) if bbox is not None and geom is not None else table)
+            s.set(rows=len(gdf))
+
+        if geom is None:
+            msg("Warning: no simple features geometry column present", startup=True)
+        return gdf
+
+    # Layers without an rtree index are filtered on the decoded envelopes instead
+    rtree_bbox = bbox if geom is not None and handle.rtree(lyr) is not None else None
+
+    with span("read_sf_dataset_sqlite", layer=lyr) as s:
+        # Read the layer data
+        query, params = layer_query(handle, lyr, columns, where, params, rtree_bbox)
+        data = read_sql(query, conn, params, layer=lyr)
+
+        gdf = layer_frame(handle, lyr, data, bbox, rtree_bbox)
+        s.set(rows=len(gdf))
+
+    return gdf
+
+# Function to read a decoded layer through the layer cache
+def cached_layer(handle, lyr, columns=None):
+    """
+    Returns a decoded layer from the layer cache, reading and decoding it on a miss.
+
+    Parameters:
+    handle (GeoPackage): Handle to the GeoPackage
+    lyr (str): Layer name
+    columns (list, optional): Columns to read, defaults to None (all). The geometry
+        column of spatial layers is always read.
+
+    Returns:
+    pa.Table: Memory-mapped table (see cache.frame_to_table)
+    """
+    def load():
+        query, params = layer_query(handle, lyr, columns)
+        data = read_sql(query, handle.connect(), params, layer=lyr)
+        return frame_to_table(layer_frame(handle, lyr, data, quiet=True))
+
+    parts = ("gpkg", lyr, None if columns is None else tuple(columns))
+    return get_cache().table(handle.path, handle.stamp, parts, load)
+
+# Function to stream a layer from an SQLite connection in chunks
+def read_sf_dataset_sqlite_chunks(conn, lyr, chunksize=100000, columns=None, where=None, params=None, bbox=None):
+    """
+    Extracts spatial data from an SQLite connection in chunks.
+
+    Chunks are paged with rowid ranges (rowid > last rowid of the previous chunk)
+    rather than OFFSET, so each page starts with an index seek and peak memory is
+    bounded by the chunk size regardless of the layer size.
+
     Parameters:
     conn (sqlite3.Connection): SQLite connection to the GeoPackage
     lyr (str): Layer name to extract
-    
+    chunksize (int, optional): Maximum number of rows per chunk, defaults to 100000
+    columns (list, optional): Columns to read, defaults to None (all)
+    where (str, optional): SQL condition rows must meet, defaults to None
+    params (list or dict, optional): Parameters bound to the placeholders in where, defaults to None
+    bbox (tuple, optional): (xmin, ymin, xmax, ymax) in the layer CRS, defaults to None
+
+    Yields:
+    gpd.GeoDataFrame or pd.DataFrame: Chunks of the layer
+    """
+    handle = connection_gpkg(conn)
+    geom = handle.geometry_columns.get(lyr)
+    rtree_bbox = bbox if geom is not None and handle.rtree(lyr) is not None else None
+
+    query, params = layer_query(handle, lyr, columns, where, params, rtree_bbox, chunksize=chunksize)
+
+    while True:
+        data = read_sql(query, conn, params, layer=lyr)
+
+        if data.empty:
+            return
+
+        # Advance the rowid cursor
+        after = int(data["hf_rowid"].iloc[-1])
+        if isinstance(params, dict):
+            params["hf_after"] = after
+        else:
+            params[-1] = after
+
+        yield layer_frame(handle, lyr, data.drop(columns="hf_rowid"), bbox, rtree_bbox, quiet=True)
+
+        if len(data) < chunksize:
+            return
+
+# Function to run a query into a DataFrame
+def read_sql(query, conn, params=None, **attrs):
+    """
+    Runs a query with pd.read_sql, timed as a "sql_read" span.
+
+    Parameters:
+    query (str): SQL query
+    conn (sqlite3.Connection): SQLite connection
+    params (list or dict, optional): Query parameters, defaults to None
+    attrs: Attributes recorded with the span (e.g. layer=lyr)
+
+    Returns:
+    pd.DataFrame: Query result
+    """
+    with span("sql_read", **attrs) as s:
+        data = pd.read_sql(query, conn, params=params)
+        s.set(rows=len(data))
+    return data
+
+# Function to convert rows read from a layer into a (Geo)DataFrame
+def layer_frame(handle, lyr, data, bbox=None, rtree_bbox=None, quiet=False):
+    """
+    Converts the rows read from a layer into a GeoDataFrame, decoding its geometry.
+
+    Parameters:
+    handle (GeoPackage): Handle to the GeoPackage
+    lyr (str): Layer name
+    data (pd.DataFrame): Rows read from the layer
+    bbox (tuple, optional): Requested bounding box, defaults to None
+    rtree_bbox (tuple, optional): Bounding box already applied through the rtree, defaults to None
+    quiet (bool, optional): Suppress the warning for aspatial layers, defaults to False
+
     Returns:
     gpd.GeoDataFrame or pd.DataFrame: GeoDataFrame if spatial, DataFrame if non-spatial
     """
-    # Get the spatial reference system information
-    query = "SELECT * FROM gpkg_spatial_ref_sys"
-    srs = pd.read_sql(query, conn).iloc[-1]  # Get the last row (slicing as in R)
+    geom = handle.geometry_columns.get(lyr)
 
-    # Read the layer data
-    query = f"SELECT * FROM {lyr}"
-    data = pd.read_sql(query, conn)
-    
     # Check if there is a geometry column
-    if 'geom' in data.columns or 'geometry' in data.columns:
-        # Convert to GeoDataFrame using the spatial reference system
-        crs = srs['definition']
-        gdf = gpd.GeoDataFrame(data, geometry='geom' if 'geom' in data.columns else 'geometry', crs=crs)
+    if geom is not None and geom["column"] in data.columns:
+        # Decode the GeoPackage blobs and convert to GeoDataFrame using the spatial reference system
+        geometry, _, envelope = decode_gpkg_geometry(data[geom["column"]].to_numpy())
+        data[geom["column"]] = geometry
+
+        if bbox is not None and rtree_bbox is None:
+            data = data[envelope_intersects(geometry, envelope, bbox)]
+
+        gdf = gpd.GeoDataFrame(data, geometry=geom["column"], crs=handle.crs(lyr))
         return gdf
     else:
-        print("Warning: no simple features geometry column present")
-        return data
\ No newline at end of file
+        if not quiet:
+            msg("Warning: no simple features geometry column present", startup=True)
+        return data
+
+# Function to test header envelopes against a bounding box
+def envelope_intersects(geometry, envelope, bbox):
+    """
+    Tests which geometries have an envelope intersecting a bounding box.
+
+    Header envelopes are used where present; missing ones (e.g. points, which are
+    usually written without an envelope) are computed from the geometries.
+
+    Parameters:
+    geometry (np.ndarray): Geometries
+    envelope (np.ndarray): (xmin, ymin, xmax, ymax) rows from decode_gpkg_geometry
+    bbox (tuple): (xmin, ymin, xmax, ymax)
+
+    Returns:
+    np.ndarray: Boolean mask
+    """
+    missing = np.isnan(envelope[:, 0])
+    if missing.any():
+        envelope = envelope.copy()
+        envelope[missing] = shapely.bounds(geometry[missing])
+
+    xmin, ymin, xmax, ymax = bbox
+    return (
+        (envelope[:, 0] <= xmax) & (envelope[:, 2] >= xmin) &
+        (envelope[:, 1] <= ymax) & (envelope[:, 3] >= ymin)
+    )
@@ -1,6 +1,57 @@
-import sys
-import pkg_resources
 import importlib
+import os
+import re
+import sys
+import types
+from functools import lru_cache
+
+# Module proxy that defers an import until first use
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    After the import the module's namespace is copied onto the proxy, so later
+    lookups are plain attribute reads.
+
+    Parameters:
+    name (str): Fully qualified module name (e.g. "pyarrow.parquet")
+    """
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+# Function to defer a heavy import until the module is used
+def lazy_import(name):
+    """
+    Returns the module if it is already imported, otherwise a LazyModule proxy.
+
+    Parameters:
+    name (str): Fully qualified module name
+
+    Returns:
+    module: The module or a proxy importing it on first attribute access
+    """
+    return sys.modules.get(name) or LazyModule(name)
+
+# Function to look up the installed version of a distribution
+@lru_cache(maxsize=None)
+def installed_version(pkg):
+    """
+    Returns the installed version of a distribution through importlib.metadata.
+
+    Parameters:
+    pkg (str): Distribution name
+
+    Returns:
+    str or None: Version string, None if the distribution is not installed
+    """
+    from importlib import metadata  # Slow to import, only needed here
+
+    try:
+        return metadata.version(pkg)
+    except metadata.PackageNotFoundError:
+        return None
 
 # Helper function to print messages in different contexts
 def msg(*args, startup=False):
@@ -19,8 +70,8 @@ def msg(*args, startup=False):
 
 # Helper function to check if hydrofabric quiet mode is enabled (dummy implementation)
 def is_hydrofabric_quiet():
-    # For Python, we assume this checks an environmental variable or configuration option
-    return False  # Replace with actual logic if needed
+    # Equivalent of options(hydrofabric.quiet = TRUE) in R
+    return os.environ.get("HYDROFABRIC_QUIET", "").lower() not in ("", "0", "false")
 
 # Helper function to color messages
 def text_col(*args):
@@ -45,7 +96,10 @@ def colored(text, color):
     """
     Colors text in the terminal based on color. You can use libraries like termcolor or colorama.
     """
-    from termcolor import colored as term_colored
+    try:
+        from termcolor import colored as term_colored
+    except ImportError:
+        return text
     return term_colored(text, color)
 
 # Function to list all packages imported by a specific module (equivalent to hydrofabric_packages)
@@ -61,22 +115,23 @@ def hydrofabric_packages(include_self=True):
     """
     # Get the list of imported packages
     package_name = 'hydrofabric'  # Replace with the actual package name if different
+    from importlib import metadata
+
     try:
-        package = importlib.import_module(package_name)
-        distribution = pkg_resources.get_distribution(package_name)
-        imports = distribution.requires()
-        
-        # Filter out specific packages
-        names = [str(req).split()[0] for req in imports if str(req).split()[0] not in ['purrr', 'cli', 'crayon', 'rstudioapi']]
-        
-        if include_self:
-            names.append(package_name)
-        
-        return names
-    except pkg_resources.DistributionNotFound:
+        imports = metadata.requires(package_name) or []
+    except metadata.PackageNotFoundError:
         print(f"Package '{package_name}' not found.")
         return []
 
+    # Filter out specific packages
+    names = [re.split(r"[\s;<>=!~\[(]", req, maxsplit=1)[0] for req in imports]
+    names = [name for name in names if name not in ['purrr', 'cli', 'crayon', 'rstudioapi']]
+
+    if include_self:
+        names.append(package_name)
+
+    return names
+
 # Invert function to invert a dictionary (similar to R's invert function)
 def invert(d):
     """
@@ -0,0 +1,522 @@
+import os
+import sqlite3
+from contextlib import closing
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyproj
+import shapely
+
+from .profiling import span
+from .qml import insert_styles, style_records
+from .sqlite import decode_gpkg_geometry
+
+# GeoPackage application id ("GPKG") and version (1.4.0)
+APPLICATION_ID = 0x47504B47
+USER_VERSION = 10400
+
+# Core GeoPackage tables
+GPKG_TABLES = [
+    """CREATE TABLE gpkg_spatial_ref_sys (
+        srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+        organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT
+    )""",
+    """CREATE TABLE gpkg_contents (
+        table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+        description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+        min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER,
+        CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id)
+    )""",
+    """CREATE TABLE gpkg_geometry_columns (
+        table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+        srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+        CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name),
+        CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+        CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id)
+    )""",
+    """CREATE TABLE gpkg_extensions (
+        table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, definition TEXT NOT NULL,
+        scope TEXT NOT NULL, CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name)
+    )""",
+]
+
+# Geometry type names by shapely type id
+GEOMETRY_TYPES = ["POINT", "LINESTRING", "LINESTRING", "POLYGON", "MULTIPOINT", "MULTILINESTRING",
+                  "MULTIPOLYGON", "GEOMETRYCOLLECTION"]
+
+# GeoPackage binary header: magic, version, flags, srs id and xy envelope (little endian)
+HEADER = np.dtype([("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("srs_id", "<i4"), ("envelope", "<f8", 4)])
+
+# Layout of SQLite rtree nodes (2D): cells are an id and (minx, maxx, miny, maxy) as
+# big endian 32 bit floats; a node holds up to 51 cells after a 4 byte header
+RTREE_CELL = np.dtype([("id", ">i8"), ("box", ">f4", 4)])
+RTREE_FANOUT = 51
+RTREE_NODE_SIZE = 4 + RTREE_FANOUT * RTREE_CELL.itemsize
+
+# Triggers keeping an rtree index in sync with its table (GeoPackage rtree extension)
+RTREE_TRIGGERS = [
+    """CREATE TRIGGER "{rtree}_insert" AFTER INSERT ON "{t}"
+    WHEN (new."{c}" NOT NULL AND NOT ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      INSERT OR REPLACE INTO "{rtree}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+    END""",
+    """CREATE TRIGGER "{rtree}_update1" AFTER UPDATE OF "{c}" ON "{t}"
+    WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      INSERT OR REPLACE INTO "{rtree}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+    END""",
+    """CREATE TRIGGER "{rtree}_update2" AFTER UPDATE OF "{c}" ON "{t}"
+    WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      DELETE FROM "{rtree}" WHERE id = OLD."{i}";
+    END""",
+    """CREATE TRIGGER "{rtree}_update3" AFTER UPDATE ON "{t}"
+    WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      DELETE FROM "{rtree}" WHERE id = OLD."{i}";
+      INSERT OR REPLACE INTO "{rtree}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+    END""",
+    """CREATE TRIGGER "{rtree}_update4" AFTER UPDATE ON "{t}"
+    WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+    BEGIN
+      DELETE FROM "{rtree}" WHERE id IN (OLD."{i}", NEW."{i}");
+    END""",
+    """CREATE TRIGGER "{rtree}_delete" AFTER DELETE ON "{t}"
+    WHEN old."{c}" NOT NULL
+    BEGIN
+      DELETE FROM "{rtree}" WHERE id = OLD."{i}";
+    END""",
+]
+
+# Function to encode geometries as GeoPackage binary blobs
+def encode_gpkg_geometry(geometry, srs_id):
+    """
+    Encodes geometries as GeoPackage binary blobs (GP header plus ISO WKB) in bulk.
+
+    The WKB is produced by shapely's vectorized to_wkb and all headers are built
+    as one NumPy record array. Non-empty, non-point geometries carry an xy envelope.
+
+    Parameters:
+    geometry (array-like): Geometries, None for missing ones
+    srs_id (int): SRS id written to the headers
+
+    Returns:
+    tuple: Blobs (list, None where missing) and (xmin, ymin, xmax, ymax) bounds (np.ndarray)
+    """
+    geometry = np.asarray(geometry, dtype=object)
+    valid = ~shapely.is_missing(geometry)
+    blobs = [None] * len(geometry)
+    bounds = shapely.bounds(geometry)
+
+    if not valid.any():
+        return blobs, bounds
+
+    geoms = geometry[valid]
+    wkb = shapely.to_wkb(geoms, byte_order=1, flavor="iso")
+    empty = shapely.is_empty(geoms)
+    has_env = ~empty & (shapely.get_type_id(geoms) != 0)
+
+    header = np.zeros(len(geoms), dtype=HEADER)
+    header["magic"] = b"GP"
+    header["flags"] = 1 | (has_env << 1) | (empty << 4)
+    header["srs_id"] = srs_id
+    header["envelope"] = bounds[valid][:, [0, 2, 1, 3]]
+
+    # Points and empty geometries are written without an envelope
+    buf = header.tobytes()
+    size = HEADER.itemsize
+    sizes = np.where(has_env, size, 8).tolist()
+
+    encoded = [buf[i * size:i * size + n] + w for i, (n, w) in enumerate(zip(sizes, wkb))]
+    for i, blob in zip(np.flatnonzero(valid).tolist(), encoded):
+        blobs[i] = blob
+
+    return blobs, bounds
+
+# Function to find the SQLite type of a column
+def column_type(series):
+    if pd.api.types.is_bool_dtype(series):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "DATETIME"
+    return "TEXT"
+
+# Function to convert a column into values SQLite can bind
+def column_values(series):
+    """
+    Returns the values of a column as Python objects, None where missing.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series.dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+# Function to register a CRS in gpkg_spatial_ref_sys
+def register_srs(conn, crs, srs):
+    """
+    Returns the srs_id of a CRS, adding it to gpkg_spatial_ref_sys if needed.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to the GeoPackage
+    crs (pyproj.CRS or None): CRS of a layer
+    srs (dict): srs_id keyed by WKT of the CRSs registered so far
+
+    Returns:
+    int: srs_id (-1 for layers without a CRS)
+    """
+    if crs is None:
+        return -1
+
+    crs = pyproj.CRS.from_user_input(crs)
+    wkt = crs.to_wkt()
+
+    if wkt not in srs:
+        code = crs.to_epsg()
+        srs_id = code if code is not None else 100000 + len(srs)
+        conn.execute(
+            "INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)",
+            (crs.name, srs_id, "EPSG" if code is not None else "NONE", srs_id, wkt, "")
+        )
+        srs[wkt] = srs_id
+
+    return srs[wkt]
+
+# Function to initialize an empty GeoPackage
+def create_gpkg(conn):
+    """
+    Creates the core GeoPackage tables and the required spatial reference systems.
+    """
+    conn.execute(f"PRAGMA application_id = {APPLICATION_ID}")
+    conn.execute(f"PRAGMA user_version = {USER_VERSION}")
+
+    for sql in GPKG_TABLES:
+        conn.execute(sql)
+
+    conn.executemany("INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", [
+        ("Undefined cartesian SRS", -1, "NONE", -1, "undefined", "undefined cartesian coordinate reference system"),
+        ("Undefined geographic SRS", 0, "NONE", 0, "undefined", "undefined geographic coordinate reference system"),
+        ("WGS 84 geodetic", 4326, "EPSG", 4326, pyproj.CRS.from_epsg(4326).to_wkt(),
+         "longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid"),
+    ])
+
+# Function to write one layer into an open GeoPackage
+def write_gpkg_layer(conn, layer, df, srs):
+    """
+    Creates a layer table and inserts all its rows with one executemany.
+
+    A "fid" column, if present, is used as the primary key; otherwise features
+    are numbered from 1 in order.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to the GeoPackage
+    layer (str): Layer name
+    df (pd.DataFrame or gpd.GeoDataFrame): Layer data
+    srs (dict): srs_id keyed by WKT of the CRSs registered so far (see register_srs)
+
+    Returns:
+    tuple: Geometry column (str or None), feature ids (np.ndarray) and feature
+        bounds (np.ndarray, None for aspatial layers)
+    """
+    geom_col = geometry_column(df)
+    attrs = [col for col in df.columns if col not in (geom_col, "fid")]
+
+    cols = ['"fid" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL']
+    names, values = [], []
+
+    if "fid" in df.columns:
+        fids = df["fid"].to_numpy(dtype=np.int64)
+        names.append("fid")
+        values.append(fids.tolist())
+    else:
+        fids = np.arange(1, len(df) + 1)
+
+    bounds = None
+    if geom_col:
+        geometry = df[geom_col].values
+        srs_id = register_srs(conn, df.crs, srs)
+
+        with span("wkb_encode", layer=layer) as s:
+            blobs, bounds = encode_gpkg_geometry(geometry, srs_id)
+            s.set(rows=len(blobs))
+
+        types = np.unique(shapely.get_type_id(geometry[~shapely.is_missing(geometry)]))
+        type_name = GEOMETRY_TYPES[types[0]] if len(types) == 1 else "GEOMETRY"
+        z = int(shapely.has_z(geometry).any())
+
+        cols.append(f'{quote(geom_col)} {type_name}')
+        names.append(geom_col)
+        values.append(blobs)
+
+    for col in attrs:
+        cols.append(f'{quote(col)} {column_type(df[col])}')
+        names.append(col)
+        values.append(column_values(df[col]))
+
+    conn.execute(f'CREATE TABLE {quote(layer)} ({", ".join(cols)})')
+    if names:
+        conn.executemany(
+            f'INSERT INTO {quote(layer)} ({", ".join(map(quote, names))}) VALUES ({", ".join("?" * len(names))})',
+            zip(*values)
+        )
+    else:
+        conn.executemany(f'INSERT INTO {quote(layer)} DEFAULT VALUES', ((),) * len(df))
+
+    if geom_col:
+        finite = np.isfinite(bounds).all(axis=1)
+        extent = [None] * 4
+        if finite.any():
+            extent = [float(bounds[finite, 0].min()), float(bounds[finite, 1].min()),
+                      float(bounds[finite, 2].max()), float(bounds[finite, 3].max())]
+
+        conn.execute(
+            "INSERT INTO gpkg_contents (table_name, data_type, identifier, min_x, min_y, max_x, max_y, srs_id) "
+            "VALUES (?, 'features', ?, ?, ?, ?, ?, ?)",
+            (layer, layer, *extent, srs_id)
+        )
+        conn.execute(
+            "INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, ?, 0)",
+            (layer, geom_col, type_name, srs_id, z)
+        )
+    else:
+        conn.execute(
+            "INSERT INTO gpkg_contents (table_name, data_type, identifier) VALUES (?, 'attributes', ?)",
+            (layer, layer)
+        )
+
+    return geom_col, fids, bounds
+
+# Function to find the active geometry column of a layer
+def geometry_column(df):
+    if not isinstance(df, gpd.GeoDataFrame):
+        return None
+    try:
+        return df.geometry.name
+    except AttributeError:
+        return None
+
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+# Function to pack bounding boxes into rtree nodes
+def pack_rtree(fids, bounds):
+    """
+    Packs feature bounding boxes into the nodes of an SQLite rtree with
+    sort-tile-recursive (STR) bulk loading.
+
+    Each level sorts its entries into vertical slices by x center, then by
+    y center within a slice, and groups them into full nodes. The result uses the
+    on-disk layout of SQLite's rtree module (2D, 32 bit float coordinates rounded
+    outwards), so it can be written straight into the %_node, %_rowid and
+    %_parent shadow tables.
+
+    Parameters:
+    fids (np.ndarray): Feature ids
+    bounds (np.ndarray): (xmin, ymin, xmax, ymax) rows, all finite
+
+    Returns:
+    tuple: (nodeno, data) node rows, (rowid, nodeno) rowid rows and
+        (nodeno, parentnode) parent rows (lists)
+    """
+    box = np.empty((len(bounds), 4), dtype=np.float32)
+    for j, (col, direction) in enumerate([(0, -np.inf), (2, np.inf), (1, -np.inf), (3, np.inf)]):
+        value = bounds[:, col]
+        f = value.astype(np.float32)
+        off = f < value if direction > 0 else f > value
+        f[off] = np.nextafter(f[off], np.float32(direction))
+        box[:, j] = f
+
+    ids = np.asarray(fids, dtype=np.int64)
+    levels = []
+
+    # Build levels bottom-up until the entries fit in the root
+    while True:
+        n = len(ids)
+        nodes = -(-n // RTREE_FANOUT)
+        if nodes > 1:
+            slices = int(np.ceil(np.sqrt(nodes)))
+            cx = box[:, 0].astype(np.float64) + box[:, 1]
+            cy = box[:, 2].astype(np.float64) + box[:, 3]
+            slice_of = np.empty(n, dtype=np.int64)
+            slice_of[np.argsort(cx, kind="stable")] = np.arange(n) // (slices * RTREE_FANOUT)
+            order = np.lexsort((cy, slice_of))
+
+            # Fill nodes within each slice
+            slice_of = slice_of[order]
+            start = np.searchsorted(slice_of, slice_of)
+            rank = np.arange(n) - start
+            first_node = np.concatenate([[0], np.cumsum(-(-np.bincount(slice_of) // RTREE_FANOUT))])
+            node = first_node[slice_of] + rank // RTREE_FANOUT
+            ids, box = ids[order], box[order]
+        else:
+            node = np.zeros(n, dtype=np.int64)
+
+        levels.append((ids, box, node))
+        if nodes == 1:
+            break
+
+        # Node bounding boxes become the entries of the next level
+        starts = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+        box = np.column_stack([
+            np.minimum.reduceat(box[:, 0], starts), np.maximum.reduceat(box[:, 1], starts),
+            np.minimum.reduceat(box[:, 2], starts), np.maximum.reduceat(box[:, 3], starts),
+        ])
+        ids = np.arange(len(starts), dtype=np.int64)  # renumbered below
+
+    # Number nodes top-down: the root is node 1
+    depth = len(levels) - 1
+    nodeno = [np.array([1])]
+    for ids, box, node in reversed(levels[1:]):
+        below = nodeno[-1][-1] + 1
+        nodeno.append(np.arange(below, below + len(ids)))
+    nodeno = nodeno[::-1]  # nodeno[k]: numbers of the nodes built from level k
+
+    node_rows, parent_rows, rowid_rows = [], [], []
+
+    for k, (ids, box, node) in enumerate(levels):
+        count = np.bincount(node)
+        numbers = nodeno[k]
+        child = ids if k == 0 else nodeno[k - 1][ids]
+
+        cells = np.empty(len(ids), dtype=RTREE_CELL)
+        cells["id"] = child
+        cells["box"] = box
+
+        data = np.zeros((len(count), RTREE_NODE_SIZE), dtype=np.uint8)
+        header = data[:, :4].view(">u2")
+        header[:, 1] = count
+        if k == depth:
+            header[0, 0] = depth
+
+        slot = np.arange(len(ids)) - np.searchsorted(node, node)
+        data[:, 4:].reshape(len(count), RTREE_FANOUT, RTREE_CELL.itemsize)[node, slot] = \
+            cells.view(np.uint8).reshape(len(ids), RTREE_CELL.itemsize)
+
+        node_rows += zip(numbers.tolist(), map(bytes, data))
+        if k == 0:
+            rowid_rows += zip(ids.tolist(), numbers[node].tolist())
+        else:
+            parent_rows += zip(child.tolist(), numbers[node].tolist())
+
+    return node_rows, rowid_rows, parent_rows
+
+# Function to build the rtree index of a layer
+def create_rtree(conn, layer, geom_col, fids, bounds):
+    """
+    Builds the rtree index of a layer from the bounds computed while encoding.
+
+    The tree is bulk loaded (see pack_rtree) into the shadow tables instead of
+    inserting features one by one. The triggers that keep it up to date on later
+    edits are added afterwards.
+    """
+    rtree = f"rtree_{layer}_{geom_col}"
+    conn.execute(f'CREATE VIRTUAL TABLE {quote(rtree)} USING rtree(id, minx, maxx, miny, maxy)')
+
+    keep = np.isfinite(bounds).all(axis=1)
+    if keep.any():
+        node_rows, rowid_rows, parent_rows = pack_rtree(fids[keep], bounds[keep])
+        conn.execute(f'DELETE FROM {quote(rtree + "_node")}')
+        conn.executemany(f'INSERT INTO {quote(rtree + "_node")} VALUES (?, ?)', node_rows)
+        conn.executemany(f'INSERT INTO {quote(rtree + "_rowid")} (rowid, nodeno) VALUES (?, ?)', rowid_rows)
+        conn.executemany(f'INSERT INTO {quote(rtree + "_parent")} VALUES (?, ?)', parent_rows)
+
+    for trigger in RTREE_TRIGGERS:
+        conn.execute(trigger.format(rtree=rtree, t=layer, c=geom_col, i="fid"))
+
+    conn.execute(
+        "INSERT INTO gpkg_extensions VALUES (?, ?, 'gpkg_rtree_index', "
+        "'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')",
+        (layer, geom_col)
+    )
+
+# Function to register the SQL functions used by the rtree triggers
+def register_gpkg_functions(conn):
+    """
+    Registers ST_IsEmpty and ST_MinX/ST_MinY/ST_MaxX/ST_MaxY on a connection.
+
+    The rtree triggers of a GeoPackage call them, so SQLite needs them to update
+    a layer (even without changing its geometry) outside of GDAL or SpatiaLite.
+
+    Parameters:
+    conn (sqlite3.Connection): Connection to a GeoPackage
+    """
+    def is_empty(blob):
+        return None if blob is None else (blob[3] >> 4) & 1
+
+    def bound(i):
+        def func(blob):
+            if blob is None:
+                return None
+            geometry, _, _ = decode_gpkg_geometry(np.array([blob], dtype=object))
+            return float(shapely.bounds(geometry[0])[i])
+        return func
+
+    conn.create_function("ST_IsEmpty", 1, is_empty, deterministic=True)
+    for i, name in enumerate(["ST_MinX", "ST_MinY", "ST_MaxX", "ST_MaxY"]):
+        conn.create_function(name, 1, bound(i), deterministic=True)
+
+# Function to write a set of layers to a GeoPackage in one transaction
+def write_gpkg(layers, outfile, styles=True, qml_dir=None):
+    """
+    Writes a set of layers to a new GeoPackage in a single SQLite transaction.
+
+    Geometries are encoded to GeoPackage blobs in bulk and every layer is inserted
+    with one executemany, with no spatial index triggers firing during the load.
+    The rtree indexes and layer_styles are built once at the end. The file is
+    written next to outfile and moved into place when complete, replacing any
+    existing file.
+
+    Parameters:
+    layers (dict): Layers (pd.DataFrame or gpd.GeoDataFrame) keyed by name
+    outfile (str): Path to the GeoPackage
+    styles (bool, optional): Add the hydrofabric QML styles of the layers, defaults to True
+    qml_dir (str, optional): Directory path to the QML files, defaults to inst/qml
+
+    Returns:
+    str: Path to the GeoPackage
+    """
+    tmp = f"{outfile}.tmp-{os.getpid()}"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    try:
+        with span("write_gpkg", path=outfile) as s, closing(sqlite3.connect(tmp, isolation_level=None)) as conn:
+            # A fresh file that is only moved into place once committed needs no journal
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("BEGIN")
+
+            create_gpkg(conn)
+            srs, indexes = {}, []
+
+            for layer, df in layers.items():
+                with span("write", layer=layer, path=outfile) as w:
+                    geom_col, fids, bounds = write_gpkg_layer(conn, layer, df, srs)
+                    w.set(rows=len(df))
+
+                if geom_col:
+                    indexes.append((layer, geom_col, fids, bounds))
+
+            with span("rtree", path=outfile):
+                for layer, geom_col, fids, bounds in indexes:
+                    create_rtree(conn, layer, geom_col, fids, bounds)
+
+            if styles:
+                geom_cols = {layer: geom_col for layer, geom_col, _, _ in indexes}
+                records = style_records(geom_cols, set(layers), qml_dir)
+                if records:
+                    insert_styles(conn, records)
+
+            conn.execute("COMMIT")
+
+            s.set(rows=sum(len(df) for df in layers.values()))
+
+        os.replace(tmp, outfile)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    return outfile
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyproj
+import shapely
+from pyarrow import parquet as pq
+from scipy.sparse import csr_matrix
+
+# Grid definition (cells are numbered 1..ncols*nrows, row-major from the top-left corner as in terra)
+Grid = namedtuple("Grid", ["xmin", "ymin", "xmax", "ymax", "ncols", "nrows", "crs"])
+
+# Maximum number of (polygon, cell) candidate pairs intersected at once
+BLOCK_SIZE = 1000000
+
+# Function to read a grid definition
+def read_grid(path):
+    """
+    Reads a grid definition written by the forcing runner (forcing_grids.json).
+
+    Parameters:
+    path (str): Path to the JSON grid definition (X1, Xn, Y1, Yn, ncols, nrows, crs)
+
+    Returns:
+    Grid: Grid definition
+    """
+    with open(path) as f:
+        g = json.load(f)
+
+    g = g[0] if isinstance(g, list) else g
+    return Grid(g["X1"], g["Y1"], g["Xn"], g["Yn"], int(g["ncols"]), int(g["nrows"]), g["crs"])
+
+# Function to fingerprint a grid and a set of divides
+def weights_fingerprint(grid, divides, ID="divide_id"):
+    """
+    Hashes a grid definition together with the ids and geometries of a set of divides.
+
+    Parameters:
+    grid (Grid): Grid definition
+    divides (gpd.GeoDataFrame): Divides
+    ID (str, optional): Divide id column, defaults to "divide_id"
+
+    Returns:
+    str: Hex digest keying the cached weights
+    """
+    h = hashlib.sha256()
+    h.update(repr(tuple(grid[:6]) + (pyproj.CRS.from_user_input(grid.crs).to_wkt(),)).encode())
+    h.update(pd.util.hash_pandas_object(divides[ID], index=False).to_numpy().tobytes())
+    h.update(b"".join(shapely.to_wkb(divides.geometry.values)))
+    return h.hexdigest()
+
+# Function to compute exact coverage weights of polygons over a grid
+def coverage_fractions(grid, geometry, ids):
+    """
+    Computes the fraction of each grid cell covered by each polygon.
+
+    Candidate cells come from the polygon envelopes; cells fully inside a polygon
+    get a fraction of 1 from a prepared containment test, and only boundary cells
+    are intersected exactly.
+
+    Parameters:
+    grid (Grid): Grid definition
+    geometry (np.ndarray): Polygons in the grid CRS
+    ids (np.ndarray): Polygon ids
+
+    Returns:
+    pd.DataFrame: id, cell and coverage_fraction columns
+    """
+    resx = (grid.xmax - grid.xmin) / grid.ncols
+    resy = (grid.ymax - grid.ymin) / grid.nrows
+
+    # Cell ranges of each polygon envelope
+    b = shapely.bounds(geometry)
+    c0 = np.floor((b[:, 0] - grid.xmin) / resx).clip(0, grid.ncols - 1).astype(np.int64)
+    c1 = np.floor((b[:, 2] - grid.xmin) / resx).clip(0, grid.ncols - 1).astype(np.int64)
+    r0 = np.floor((grid.ymax - b[:, 3]) / resy).clip(0, grid.nrows - 1).astype(np.int64)
+    r1 = np.floor((grid.ymax - b[:, 1]) / resy).clip(0, grid.nrows - 1).astype(np.int64)
+    nc, nr = c1 - c0 + 1, r1 - r0 + 1
+    counts = np.where(shapely.is_empty(geometry) | pd.isna(geometry), 0, nc * nr)
+
+    shapely.prepare(geometry)
+    out = []
+
+    # Process polygons in blocks of about BLOCK_SIZE candidate cells
+    csum = np.cumsum(counts)
+    start = 0
+
+    while start < len(geometry):
+        end = max(np.searchsorted(csum, csum[start] - counts[start] + BLOCK_SIZE, side="right"), start + 1)
+        sl = slice(start, end)
+        start = end
+        n = counts[sl]
+
+        if n.sum() == 0:
+            continue
+
+        poly = np.repeat(np.arange(sl.start, sl.stop), n)
+        k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        width = np.repeat(nc[sl], n)
+        col = np.repeat(c0[sl], n) + k % width
+        row = np.repeat(r0[sl], n) + k // width
+
+        cells = shapely.box(
+            grid.xmin + col * resx, grid.ymax - (row + 1) * resy,
+            grid.xmin + (col + 1) * resx, grid.ymax - row * resy
+        )
+
+        polys = geometry[poly]
+        hit = shapely.intersects(polys, cells)
+        inside = hit & shapely.contains(polys, cells)
+        edge = hit & ~inside
+
+        frac = inside.astype(np.float64)
+        frac[edge] = shapely.area(shapely.intersection(cells[edge], polys[edge])) / (resx * resy)
+
+        keep = frac > 0
+        out.append(pd.DataFrame({
+            "id": ids[poly[keep]],
+            "cell": row[keep] * grid.ncols + col[keep] + 1,
+            "coverage_fraction": frac[keep]
+        }))
+
+    if not out:
+        return pd.DataFrame({"id": ids[:0], "cell": np.array([], dtype=np.int64), "coverage_fraction": []})
+
+    return pd.concat(out, ignore_index=True)
+
+# Function to compute (or load cached) divide weights over a grid
+def weight_grid(grid, divides, ID="divide_id", by=None, workers=None, cache_dir=None):
+    """
+    Computes exact-coverage cell weights of divides over a grid.
+
+    Weights are computed in parallel across the groups of `by` (e.g. vpuid), or
+    across equal splits of the divides. With a cache_dir, weights are stored as
+    Parquet keyed by a fingerprint of the grid and divides and reused on later calls.
+
+    Parameters:
+    grid (Grid): Grid definition
+    divides (gpd.GeoDataFrame): Divides
+    ID (str, optional): Divide id column, defaults to "divide_id"
+    by (str, optional): Column to parallelize over, defaults to None
+    workers (int, optional): Number of processes, defaults to None (serial)
+    cache_dir (str, optional): Directory of cached weights, defaults to None
+
+    Returns:
+    pd.DataFrame: ID, cell and coverage_fraction columns
+    """
+    if cache_dir:
+        path = os.path.join(cache_dir, f"weights_{weights_fingerprint(grid, divides, ID)}.parquet")
+        if os.path.exists(path):
+            return pq.read_table(path).to_pandas()
+
+    if divides.crs is not None and not divides.crs.equals(pyproj.CRS.from_user_input(grid.crs)):
+        divides = divides.to_crs(grid.crs)
+
+    geometry = np.asarray(divides.geometry.array)
+    ids = divides[ID].to_numpy()
+
+    if by is not None:
+        groups = list(divides.groupby(by, sort=False).indices.values())
+    else:
+        groups = np.array_split(np.arange(len(divides)), max(workers or 1, 1))
+
+    with ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else nullcontext() as pool:
+        run = pool.map if pool else map
+        parts = list(run(coverage_fractions, [grid] * len(groups), [geometry[g] for g in groups], [ids[g] for g in groups]))
+
+    w = pd.concat(parts, ignore_index=True).rename(columns={"id": ID})
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(pa.Table.from_pandas(w, preserve_index=False), tmp)
+        os.replace(tmp, path)
+
+    return w
+
+# Function to build the sparse weight matrix of a weight table
+def weight_matrix(w, ncells, ID="divide_id"):
+    """
+    Builds the sparse (ids x cells) matrix of a weight table.
+
+    Parameters:
+    w (pd.DataFrame): Weights from weight_grid
+    ncells (int): Number of cells of the grid
+    ID (str, optional): Divide id column, defaults to "divide_id"
+
+    Returns:
+    tuple: Divide ids (np.ndarray) and weight matrix (scipy.sparse.csr_matrix)
+    """
+    ids, rows = np.unique(w[ID].to_numpy(), return_inverse=True)
+    cols = w["cell"].to_numpy() - 1
+    return ids, csr_matrix((w["coverage_fraction"].to_numpy(), (rows, cols)), shape=(len(ids), ncells))
+
+# Function to compute coverage weighted means
+def weighted_mean(W, X):
+    """
+    Coverage weighted mean of each column of X, ignoring missing values.
+    """
+    valid = ~np.isnan(X)
+    return (W @ np.where(valid, X, 0)) / (W @ valid.astype(np.float64))
+
+# Function to apply cached weights to raster bands
+def execute_zonal(data, w, ID="divide_id", fun="mean", groups=4):
+    """
+    Summarizes raster bands over divides with precomputed weights.
+
+    All bands are summarized at once as a sparse matrix product with the weights,
+    so new rasters on the same grid reuse the weights without intersecting polygons.
+
+    Parameters:
+    data (np.ndarray or dict): Band array(s) of shape (nrows, ncols) or (bands, nrows, ncols),
+        or a dict of arrays keyed by output name
+    w (pd.DataFrame): Weights from weight_grid
+    ID (str, optional): Divide id column, defaults to "divide_id"
+    fun (str, optional): "mean", "circular_mean", "freq" or "equal_population_distribution",
+        defaults to "mean"
+    groups (int, optional): Number of bins of equal_population_distribution, defaults to 4
+
+    Returns:
+    pd.DataFrame: One row per divide and one column per band ("freq" returns a long
+        table of ID, band, value and percentage)
+    """
+    if isinstance(data, dict):
+        names = list(data)
+        X = np.stack([np.asarray(v, dtype=np.float64) for v in data.values()])
+    else:
+        X = np.asarray(data, dtype=np.float64)
+        X = X[None] if X.ndim == 2 else X
+        names = [f"{fun}.{i + 1}" for i in range(X.shape[0])] if X.shape[0] > 1 else [fun]
+
+    X = X.reshape(X.shape[0], -1).T
+    ids, W = weight_matrix(w, X.shape[0], ID)
+
+    if fun == "mean":
+        out = weighted_mean(W, X)
+    elif fun == "circular_mean":
+        rad = np.deg2rad(X)
+        out = np.rad2deg(np.arctan2(weighted_mean(W, np.sin(rad)), weighted_mean(W, np.cos(rad)))) % 360
+    elif fun == "freq":
+        return zonal_freq(W, X, ids, names, ID)
+    elif fun == "equal_population_distribution":
+        out = np.column_stack([equal_population_distribution(W, X[:, i], groups) for i in range(X.shape[1])])
+    else:
+        raise ValueError(f"{fun} is not a supported zonal function.")
+
+    return pd.concat([pd.DataFrame({ID: ids}), pd.DataFrame(out, columns=names)], axis=1)
+
+# Function to compute the coverage weighted frequency of values
+def zonal_freq(W, X, ids, names, ID):
+    """
+    Coverage weighted share of each distinct value within each divide.
+    """
+    W = W.tocoo()
+    out = []
+
+    for band, name in enumerate(names):
+        values = X[W.col, band]
+        ok = ~np.isnan(values)
+        df = pd.DataFrame({ID: ids[W.row[ok]], "value": values[ok], "w": W.data[ok]})
+        df = df.groupby([ID, "value"], sort=True)["w"].sum().reset_index()
+        df["percentage"] = df["w"] / df.groupby(ID)["w"].transform("sum")
+        out.append(df.drop(columns="w").assign(band=name))
+
+    return pd.concat(out, ignore_index=True)[[ID, "band", "value", "percentage"]]
+
+# Function to compute the distribution of values over equal population bins
+def equal_population_distribution(W, x, groups=4):
+    """
+    Coverage weighted share of each divide in bins holding equal shares of all cells.
+
+    Returns one JSON string per divide with the bin centers ("v") and the share of
+    the divide in each bin ("frequency").
+    """
+    ok = ~np.isnan(x)
+    breaks = np.unique(np.quantile(x[ok], np.linspace(0, 1, groups + 1)))
+    bins = np.clip(np.searchsorted(breaks, x, side="right") - 1, 0, len(breaks) - 2)
+    centers = (breaks[:-1] + breaks[1:]) / 2
+
+    onehot = csr_matrix(
+        (ok.astype(np.float64)[ok], (np.flatnonzero(ok), bins[ok])), shape=(len(x), len(centers))
+    )
+    counts = (W @ onehot).toarray()
+    freq = counts / counts.sum(axis=1, keepdims=True)
+
+    return np.array([
+        json.dumps({"v": centers.round(6).tolist(), "frequency": f.round(6).tolist()}) for f in freq
+    ], dtype=object)
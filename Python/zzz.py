@@ -1,5 +1,7 @@
 import sys
-import importlib
+import importlib.util
+
+from .utils import lazy_import
 
 # Function to check if a module is loaded
 def is_attached(module_name):
@@ -54,12 +56,24 @@ core = ['hydrofabric', 'other_module']  # Add relevant module names
 def hydrofabric_attach():
     """
     Attaches necessary modules to the environment.
+
+    Modules are only located here; each one is imported on first use.
+
+    Returns:
+    dict: Lazily imported modules keyed by name
     """
+    attached = {}
     for mod in core:
         try:
-            importlib.import_module(mod)
-        except ImportError:
+            found = importlib.util.find_spec(mod) is not None
+        except (ImportError, ValueError):
+            found = False
+
+        if found:
+            attached[mod] = lazy_import(mod)
+        else:
             print(f"Module '{mod}' could not be imported.", file=sys.stderr)
+    return attached
 
 # Placeholder for conflict checking (equivalent to hydrofabric_conflicts)
 def hydrofabric_conflicts():
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# The package is imported as "Python" from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Divides of the synthetic test fabric (see benchmark.synthetic_fabric)
+FABRIC_SIZE = 400
+
+@pytest.fixture(scope="session")
+def fabric(tmp_path_factory):
+    """
+    Synthetic hydrofabric written once per session as a GeoPackage and GeoParquet datasets.
+    """
+    from Python.benchmark import write_fabric
+
+    return write_fabric(FABRIC_SIZE, str(tmp_path_factory.mktemp("fabric")))
+
+@pytest.fixture
+def gpkg_copy(fabric, tmp_path):
+    """
+    Copy of the fabric GeoPackage that a test may modify.
+    """
+    import shutil
+
+    path = tmp_path / "fabric.gpkg"
+    shutil.copyfile(fabric["gpkg"], path)
+    return str(path)
+
+@pytest.fixture(autouse=True)
+def pooled_gpkgs():
+    # Every test starts from an empty connection pool and no layer cache
+    from Python.cache import disable_cache
+    from Python.sqlite import close_gpkgs
+
+    disable_cache()
+    yield
+    close_gpkgs()
+    disable_cache()
@@ -0,0 +1,27 @@
+from Python import benchmark
+
+def test_failing_case_is_recorded(monkeypatch, fabric):
+    def broken(fabric):
+        def run():
+            raise UnicodeDecodeError("utf-8", b"\x01", 0, 1, "invalid start byte")
+        return run
+
+    monkeypatch.setitem(benchmark.CASES, "broken", broken)
+    timing = benchmark.time_case("broken", fabric, repeat=2)
+
+    assert timing["seconds"] == []
+    assert timing["error"].startswith("UnicodeDecodeError")
+
+def test_run_continues_past_failures(tmp_path):
+    # The unknown case fails in its worker; the cases around it still run
+    results = benchmark.run_benchmarks([50], ["as_sqlite", "not_a_case", "read_parquet"], repeat=1, data_dir=str(tmp_path))
+
+    records = {r["case"]: r for r in results["results"]}
+    assert records["not_a_case"]["error"].startswith("KeyError")
+    assert records["not_a_case"]["best"] is None
+    for case in ("as_sqlite", "read_parquet"):
+        assert records[case]["error"] is None and records[case]["rows"] > 0
+
+    cmp = benchmark.compare_results(results, results)
+    assert sorted(cmp["case"]) == ["as_sqlite", "read_parquet"]
+    assert not cmp["regression"].any()
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from Python import profiling
+from Python.cache import enable_cache
+from Python.package import read_parquet
+from Python.sqlite import as_sqlite, read_sf_dataset_sqlite
+
+def entries(path):
+    return sorted(name for name in os.listdir(path) if name.endswith(".arrow"))
+
+def read_layer(gpkg, layer, **kwargs):
+    return read_sf_dataset_sqlite(as_sqlite(gpkg, layer), layer, **kwargs)
+
+def cache_hits():
+    return [s["attrs"]["hit"] for s in profiling.get_spans() if s["name"] == "cache_read"]
+
+def test_warm_reads_match_sqlite(fabric, tmp_path):
+    expected = read_layer(fabric["gpkg"], "divides")
+    bbox = (10000, 10000, 20000, 15000)
+    expected_bbox = read_layer(fabric["gpkg"], "divides", bbox=bbox)
+
+    enable_cache(str(tmp_path))
+    profiling.enable_profiling()
+    try:
+        for _ in range(2):
+            pd.testing.assert_frame_equal(read_layer(fabric["gpkg"], "divides"), expected)
+            pd.testing.assert_frame_equal(read_layer(fabric["gpkg"], "divides", bbox=bbox).reset_index(drop=True),
+                                          expected_bbox.reset_index(drop=True))
+        assert cache_hits() == [False, True, True, True]
+    finally:
+        profiling.disable_profiling()
+        profiling.clear_spans()
+
+    assert len(entries(tmp_path)) == 1
+
+def test_entries_too_large_to_cache(fabric, tmp_path):
+    # Every layer is larger than the cache
+    enable_cache(str(tmp_path), max_bytes=1000)
+
+    df = read_layer(fabric["gpkg"], "divides")
+    assert len(df) == fabric["n"]
+    assert entries(tmp_path) == []
+
+def test_new_entries_are_not_evicted(fabric, tmp_path):
+    # Entry sizes of both layers
+    enable_cache(str(tmp_path / "sizes"))
+    sizes = {}
+    for layer in ("network", "divides"):
+        read_layer(fabric["gpkg"], layer)
+        sizes[layer] = sum(os.path.getsize(tmp_path / "sizes" / name) for name in entries(tmp_path / "sizes")) - sum(sizes.values())
+
+    # Room for either layer, but not for both
+    enable_cache(str(tmp_path / "cache"), max_bytes=max(sizes.values()) + 100)
+    for layer in ("network", "divides", "network"):
+        df = read_layer(fabric["gpkg"], layer)
+        assert len(df) == fabric["n"]
+
+        kept = entries(tmp_path / "cache")
+        assert len(kept) == 1 and os.path.getsize(tmp_path / "cache" / kept[0]) == sizes[layer]
+
+def test_stale_entries(gpkg_copy, tmp_path):
+    enable_cache(str(tmp_path))
+    assert len(read_layer(gpkg_copy, "nexus")) > 10
+
+    with closing(sqlite3.connect(gpkg_copy)) as conn, conn:
+        conn.execute("DELETE FROM nexus WHERE fid <= 10")
+    os.utime(gpkg_copy, ns=(os.stat(gpkg_copy).st_atime_ns, os.stat(gpkg_copy).st_mtime_ns + 10 ** 9))
+
+    df = read_layer(gpkg_copy, "nexus")
+    assert len(df) == len(read_layer(gpkg_copy, "nexus", where="1 = 1"))
+    assert len(entries(tmp_path)) == 1
+
+def test_read_parquet_filters_bypass_cache(fabric, tmp_path):
+    path = os.path.join(fabric["parquet"], "divides")
+    expected = read_parquet(path, filters={"vpuid": "01"})
+    expected_bbox = read_parquet(path, columns=["divide_id"], bbox=(10000, 10000, 20000, 15000))
+
+    enable_cache(str(tmp_path))
+    pd.testing.assert_frame_equal(read_parquet(path, filters={"vpuid": "01"}), expected)
+    pd.testing.assert_frame_equal(read_parquet(path, columns=["divide_id"], bbox=(10000, 10000, 20000, 15000)), expected_bbox)
+    assert entries(tmp_path) == []
+
+    columns = read_parquet(path, columns=["divide_id", "areasqkm"])
+    assert columns.columns.tolist() == ["divide_id", "areasqkm"] and len(columns) == fabric["n"]
+    assert len(entries(tmp_path)) == 1
+
+def test_cached_mask_matches_uncached(fabric, tmp_path):
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    from Python.mask_hydrofabric import mask_hydrofabric
+
+    crs = gpd.read_file(fabric["gpkg"], layer="divides", rows=0).crs
+    mask = gpd.GeoDataFrame(geometry=[box(10000, 10000, 25000, 20000)], crs=crs).to_crs("EPSG:4326")
+    expected = mask_hydrofabric(fabric["gpkg"], mask)
+
+    enable_cache(str(tmp_path))
+    for _ in range(2):
+        result = mask_hydrofabric(fabric["gpkg"], mask)
+        assert list(result) == list(expected)
+        for layer, df in expected.items():
+            assert list(result[layer].columns) == list(df.columns)
+            pd.testing.assert_frame_equal(result[layer].sort_values("id").reset_index(drop=True),
+                                          df.sort_values("id").reset_index(drop=True), check_dtype=False, obj=layer)
+    assert entries(tmp_path)
@@ -0,0 +1,70 @@
+import sys
+import types
+
+import pytest
+
+from Python import conflicts
+
+def fake_module(name, **attrs):
+    module = types.ModuleType(name)
+    vars(module).update(attrs)
+    return module
+
+def shared():
+    pass
+
+@pytest.fixture
+def loaded(monkeypatch):
+    # Stand-ins for core packages, and an unrelated module exporting the same names
+    modules = {
+        "sf": fake_module("sf", st_read=lambda: None, filter=shared, _private=1),
+        "terra": fake_module("terra", filter=lambda: None, rast=lambda: None),
+        "dplyr": fake_module("dplyr", filter=shared, union=lambda: None),
+        "fakepkg": fake_module("fakepkg", rast=lambda: None)
+    }
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    return modules
+
+def test_conflicts_between_core_packages(loaded):
+    found = conflicts.hydrofabric_conflicts()
+
+    assert found == {"filter": ["dplyr", "sf", "terra"]}
+    assert conflicts.hydrofabric_conflicts(only=["fakepkg"]) == {
+        "filter": ["dplyr", "sf", "terra"], "rast": ["terra", "fakepkg"]
+    }
+
+    # Only the requested packages are indexed
+    assert "fakepkg" in conflicts._exports
+    assert "os" not in conflicts._exports
+
+def test_replaced_and_unloaded_packages(loaded, monkeypatch):
+    conflicts.hydrofabric_conflicts()
+
+    monkeypatch.setitem(sys.modules, "terra", fake_module("terra", rast=lambda: None))
+    assert conflicts.hydrofabric_conflicts() == {"filter": ["dplyr", "sf"]}
+
+    monkeypatch.delitem(sys.modules, "dplyr")
+    assert conflicts.hydrofabric_conflicts() == {}
+    assert "dplyr" not in conflicts._exports
+
+def test_confirm_conflict(loaded, monkeypatch):
+    assert conflicts.confirm_conflict(["sf", "terra"], "filter") == ["sf", "terra"]
+    assert conflicts.confirm_conflict(["sf", "dplyr"], "filter") is None
+
+    # Answered from the index: exports are recorded when a module is indexed
+    monkeypatch.setattr(loaded["dplyr"], "filter", lambda: None)
+    assert conflicts.confirm_conflict(["sf", "dplyr"], "filter") is None
+
+    # A new version of the module is indexed again
+    monkeypatch.setattr(loaded["dplyr"], "__version__", "1.1.0", raising=False)
+    assert conflicts.confirm_conflict(["sf", "dplyr"], "filter") == ["sf", "dplyr"]
+
+    # As is a replaced module
+    monkeypatch.setitem(sys.modules, "terra", fake_module("terra", filter=shared))
+    assert conflicts.confirm_conflict(["sf", "terra"], "filter") is None
+
+    # Packages that are not loaded are skipped, never imported
+    monkeypatch.delitem(sys.modules, "this", raising=False)
+    assert conflicts.confirm_conflict(["sf", "this", "not_a_package"], "filter") is None
+    assert "this" not in sys.modules
@@ -0,0 +1,77 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+netCDF4 = pytest.importorskip("netCDF4")
+
+from Python.forcing import aggregate_forcing, aggregate_forcing_file
+from Python.zonal import Grid, execute_zonal, weight_grid
+
+GRID = Grid(0.0, 0.0, 6.0, 4.0, 6, 4, "EPSG:5070")
+
+@pytest.fixture
+def weights():
+    divides = gpd.GeoDataFrame({
+        "divide_id": ["cat-1", "cat-2"],
+        "geometry": [shapely.box(0.5, 0.5, 2.5, 3.5), shapely.box(3, 1, 5.5, 4)]
+    }, crs=GRID.crs)
+    return weight_grid(GRID, divides)
+
+def write_forcing(path, values, ascending=True):
+    # (time, y, x) variables with y stored bottom-up as in most forcing files
+    nt = values["RAINRATE"].shape[0]
+    with netCDF4.Dataset(path, "w") as nc:
+        nc.createDimension("time", nt)
+        nc.createDimension("y", GRID.nrows)
+        nc.createDimension("x", GRID.ncols)
+        t = nc.createVariable("time", "f8", ("time",))
+        t.units = "hours since 2020-01-01 00:00:00"
+        t[:] = np.arange(nt)
+        y = nc.createVariable("y", "f8", ("y",))
+        y[:] = np.arange(GRID.nrows) + 0.5 if ascending else GRID.nrows - 0.5 - np.arange(GRID.nrows)
+        for name, v in values.items():
+            var = nc.createVariable(name, "f4", ("time", "y", "x"), fill_value=-9999.0)
+            var[:] = np.ma.masked_invalid(v[:, ::-1] if ascending else v)
+    return str(path)
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_forcing_matches_zonal_mean(weights, tmp_path, ascending):
+    # Values are given top-down, as cells are numbered
+    rng = np.random.default_rng(2)
+    values = {
+        "RAINRATE": rng.uniform(0, 1, (5, GRID.nrows, GRID.ncols)).astype(np.float32),
+        "T2D": rng.uniform(250, 300, (5, GRID.nrows, GRID.ncols)).astype(np.float32)
+    }
+    values["T2D"][2, 1, 1] = np.nan
+    file = write_forcing(tmp_path / "forcing.nc", values, ascending)
+
+    out = pd.read_parquet(aggregate_forcing_file(file, weights, str(tmp_path / "out.parquet")))
+    assert out.columns.tolist() == ["divide_id", "time", "RAINRATE", "T2D"]
+    assert out["time"].unique().tolist() == list(pd.date_range("2020-01-01", periods=5, freq="h"))
+
+    for step in range(5):
+        expected = execute_zonal({k: v[step] for k, v in values.items()}, weights)
+        got = out[out["time"] == pd.Timestamp("2020-01-01") + pd.Timedelta(hours=step)]
+        assert got["divide_id"].tolist() == expected["divide_id"].tolist()
+        for v in values:
+            assert np.allclose(got[v], expected[v], rtol=1e-5)
+
+def test_aggregate_forcing_files(weights, tmp_path):
+    rng = np.random.default_rng(3)
+    files = [
+        write_forcing(tmp_path / f"forcing_{i}.nc", {"RAINRATE": rng.uniform(0, 1, (3, GRID.nrows, GRID.ncols))})
+        for i in range(2)
+    ]
+    path = str(tmp_path / "weights.parquet")
+    weights.to_parquet(path)
+
+    outfiles = aggregate_forcing(files, path, str(tmp_path / "out"), variables=["RAINRATE"], workers=2)
+    assert [p.rsplit("/", 1)[1] for p in outfiles] == ["forcing_0.parquet", "forcing_1.parquet"]
+    for file, outfile in zip(files, outfiles):
+        expected = pd.read_parquet(aggregate_forcing_file(file, weights, str(tmp_path / "serial.parquet")))
+        pd.testing.assert_frame_equal(pd.read_parquet(outfile), expected)
+
+    with pytest.raises(ValueError):
+        aggregate_forcing_file(files[0], weights, str(tmp_path / "bad.parquet"), variables=["LWDOWN"])
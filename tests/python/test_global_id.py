@@ -0,0 +1,66 @@
+import sqlite3
+from contextlib import closing
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+import shapely
+
+from Python.global_id import assign_global_identifiers
+from Python.writer import write_gpkg
+
+def vpu_layers(vpu):
+    # Flowpaths 100..104 draining in a chain; the last one leaves the VPU
+    ids = list(range(100, 105))
+    flowpaths = gpd.GeoDataFrame({
+        "id": ids, "toid": ids[1:] + [None], "divide_id": ids,
+        "member_comid": [f"{vpu * 1000 + i},{vpu * 1000 + i}.1" for i in range(5)],
+        "geometry": [shapely.LineString([(i, vpu), (i + 1, vpu)]) for i in range(5)]
+    }, crs="EPSG:5070")
+    divides = gpd.GeoDataFrame({
+        "divide_id": ids, "id": ids,
+        "geometry": [shapely.box(i, vpu, i + 1, vpu + 1) for i in range(5)]
+    }, crs="EPSG:5070")
+    pois = pd.DataFrame({"poi_id": [7, 9], "id": [101, 103]})
+    return {"flowpaths": flowpaths, "divides": divides, "pois": pois}
+
+@pytest.fixture
+def vpus(tmp_path):
+    # Styled GeoPackages: layer_styles holds its own id primary key
+    return [write_gpkg(vpu_layers(vpu), str(tmp_path / f"vpu_{vpu}.gpkg")) for vpu in (1, 2)]
+
+def read(gpkg, query):
+    with closing(sqlite3.connect(gpkg)) as conn:
+        return conn.execute(query).fetchall()
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_assign_global_identifiers(vpus, workers):
+    styles = [read(gpkg, "SELECT * FROM layer_styles ORDER BY id") for gpkg in vpus]
+    assert [row[0] for row in styles[0]] == [1, 2]
+
+    modifications = pd.DataFrame({"from": [1004], "to": [2000]})
+    meta = assign_global_identifiers(vpus, modifications=modifications, workers=workers)
+
+    assert meta[["ids", "id_start", "id_end", "pois", "poi_start", "poi_end", "modified"]].values.tolist() == [
+        [5, 1, 5, 2, 1, 2, 1], [5, 6, 10, 2, 3, 4, 0]
+    ]
+
+    for i, gpkg in enumerate(vpus):
+        start = 5 * i
+        assert read(gpkg, "SELECT id, divide_id FROM flowpaths ORDER BY fid") == [(start + k, start + k) for k in range(1, 6)]
+        assert read(gpkg, "SELECT id FROM divides ORDER BY fid") == [(start + k,) for k in range(1, 6)]
+        assert read(gpkg, "SELECT poi_id, id FROM pois ORDER BY fid") == [(2 * i + 1, start + 2), (2 * i + 2, start + 4)]
+        assert read(gpkg, "SELECT * FROM layer_styles ORDER BY id") == styles[i]
+
+    # The last flowpath of the first VPU drains to the first flowpath of the second
+    assert read(vpus[0], "SELECT toid FROM flowpaths ORDER BY fid") == [(2,), (3,), (4,), (5,), (6,)]
+    assert read(vpus[1], "SELECT toid FROM flowpaths ORDER BY fid") == [(7,), (8,), (9,), (10,), (None,)]
+
+def test_explicit_layers(vpus, tmp_path):
+    outfiles = [str(tmp_path / f"out_{i}.gpkg") for i in range(2)]
+    assign_global_identifiers(vpus, outfiles=outfiles, layers=["flowpaths"])
+
+    assert read(outfiles[1], "SELECT id FROM flowpaths ORDER BY fid") == [(k,) for k in range(6, 11)]
+    assert read(outfiles[1], "SELECT id FROM divides ORDER BY fid") == [(k,) for k in range(100, 105)]
+    assert read(vpus[1], "SELECT id FROM flowpaths ORDER BY fid") == [(k,) for k in range(100, 105)]
+    assert read(outfiles[0], "SELECT rtreecheck('rtree_flowpaths_geometry')") == [("ok",)]
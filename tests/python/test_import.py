@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+
+# Cumulative import time allowed for the package itself, in microseconds
+IMPORT_BUDGET = 100000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def test_import_is_light():
+    code = "import sys, Python; print(sorted(m for m in ('geopandas', 'pyarrow', 'dask', 'pandas') if m in sys.modules))"
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    assert out.stdout.strip() == "[]"
+
+    # "import time: self [us] | cumulative | name" for each module
+    times = {
+        line.rsplit("|", 1)[1].strip(): int(line.split("|")[1])
+        for line in out.stderr.splitlines() if line.startswith("import time:") and "|" in line
+        and line.split("|")[1].strip().isdigit()
+    }
+    assert times["Python"] < IMPORT_BUDGET
+
+def test_lazy_names():
+    import Python
+
+    assert set(Python.__all__) <= set(dir(Python))
+    assert Python.read_parquet is sys.modules["Python.package"].read_parquet
+
+    with pytest.raises(AttributeError):
+        Python.not_a_function
+
+def test_submodules_are_modules():
+    # A submodule keeps its name on the package even when it defines a function of the same name
+    import Python
+    import Python.mask_hydrofabric as m
+
+    assert Python.mask_hydrofabric is m
+    assert Python.mask_hydrofabric_batch is m.mask_hydrofabric_batch
+
+    with mock.patch("Python.mask_hydrofabric.union_ids") as patched:
+        assert m.union_ids is patched
@@ -0,0 +1,110 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import Point, box
+
+from Python.mask_hydrofabric import id_cols, mask_hydrofabric, mask_hydrofabric_batch
+
+SPATIAL = ["divides", "flowpaths", "nexus"]
+
+@pytest.fixture(scope="module")
+def crs(fabric):
+    return gpd.read_file(fabric["gpkg"], layer="divides", rows=0).crs
+
+@pytest.fixture(scope="module")
+def mask(crs):
+    # Two disjoint shapes, so the rtree envelope holds candidates outside both
+    return gpd.GeoDataFrame(geometry=[box(10000, 10000, 25000, 20000), Point(45000, 45000).buffer(6000)], crs=crs)
+
+def brute_force(gpkg, mask):
+    """
+    Subsets every layer by intersecting all features with the mask, and the
+    aspatial layers by the IDs of the spatial subsets.
+    """
+    out, ids = {}, []
+    for layer in SPATIAL:
+        gdf = gpd.read_file(gpkg, layer=layer)
+        gdf = gdf[gdf.intersects(mask.to_crs(gdf.crs).union_all())]
+        ids += [gdf[col].dropna() for col in id_cols if col in gdf.columns]
+        out[layer] = gdf
+
+    ids = set(pd.concat(ids))
+    network = gpd.read_file(gpkg, layer="network")
+    out["network"] = network[network[[col for col in id_cols if col in network.columns]].isin(ids).any(axis=1)]
+    return out
+
+def assert_same_layers(result, expected):
+    assert set(result) == set(expected)
+    for layer, df in expected.items():
+        pd.testing.assert_frame_equal(result[layer].sort_values("id").reset_index(drop=True),
+                                      df.sort_values("id").reset_index(drop=True), check_dtype=False, obj=layer)
+
+@pytest.mark.parametrize("to_crs", [None, "EPSG:4326"])
+def test_mask_matches_brute_force(fabric, mask, to_crs):
+    mask = mask.to_crs(to_crs) if to_crs else mask
+    expected = brute_force(fabric["gpkg"], mask)
+    result = mask_hydrofabric(fabric["gpkg"], mask)
+
+    assert all(0 < len(df) < fabric["n"] for df in expected.values())
+    assert_same_layers(result, expected)
+    for layer in SPATIAL:
+        assert result[layer].crs.equals(expected[layer].crs)
+
+def test_mask_outside_fabric(fabric, crs):
+    mask = gpd.GeoDataFrame(geometry=[box(-5000, -5000, -1000, -1000)], crs=crs)
+    result = mask_hydrofabric(fabric["gpkg"], mask)
+
+    assert set(result) == set(SPATIAL + ["network"])
+    assert all(df.empty for df in result.values())
+
+def test_workers_match_serial(fabric, mask):
+    serial = mask_hydrofabric(fabric["gpkg"], mask)
+    pooled = mask_hydrofabric(fabric["gpkg"], mask, workers=2)
+
+    assert list(pooled) == list(serial)
+    for layer, df in serial.items():
+        pd.testing.assert_frame_equal(pooled[layer], df, obj=layer)
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_batch_matches_single_masks(fabric, crs, workers):
+    masks = gpd.GeoDataFrame({
+        "name": ["west", "overlap", "point", "empty"],
+        "geometry": [box(0, 0, 20000, 20000), box(15000, 15000, 30000, 30000),
+                     Point(45000, 45000).buffer(6000), box(-5000, -5000, -1000, -1000)]
+    }, crs=crs)
+    batch = mask_hydrofabric_batch(fabric["gpkg"], masks, id_col="name", workers=workers)
+
+    assert list(batch) == masks["name"].tolist()
+    assert all(df.empty for df in batch["empty"].values())
+    for i, name in enumerate(masks["name"]):
+        single = mask_hydrofabric(fabric["gpkg"], masks.iloc[[i]])
+        assert_same_layers(batch[name], single)
+
+    # The overlapping masks share features
+    shared = set(batch["west"]["divides"]["id"]) & set(batch["overlap"]["divides"]["id"])
+    assert shared and shared < set(batch["overlap"]["divides"]["id"])
+
+def test_batch_writes_one_gpkg_per_mask(fabric, crs, tmp_path):
+    masks = gpd.GeoDataFrame(geometry=[box(0, 0, 20000, 20000), box(15000, 15000, 30000, 30000)], crs=crs)
+    outfiles = mask_hydrofabric_batch(fabric["gpkg"], masks, outdir=str(tmp_path))
+
+    assert list(outfiles) == [0, 1]
+    for i, outfile in outfiles.items():
+        single = mask_hydrofabric(fabric["gpkg"], masks.iloc[[i]])
+        assert sorted(gpd.read_file(outfile, layer="divides")["id"]) == sorted(single["divides"]["id"])
+
+    with pytest.raises(ValueError, match="unique"):
+        mask_hydrofabric_batch(fabric["gpkg"], pd.concat([masks, masks]))
+
+@pytest.mark.parametrize("chunksize", [7, 10000])
+def test_chunked_matches_unchunked(fabric, mask, crs, chunksize):
+    for m in (mask, mask.to_crs("EPSG:4326"), gpd.GeoDataFrame(geometry=[box(-5000, -5000, -1000, -1000)], crs=crs)):
+        expected = mask_hydrofabric(fabric["gpkg"], m)
+        result = mask_hydrofabric(fabric["gpkg"], m, chunksize=chunksize)
+
+        # Same layout: no fid, geometry last
+        assert list(result) == list(expected)
+        for layer, df in expected.items():
+            assert list(result[layer].columns) == list(df.columns)
+        assert all(result[layer].geometry.name == "geometry" for layer in SPATIAL)
+        assert_same_layers(result, expected)
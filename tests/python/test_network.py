@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+from Python.network import build_network_index, load_network_index, navigate, subset_network
+
+@pytest.fixture(scope="module")
+def edges(fabric):
+    layers = [gpd.read_file(fabric["gpkg"], layer=layer, columns=["id", "toid"]) for layer in ("flowpaths", "nexus")]
+    return pd.concat([pd.DataFrame(df[["id", "toid"]]) for df in layers], ignore_index=True)
+
+@pytest.fixture(scope="module")
+def index(edges, tmp_path_factory):
+    return load_network_index(build_network_index(edges, str(tmp_path_factory.mktemp("index"))))
+
+def reference_navigate(edges, origins, direction):
+    # Plain breadth-first search over the edge list
+    graph = defaultdict(set)
+    for id_, toid in zip(edges["id"], edges["toid"]):
+        if direction == "upstream":
+            graph[toid].add(id_)
+        else:
+            graph[id_].add(toid)
+
+    seen, frontier = set(origins), list(origins)
+    while frontier:
+        frontier = [node for current in frontier for node in graph[current] if node not in seen]
+        seen.update(frontier)
+    return seen
+
+@pytest.mark.parametrize("direction", ["upstream", "downstream"])
+def test_navigate_matches_reference(edges, index, direction):
+    origins = ["wb-16", "wb-78", "wb-79", "nex-250"]
+    reached = navigate(index, origins, direction)
+
+    assert set(reached) == reference_navigate(edges, origins, direction)
+    assert set(reached) == set().union(*(navigate(index, [origin], direction) for origin in origins))
+
+def test_navigate_unknown_origin(index):
+    with pytest.raises(ValueError):
+        navigate(index, ["wb-0"])
+
+def test_subset_network_keeps_divide_keyed_tables(gpkg_copy, index):
+    divides = gpd.read_file(gpkg_copy, layer="divides")
+    attributes = pd.DataFrame({"divide_id": divides["divide_id"], "slope": np.arange(len(divides), dtype=float)})
+    gpd.GeoDataFrame(attributes).to_file(gpkg_copy, layer="divide-attributes", driver="GPKG")
+
+    origins = ["wb-16", "wb-78"]
+    reached = set(navigate(index, origins))
+    subset = subset_network(gpkg_copy, index, origins)
+
+    assert set(subset["flowpaths"]["id"]) == {node for node in reached if node.startswith("wb-")}
+    assert set(subset["divides"]["divide_id"]) == set(subset["flowpaths"]["divide_id"])
+    assert len(subset["divide-attributes"]) > 0
+    assert set(subset["divide-attributes"]["divide_id"]) == set(subset["divides"]["divide_id"])
+
+@pytest.mark.parametrize("direction", ["upstream", "downstream"])
+def test_navigate_diamonds_and_cycles(tmp_path, direction):
+    # Braided network with a long main stem and a loop
+    edges = pd.DataFrame({
+        "id": ["a", "b", "c", "d", "e", "x", "y"] + [f"m{i}" for i in range(200)],
+        "toid": ["b", "d", "d", "e", "m0", "y", "x"] + [f"m{i + 1}" for i in range(200)]
+    })
+    edges.loc[len(edges)] = ["a", "c"]
+    index = load_network_index(build_network_index(edges, str(tmp_path)))
+
+    for origins in (["m120"], ["d", "d", "m5"], ["x"], ["a", "y", "m199"]):
+        assert set(navigate(index, origins, direction)) == reference_navigate(edges, origins, direction)
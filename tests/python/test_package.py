@@ -0,0 +1,158 @@
+import glob
+import os
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+
+def sort_by(df, col):
+    return df.sort_values(col).reset_index(drop=True)
+
+def test_geoparquet_round_trip(fabric):
+    for layer in ("divides", "flowpaths", "nexus"):
+        path = os.path.join(fabric["parquet"], layer)
+        expected = gpd.read_file(fabric["gpkg"], layer=layer)
+
+        for file in glob.glob(os.path.join(path, "*", "*.parquet")):
+            assert b"geo" in pq.read_schema(file).metadata
+
+        df = gpd.read_parquet(path)
+        assert df.crs == expected.crs
+        assert len(df) == len(expected)
+
+        df, expected = sort_by(df, "id"), sort_by(expected, "id")
+        assert df.geometry.geom_equals_exact(expected.geometry, 0).all()
+        assert df["toid"].tolist() == expected["toid"].tolist()
+
+def test_aspatial_layer(fabric):
+    import pandas as pd
+
+    df = pd.read_parquet(os.path.join(fabric["parquet"], "network"))
+    assert len(df) == fabric["n"]
+
+def test_read_parquet_pushdown(fabric):
+    import numpy as np
+
+    from Python.package import read_parquet
+
+    path = os.path.join(fabric["parquet"], "divides")
+    full = read_parquet(path)
+    assert len(full) == fabric["n"]
+    assert full["vpuid"].str.len().eq(2).all()
+
+    df = read_parquet(path, columns=["divide_id", "areasqkm"], filters={"vpuid": ["01", "02"]})
+    assert list(df.columns) == ["divide_id", "areasqkm"]
+    assert sorted(df["divide_id"]) == sorted(full.loc[full["vpuid"].isin(["01", "02"]), "divide_id"])
+
+    bbox = (10000, 10000, 20000, 15000)
+    bounds = np.array([list(b.values()) for b in full["bbox"]])
+    hits = (bounds[:, 0] <= bbox[2]) & (bounds[:, 2] >= bbox[0]) & (bounds[:, 1] <= bbox[3]) & (bounds[:, 3] >= bbox[1])
+    df = read_parquet(path, bbox=bbox)
+    assert sorted(df["divide_id"]) == sorted(full.loc[hits, "divide_id"])
+
+def test_open_dataset_with_geometry(fabric):
+    import shapely
+
+    from Python.package import open_dataset, read_parquet
+
+    path = os.path.join(fabric["parquet"], "divides")
+    expected = sort_by(read_parquet(path), "divide_id")
+
+    ddf = open_dataset(path)
+    df = sort_by(ddf.compute(), "divide_id")
+    assert df["geom"].map(type).eq(bytes).all()
+    assert df.equals(expected)
+    assert shapely.from_wkb(df["geom"]).tolist() == shapely.from_wkb(expected["geom"]).tolist()
+
+    # Further operations on the collection keep the binary and struct columns
+    sub = ddf[ddf["vpuid"] == "01"][["divide_id", "geom", "bbox"]].compute()
+    assert len(sub) == (expected["vpuid"] == "01").sum()
+    assert sub["geom"].map(type).eq(bytes).all() and sub["bbox"].map(type).eq(dict).all()
+
+    bbox = (10000, 10000, 20000, 15000)
+    df = open_dataset(path, columns=["divide_id", "geom"], bbox=bbox).compute()
+    assert sorted(df["divide_id"]) == sorted(read_parquet(path, bbox=bbox)["divide_id"])
+
+def test_hilbert_layout(fabric, tmp_path, monkeypatch):
+    import pandas as pd
+
+    from Python import package
+    from Python.package import gpkg_to_geoparquet, read_parquet
+
+    # Bounds come from the rtree: the layer is never read in decoded chunks
+    def no_chunks(*args, **kwargs):
+        raise AssertionError("geometries decoded for the Hilbert bounds")
+    monkeypatch.setattr(package, "read_sf_dataset_sqlite_chunks", no_chunks)
+
+    out = str(tmp_path / "hilbert")
+    gpkg_to_geoparquet(fabric["gpkg"], out, layers=["divides", "flowpaths"], row_group_size=16, sort="hilbert")
+
+    xmin, ymin, xmax, ymax = fabric["bounds"]
+    for layer, key in (("divides", "divide_id"), ("flowpaths", "id")):
+        index = pd.read_parquet(os.path.join(out, layer, "_rowgroups.parquet"))
+        assert index["rows"].sum() == fabric["n"] and index["rows"].max() <= 16
+
+        # Row groups stay within a quadrant of the extent
+        assert (index["xmax"] - index["xmin"]).max() <= (xmax - xmin) / 2
+        assert (index["ymax"] - index["ymin"]).max() <= (ymax - ymin) / 2
+
+        unsorted = os.path.join(fabric["parquet"], layer)
+        assert sorted(read_parquet(os.path.join(out, layer))[key]) == sorted(read_parquet(unsorted)[key])
+        for bbox in [(10000, 10000, 20000, 15000), (0, 0, 100, 100), (-10, -10, -1, -1)]:
+            assert sorted(read_parquet(os.path.join(out, layer), bbox=bbox)[key]) == \
+                sorted(read_parquet(unsorted, bbox=bbox)[key])
+
+def test_hilbert_row_groups_clustered(tmp_path):
+    import sqlite3
+    from contextlib import closing
+
+    import geopandas as gpd
+    import numpy as np
+    import pandas as pd
+    import shapely
+
+    from Python.package import layer_to_geoparquet
+    from Python.sqlite import close_gpkgs
+    from Python.writer import write_gpkg
+
+    # A dense cluster in one corner of sparse points
+    rng = np.random.default_rng(0)
+    xy = np.r_[rng.uniform(0, 2000, (2000, 2)), rng.uniform(0, 20000, (200, 2))]
+    points = gpd.GeoDataFrame({"id": np.arange(len(xy))}, geometry=shapely.points(xy), crs="EPSG:5070")
+    gpkg = write_gpkg({"points": points}, str(tmp_path / "points.gpkg"), styles=False)
+
+    layer_to_geoparquet(gpkg, "points", str(tmp_path), sort="hilbert", row_group_size=128)
+    index = pd.read_parquet(tmp_path / "points" / "_rowgroups.parquet")
+    assert index["rows"].sum() == len(points)
+
+    # Leftovers of the cluster are not merged with the sparse cells across the extent
+    assert (index["xmax"] - index["xmin"]).max() < 10000
+    assert (index["ymax"] - index["ymin"]).max() < 10000
+
+    # Without an rtree, bounds are decoded from the geometries
+    with closing(sqlite3.connect(gpkg)) as conn, conn:
+        conn.execute("DROP TABLE rtree_points_geometry")
+    close_gpkgs()
+    layer_to_geoparquet(gpkg, "points", str(tmp_path / "plain"), sort="hilbert", row_group_size=128)
+    plain = pd.read_parquet(tmp_path / "plain" / "points" / "_rowgroups.parquet")
+    assert plain["rows"].sum() == len(points)
+
+def test_writer_null_geometry_chunks(tmp_path):
+    import warnings
+
+    import numpy as np
+    import pyarrow as pa
+
+    from Python.package import GeoParquetWriter
+
+    schema = pa.schema([("id", pa.string()), ("geometry", pa.binary())])
+    writer = GeoParquetWriter(str(tmp_path / "part.parquet"), schema, geometry="geometry", row_group_size=2)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        writer.write(pa.table({"id": ["a", "b"], "geometry": [None, None]}, schema=schema), np.full((2, 4), np.nan))
+        writer.write(pa.table({"id": ["c"], "geometry": [None]}, schema=schema), np.array([[1.0, 2.0, 3.0, 4.0]]))
+        writer.close()
+
+    assert writer.bbox.tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert np.isnan(writer.row_groups[0][2:]).all() and writer.row_groups[1][2:] == (1.0, 2.0, 3.0, 4.0)
+    assert pq.read_table(tmp_path / "part.parquet").num_rows == 3
@@ -0,0 +1,161 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from Python.pipeline import RECORD_SUFFIX, Step, pipeline_table, run_pipeline, run_step
+
+# Step functions are module level so the process pool can pickle them
+def refactor(src, corrected, outfile, vpu, suffix=""):
+    with open(src) as f:
+        text = f.read()
+    with open(outfile, "w") as f:
+        f.write(text.upper())
+    if "fail" in text:
+        raise ValueError(f"bad input for {vpu}")
+    with open(outfile, "a") as f:
+        f.write(f"|{vpu}|{corrected is not None}{suffix}")
+
+def combine(mids, outfiles):
+    texts = []
+    for mid in mids:
+        with open(mid) as f:
+            texts.append(f.read())
+    for outfile in outfiles:
+        if outfile is not None:
+            with open(outfile, "w") as f:
+                f.write(",".join(texts))
+
+STEPS = [
+    Step("refactor", refactor, ["uniform", "corrected_refactor"], "nextgen"),
+    Step("global", combine, ["nextgen"], "atts", across=True)
+]
+
+@pytest.fixture
+def tree(tmp_path):
+    base = str(tmp_path)
+    pipeline = pipeline_table(base, "v1", ["01", "02", "03"], corrected_vpus=["02"])
+    for row in pipeline.itertuples():
+        os.makedirs(os.path.dirname(row.uniform), exist_ok=True)
+        with open(row.uniform, "w") as f:
+            f.write(f"uniform {row.vpus}")
+    os.makedirs(os.path.dirname(pipeline.corrected_refactor[1]))
+    with open(pipeline.corrected_refactor[1], "w") as f:
+        f.write("corrected")
+    return pipeline
+
+def statuses(result):
+    return {(r.vpus, r.step): r.status for r in result.itertuples()}
+
+def leftovers(pipeline):
+    return [f for d in {os.path.dirname(p) for p in pipeline.nextgen} | {os.path.dirname(p) for p in pipeline.atts}
+            for f in os.listdir(d) if ".tmp" in f]
+
+def test_missing_paths_are_nan(tree):
+    # Stored as NaN in the table, passed to the steps as None
+    assert tree.corrected_refactor.isna().tolist() == [True, False, True]
+
+def test_first_build_and_current(tree):
+    result = run_pipeline(tree, STEPS)
+    assert set(result.status) == {"built"}, result
+
+    with open(tree.nextgen[0]) as f:
+        assert f.read() == "UNIFORM 01|01|False"
+    with open(tree.nextgen[1]) as f:
+        assert f.read() == "UNIFORM 02|02|True"
+    with open(tree.atts[2]) as f:
+        assert f.read().count("UNIFORM") == 3
+
+    record = json.load(open(tree.nextgen[1] + RECORD_SUFFIX))
+    assert record["step"] == "refactor"
+    assert set(record["inputs"]) == {tree.uniform[1], tree.corrected_refactor[1]}
+    assert record["output"]["size"] == os.path.getsize(tree.nextgen[1])
+    assert json.load(open(tree.nextgen[0] + RECORD_SUFFIX))["inputs"].keys() == {tree.uniform[0]}
+    assert not leftovers(tree)
+
+    assert set(run_pipeline(tree, STEPS).status) == {"current"}
+    assert set(run_pipeline(tree, STEPS, force=True).status) == {"built"}
+
+def test_stale_inputs(tree):
+    run_pipeline(tree, STEPS)
+    with open(tree.uniform[0], "w") as f:
+        f.write("uniform 01 v2")
+
+    assert statuses(run_pipeline(tree, STEPS, dry_run=True)) == {
+        ("01", "refactor"): "stale", ("02", "refactor"): "current", ("03", "refactor"): "current",
+        ("01", "global"): "stale", ("02", "global"): "stale", ("03", "global"): "stale"
+    }
+    assert statuses(run_pipeline(tree, STEPS)) == {
+        ("01", "refactor"): "built", ("02", "refactor"): "current", ("03", "refactor"): "current",
+        ("01", "global"): "built", ("02", "global"): "built", ("03", "global"): "built"
+    }
+    with open(tree.atts[1]) as f:
+        assert "UNIFORM 01 V2" in f.read()
+
+    # Touching an input without changing it rebuilds nothing
+    os.utime(tree.uniform[2], ns=(0, 0))
+    assert set(run_pipeline(tree, STEPS).status) == {"current"}
+
+def test_stale_code_and_params(tree):
+    run_pipeline(tree, STEPS)
+    assert set(run_pipeline(tree, STEPS, version="v2").status) == {"built"}
+
+    steps = [STEPS[0]._replace(params={"suffix": "!"}), STEPS[1]]
+    result = run_pipeline(tree, steps, version="v2")
+    assert set(result.status) == {"built"}
+    with open(tree.nextgen[0]) as f:
+        assert f.read().endswith("!")
+
+def test_failure_propagates(tree):
+    run_pipeline(tree, STEPS)
+    with open(tree.nextgen[1]) as f:
+        before = f.read()
+    with open(tree.uniform[1], "w") as f:
+        f.write("fail")
+
+    result = run_pipeline(tree, STEPS)
+    assert statuses(result) == {
+        ("01", "refactor"): "current", ("02", "refactor"): "failed", ("03", "refactor"): "current",
+        ("01", "global"): "skipped", ("02", "global"): "skipped", ("03", "global"): "skipped"
+    }
+    assert "bad input for 02" in result.error[1]
+
+    # The previous output is kept and the partial one removed
+    with open(tree.nextgen[1]) as f:
+        assert f.read() == before
+    assert not leftovers(tree)
+
+def test_missing_inputs_and_outputs(tree):
+    os.remove(tree.uniform[2])
+    tree.loc[0, "atts"] = None
+
+    result = run_pipeline(tree, STEPS)
+    assert statuses(result) == {
+        ("01", "refactor"): "built", ("02", "refactor"): "built", ("03", "refactor"): "failed",
+        ("01", "global"): "skipped", ("02", "global"): "skipped", ("03", "global"): "skipped"
+    }
+    assert "missing input" in result.error[2]
+
+def test_errors_fail_the_step(tree, tmp_path):
+    # An input that cannot be hashed (a dangling link in a dataset directory)
+    dataset = tmp_path / "dataset"
+    dataset.mkdir()
+    os.symlink(tmp_path / "nowhere", dataset / "part.parquet")
+
+    step = Step("broken", refactor, [str(dataset), "corrected_refactor"], "nextgen")
+    status, error = run_step(step, [str(dataset), None], [tree.nextgen[0]], "01")
+    assert status == "failed" and error.startswith("FileNotFoundError")
+
+def test_workers(tree, tmp_path):
+    serial = run_pipeline(tree, STEPS)
+
+    other = tree.copy()
+    for col in ["nextgen", "atts"]:
+        other[col] = other[col].str.replace(str(tmp_path), str(tmp_path / "pool"))
+    pooled = run_pipeline(other, STEPS, workers=2)
+
+    pd.testing.assert_frame_equal(pooled, serial)
+    for a, b in zip(tree.nextgen, other.nextgen):
+        assert open(a).read() == open(b).read()
+    assert set(run_pipeline(other, STEPS, workers=2).status) == {"current"}
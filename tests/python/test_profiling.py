@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from Python import profiling
+from Python.profiling import clear_spans, disable_profiling, enable_profiling, get_spans, span
+
+@pytest.fixture(autouse=True)
+def profiling_state():
+    clear_spans()
+    yield
+    enable_profiling(max_spans=profiling.MAX_SPANS)
+    disable_profiling()
+    clear_spans()
+
+def test_spans_are_nested_and_bounded():
+    seen = []
+    hook = profiling.register_hook(seen.append)
+    enable_profiling(max_spans=5)
+
+    try:
+        with span("outer", layer="divides") as outer:
+            for i in range(10):
+                with span("inner", i=i) as s:
+                    s.set(rows=i)
+            outer.set(rows=10)
+    finally:
+        profiling.unregister_hook(hook)
+
+    # Only the most recent spans are kept, but hooks see all of them
+    spans = get_spans()
+    assert len(spans) == 5 and len(seen) == 11
+    assert [s["attrs"].get("i") for s in spans] == [6, 7, 8, 9, None]
+    assert all(s["parent"] == spans[-1]["id"] for s in spans[:-1])
+    assert spans[-1]["attrs"] == {"layer": "divides"} and spans[-1]["rows"] == 10
+
+def test_disabled_spans_are_not_recorded():
+    with span("read") as s:
+        s.set(rows=1)
+    assert get_spans() == []
+
+def test_exports(tmp_path):
+    enable_profiling()
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("bad")
+
+    lines = open(profiling.export_spans(str(tmp_path / "spans.jsonl"))).read().splitlines()
+    assert json.loads(lines[0])["error"] == "ValueError('bad')"
+
+    trace = json.load(open(profiling.export_chrome_trace(str(tmp_path / "trace.json"))))
+    assert [e["name"] for e in trace["traceEvents"]] == ["failing"]
@@ -0,0 +1,44 @@
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pyogrio
+import pytest
+
+from Python.qml import append_style, create_style_row
+
+@pytest.mark.parametrize("name", ["fabric.gpkg", "odd #1 ?x=%20.gpkg"])
+def test_append_style(gpkg_copy, tmp_path, name):
+    path = tmp_path / "styled" / name
+    path.parent.mkdir()
+    shutil.copyfile(gpkg_copy, path)
+
+    assert append_style(str(path), layer_names=["flowpaths", "divides", "lakes"]) == str(path)
+    # Restyling replaces the rows rather than adding more
+    append_style(str(path), layer_names=["flowpaths"])
+
+    with closing(sqlite3.connect(path)) as conn:
+        rows = conn.execute("SELECT f_table_name, f_geometry_column, styleName FROM layer_styles ORDER BY id").fetchall()
+        registered = conn.execute("SELECT data_type FROM gpkg_contents WHERE table_name = 'layer_styles'").fetchone()
+
+    # lakes is not in the fabric
+    assert sorted(rows) == [
+        ("divides", "geom", "divides__hydrofabric_style"),
+        ("flowpaths", "geom", "flowpaths__hydrofabric_style")
+    ]
+    assert registered == ("attributes",)
+    assert "layer_styles" in pyogrio.list_layers(path)[:, 0]
+
+    row = create_style_row(str(path), "nexus", "nexus__hydrofabric_style", "<qgis/>")
+    assert row[["f_table_name", "f_geometry_column"]].iloc[0].tolist() == ["nexus", "geom"]
+
+def test_append_style_many(fabric, tmp_path):
+    paths = []
+    for i in range(2):
+        paths.append(str(tmp_path / f"vpu_{i}.gpkg"))
+        shutil.copyfile(fabric["gpkg"], paths[-1])
+
+    assert append_style(paths, layer_names=["nexus"], workers=2) == paths
+    for path in paths:
+        with closing(sqlite3.connect(path)) as conn:
+            assert conn.execute("SELECT count(*) FROM layer_styles").fetchone() == (1,)
@@ -0,0 +1,105 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from pyarrow import dataset as ds
+
+from Python.reference import (
+    HL_SCHEMA, build_reference_network, flowline_nodes, read_reference_flowlines, routelink_waterbodies
+)
+
+# Flowline id -> (toid, hydroseq): 1 -> 2 -> 3 -> 4 -> 5, 6 -> 3, 7 -> 4, 8 -> 0
+TOPOLOGY = {1: (2, 9), 2: (3, 8), 3: (4, 7), 4: (5, 6), 5: (0, 5), 6: (3, 10), 7: (4, 11), 8: (0, 12)}
+
+@pytest.fixture(scope="module")
+def reference(tmp_path_factory):
+    # Flowline i runs from (i, 0) to (i, 1); odd ids are split in two parts
+    rows = []
+    for comid, (tocomid, hydroseq) in TOPOLOGY.items():
+        if comid % 2:
+            geom = shapely.MultiLineString([[(comid, 0), (comid, 0.5)], [(comid + 0.1, 0.5), (comid, 1)]])
+        else:
+            geom = shapely.LineString([(comid, 0), (comid + 0.5, 0.3), (comid, 1)])
+        rows.append({
+            "comid": comid, "tocomid": tocomid, "terminalpa": 5, "levelpathi": 5, "vpuid": "01",
+            "reachcode": f"{comid:014d}", "frommeas": 0.0, "tomeas": 100.0, "lengthkm": 1.0,
+            "areasqkm": 1.0, "streamorde": 1, "totdasqkm": float(comid), "hydroseq": hydroseq,
+            "dnhydroseq": TOPOLOGY.get(tocomid, (0, 0))[1], "geometry": geom
+        })
+
+    outdir = tmp_path_factory.mktemp("reference")
+    fl = gpd.GeoDataFrame(rows, crs="EPSG:5070")
+    fl.to_file(outdir / "flowlines.gpkg", layer="reference_flowline")
+
+    # Catchments of flowlines 1..7, and one without a flowline
+    div = gpd.GeoDataFrame({
+        "featureid": [1, 2, 3, 4, 5, 6, 7, 9], "vpuid": "01", "areasqkm": 1.5,
+        "geometry": [shapely.box(i, 0, i + 1, 1) for i in (1, 2, 3, 4, 5, 6, 7, 9)]
+    }, crs="EPSG:5070")
+    div.to_file(outdir / "catchments.gpkg", layer="reference_catchments")
+
+    return {"flowlines": str(outdir / "flowlines.gpkg"), "catchments": str(outdir / "catchments.gpkg"), "fl": fl}
+
+def test_flowline_nodes():
+    geometry = np.array([
+        shapely.LineString([(0, 0), (1, 1), (2, 0)]),
+        shapely.MultiLineString([[(5, 5), (6, 6)], [(7, 7), (8, 9)]]),
+        shapely.LineString(),
+        None
+    ], dtype=object)
+    nodes = flowline_nodes(geometry)
+
+    assert nodes.iloc[:2].values.tolist() == [[0, 0, 2, 0], [5, 5, 8, 9]]
+    assert nodes.iloc[2:].isna().all().all()
+
+def test_read_reference_flowlines(reference):
+    fl = read_reference_flowlines(reference["flowlines"], chunksize=3)
+
+    expected = reference["fl"]
+    assert fl["id"].tolist() == expected["comid"].tolist()
+    assert fl["mainstemlp"].tolist() == expected["levelpathi"].tolist()
+    assert np.allclose(fl[["inlet_X", "inlet_Y", "outlet_X", "outlet_Y"]], flowline_nodes(expected.geometry.values))
+
+def reference_waterbodies(routelink, net):
+    # One waterbody at a time, as in runners/03_update_hydrolocations.R
+    out = []
+    for link, wb in routelink[routelink["hl_link"] > 0].groupby("hl_link"):
+        wb = wb.merge(net[["hf_id", "toid", "hydroseq"]], on="hf_id").dropna()
+        if wb.empty:
+            continue
+        for hf_id in wb.loc[wb["hydroseq"] == wb["hydroseq"].min(), "hf_id"]:
+            out.append((str(link), hf_id, "WBOut"))
+        for hf_id in wb.loc[~wb["hf_id"].isin(wb["toid"]), "hf_id"]:
+            for fromid in net.loc[net["toid"] == hf_id, "id"]:
+                out.append((str(link), fromid, "WBIn"))
+    return sorted(set(out))
+
+def test_routelink_waterbodies(reference):
+    fl = read_reference_flowlines(reference["flowlines"])
+    net = fl.assign(hf_id=fl["id"])
+    routelink = pd.DataFrame({
+        "hf_id": [3, 4, 8, 1, 5, 2, 99],
+        "hl_link": [100, 100, 200, 0, 300, 300, 400]
+    })
+
+    wbs = routelink_waterbodies(routelink, net)
+    assert wbs.columns.tolist() == HL_SCHEMA
+    assert sorted(zip(wbs["hl_link"], wbs["hf_id"], wbs["hl_reference"])) == reference_waterbodies(routelink, net)
+
+    outlet = wbs[(wbs["hl_link"] == "100") & (wbs["hl_reference"] == "WBOut")]
+    assert outlet[["hf_id", "X", "Y"]].values.tolist() == [[4, 4, 1]]
+
+def test_build_reference_network(reference, tmp_path):
+    routelink = pd.DataFrame({"hf_id": [3, 4], "hl_link": [100, 100]})
+    out = build_reference_network(reference["flowlines"], reference["catchments"], str(tmp_path), routelink=routelink)
+
+    net = ds.dataset(out["network"], partitioning="hive").to_table().to_pandas()
+    assert sorted(net["id"]) == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+    assert net["hf_id"].equals(net["id"])
+    # Divides without a flowline and flowlines without a divide are both kept
+    assert net.loc[net["id"] == 9, "toid"].isna().all()
+    assert net.loc[net["id"] == 8, "divide_id"].isna().all()
+
+    wbs = ds.dataset(out["routelink"]).to_table().to_pandas()
+    assert sorted(zip(wbs["hf_id"], wbs["hl_reference"])) == [(2, "WBIn"), (4, "WBOut"), (6, "WBIn")]
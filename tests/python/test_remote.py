@@ -0,0 +1,116 @@
+import os
+
+import pandas as pd
+import pytest
+
+from Python.package import read_parquet
+from Python.remote import BlockCache, file_version, read_remote_parquet, serve_directory
+
+@pytest.fixture(scope="module")
+def server(fabric):
+    with serve_directory(fabric["parquet"]) as server:
+        yield server
+
+def normalize(df, key):
+    return df[sorted(df.columns)].sort_values(key).reset_index(drop=True)
+
+@pytest.mark.parametrize("layer, key, kwargs", [
+    ("divides", "divide_id", {}),
+    ("divides", "divide_id", {"columns": ["divide_id", "areasqkm"]}),
+    ("divides", "divide_id", {"filters": {"vpuid": ["01", "03"]}}),
+    ("flowpaths", "id", {"columns": ["id", "toid"], "filters": {"vpuid": "02"}}),
+    ("divides", "divide_id", {"bbox": (10000, 10000, 20000, 15000)}),
+    ("flowpaths", "id", {"columns": ["id"], "bbox": (10000, 10000, 20000, 15000), "filters": [("lengthkm", ">", 1)]}),
+    ("divides", "divide_id", {"bbox": (-10, -10, -1, -1)}),
+    ("divides", "divide_id", {"filters": {"vpuid": "99"}}),
+])
+def test_remote_matches_local(fabric, server, layer, key, kwargs):
+    local = read_parquet(os.path.join(fabric["parquet"], layer), **kwargs)
+    remote = read_remote_parquet(f"{server.url}/{layer}", cache_dir=False, **kwargs)
+
+    assert sorted(remote.columns) == sorted(local.columns)
+    pd.testing.assert_frame_equal(normalize(remote, key), normalize(local, key), check_dtype=False)
+
+def test_files_without_index(fabric, server):
+    # The aspatial layer has no row group index; its files are listed instead
+    base = os.path.join(fabric["parquet"], "network")
+    files = sorted(os.path.relpath(os.path.join(root, name), base).replace(os.sep, "/")
+                   for root, _, names in os.walk(base) for name in names if name.endswith(".parquet"))
+
+    with pytest.raises(FileNotFoundError):
+        read_remote_parquet(f"{server.url}/network", cache_dir=False)
+
+    remote = read_remote_parquet(f"{server.url}/network", files=files, filters={"vpuid": "01"}, cache_dir=False)
+    local = read_parquet(base, filters={"vpuid": "01"})
+    pd.testing.assert_frame_equal(normalize(remote, "id"), normalize(local, "id"), check_dtype=False)
+
+    # Single files, through package.read_parquet
+    single = read_parquet(f"{server.url}/network/{files[0]}", columns=["id"])
+    assert sorted(single["id"]) == sorted(pd.read_parquet(os.path.join(base, files[0]), columns=["id"])["id"])
+
+def test_revalidation(fabric, tmp_path):
+    bbox = (10000, 10000, 20000, 15000)
+    cache = str(tmp_path / "blocks")
+
+    with serve_directory(fabric["parquet"]) as server:
+        cold = read_remote_parquet(f"{server.url}/divides", bbox=bbox, cache_dir=cache)
+        opened = {path for method, path, byte_range in server.requests if byte_range == "bytes=-65536"}
+        server.requests.clear()
+
+        # Warm reads revalidate each file once (304) and fetch nothing else
+        warm = read_remote_parquet(f"{server.url}/divides", bbox=bbox, cache_dir=cache)
+        pd.testing.assert_frame_equal(warm, cold)
+        assert sorted(path for _, path, _ in server.requests) == sorted(opened)
+        assert all(byte_range == "bytes=-65536" for _, _, byte_range in server.requests)
+
+def test_changed_files_are_refetched(fabric, tmp_path):
+    import shutil
+
+    root = tmp_path / "store"
+    shutil.copytree(os.path.join(fabric["parquet"], "divides"), root / "divides")
+    cache = str(tmp_path / "blocks")
+
+    with serve_directory(root) as server:
+        read_remote_parquet(f"{server.url}/divides", filters={"vpuid": "01"}, cache_dir=cache)
+
+        # A new version of a file changes its ETag
+        path = next((root / "divides" / "vpuid=01").glob("*.parquet"))
+        df = pd.read_parquet(path)
+        df.iloc[:3].to_parquet(path)
+        server.requests.clear()
+
+        url = f"{server.url}/divides/vpuid=01/{path.name}"
+        changed = read_remote_parquet(url, cache_dir=cache)
+        assert len(changed) == 3
+
+        # Only the blocks of the new version are kept
+        blocks = BlockCache(cache)
+        versions = {name.split("-")[1] for name in os.listdir(cache) if name.startswith(blocks.key(url) + "-")}
+        assert versions == {file_version(*blocks.meta(url))}
+
+def test_block_cache_eviction(fabric, server, tmp_path):
+    blocks = BlockCache(str(tmp_path / "unit"), max_bytes=250)
+    for i in range(5):
+        blocks.put("http://store/file", "v1", i * 100, bytes([i]) * 100)
+        os.utime(os.path.join(blocks.path, f"{blocks.key('http://store/file')}-v1-{i * 100}-{i * 100 + 100}.blk"),
+                 ns=(i * 10 ** 9, i * 10 ** 9))
+    blocks.evict()
+
+    # The two most recently used blocks fit
+    assert blocks.read("http://store/file", "v1", 0, 100) is None
+    assert blocks.read("http://store/file", "v1", 300, 500) == bytes([3]) * 100 + bytes([4]) * 100
+
+    # Reads through a small cache stay bounded and correct
+    cache = tmp_path / "store"
+    remote = read_remote_parquet(f"{server.url}/divides", cache_dir=str(cache), max_bytes=64 << 10)
+    local = read_parquet(os.path.join(fabric["parquet"], "divides"))
+    pd.testing.assert_frame_equal(normalize(remote, "divide_id"), normalize(local, "divide_id"), check_dtype=False)
+    assert sum(p.stat().st_size for p in cache.glob("*.blk")) <= 64 << 10
+
+def test_no_block_cache(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("HYDROFABRIC_REMOTE_CACHE", str(tmp_path / "default"))
+    read_remote_parquet(f"{server.url}/nexus", columns=["id"], cache_dir=False)
+    assert not (tmp_path / "default").exists()
+
+    read_remote_parquet(f"{server.url}/nexus", columns=["id"])
+    assert list((tmp_path / "default").glob("*.blk"))
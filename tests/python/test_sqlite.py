@@ -0,0 +1,121 @@
+import sqlite3
+
+import pytest
+
+from Python.sqlite import as_sqlite, close_gpkgs, get_gpkg
+
+def test_as_sqlite_lists_layers(fabric):
+    layers = as_sqlite(fabric["gpkg"])
+
+    assert {"divides", "flowpaths", "nexus", "network"} <= set(layers)
+    assert not [layer for layer in layers if layer.startswith(("gpkg_", "rtree_", "sqlite_"))]
+
+def test_as_sqlite_unknown_layer(fabric):
+    with pytest.raises(ValueError):
+        as_sqlite(fabric["gpkg"], "missing")
+
+def test_connections_are_pooled(fabric):
+    assert get_gpkg(fabric["gpkg"]) is get_gpkg(fabric["gpkg"])
+    assert as_sqlite(fabric["gpkg"], "divides") is as_sqlite(fabric["gpkg"], "nexus")
+
+    close_gpkgs()
+    conn = as_sqlite(fabric["gpkg"], "divides")
+    assert conn.execute("SELECT count(*) FROM divides").fetchone()[0] == fabric["n"]
+
+def test_connections_are_read_only(fabric):
+    with pytest.raises(sqlite3.OperationalError):
+        as_sqlite(fabric["gpkg"], "divides").execute("DELETE FROM divides")
+
+def test_in_place_rewrites_are_seen(gpkg_copy):
+    conn = as_sqlite(gpkg_copy, "divides")
+    before = conn.execute("SELECT count(*) FROM divides").fetchone()[0]
+
+    # Rewrite the file the way append_style and rewrite_identifiers do: a new table,
+    # changed rows, then a VACUUM relocating every page
+    writer = sqlite3.connect(gpkg_copy)
+    writer.execute("DELETE FROM divides WHERE fid <= 10")
+    writer.execute("CREATE TABLE extra AS SELECT * FROM divides")
+    writer.commit()
+    writer.execute("VACUUM")
+    writer.close()
+
+    # The pooled connection held across the rewrite, and the reopened handle
+    assert conn.execute("SELECT count(*) FROM divides").fetchone()[0] == before - 10
+    assert as_sqlite(gpkg_copy, "divides").execute("SELECT count(*) FROM divides").fetchone()[0] == before - 10
+
+def read_layer(fabric, layer):
+    import geopandas as gpd
+
+    return gpd.read_file(fabric["gpkg"], layer=layer)
+
+def test_read_columns_where_bbox(fabric):
+    from Python.sqlite import read_sf_dataset_sqlite
+
+    conn = as_sqlite(fabric["gpkg"], "divides")
+    expected = read_layer(fabric, "divides")
+
+    df = read_sf_dataset_sqlite(conn, "divides", columns=["divide_id"])
+    assert list(df.columns) == ["divide_id", "geom"]
+    assert len(df) == len(expected)
+
+    df = read_sf_dataset_sqlite(conn, "divides", where="vpuid = ?", params=["01"])
+    assert sorted(df["divide_id"]) == sorted(expected.loc[expected["vpuid"] == "01", "divide_id"])
+
+    xmin, ymin, xmax, ymax = bbox = (10000, 10000, 20000, 15000)
+    bounds = expected.bounds
+    hits = (bounds.minx <= xmax) & (bounds.maxx >= xmin) & (bounds.miny <= ymax) & (bounds.maxy >= ymin)
+    df = read_sf_dataset_sqlite(conn, "divides", bbox=bbox)
+    assert sorted(df["divide_id"]) == sorted(expected.loc[hits, "divide_id"])
+
+def test_read_unknown_column(fabric):
+    from Python.sqlite import read_sf_dataset_sqlite
+
+    with pytest.raises(ValueError):
+        read_sf_dataset_sqlite(as_sqlite(fabric["gpkg"], "divides"), "divides", columns=["missing"])
+
+def test_decode_matches_geopandas(fabric):
+    from Python.sqlite import read_sf_dataset_sqlite
+
+    for layer in ("divides", "flowpaths", "nexus"):
+        df = read_sf_dataset_sqlite(as_sqlite(fabric["gpkg"], layer), layer)
+        expected = read_layer(fabric, layer)
+        assert df.crs == expected.crs
+        assert df.geometry.geom_equals_exact(expected.geometry, 0).all()
+
+def test_decode_headers():
+    import struct
+
+    import numpy as np
+    import shapely
+
+    from Python.sqlite import decode_gpkg_geometry
+    from Python.writer import encode_gpkg_geometry
+
+    geoms = [shapely.box(0, 1, 2, 3), None, shapely.Point(4, 5)]
+    blobs, _ = encode_gpkg_geometry(geoms, 5070)
+
+    # Big-endian header with an envelope (minx, maxx, miny, maxy)
+    line = shapely.LineString([(0, 0), (6, 7)])
+    big = b"GP\x00\x02" + struct.pack(">i4d", 4326, 0, 6, 0, 7) + shapely.to_wkb(line, byte_order=0)
+
+    geometry, srs_id, envelope = decode_gpkg_geometry(blobs + [big])
+
+    assert geometry[0].equals(geoms[0]) and geometry[1] is None and geometry[2].equals(geoms[2])
+    assert geometry[3].equals(line)
+    assert srs_id.tolist() == [5070, -1, 5070, 4326]
+    assert envelope[0].tolist() == [0, 1, 2, 3] and envelope[3].tolist() == [0, 0, 6, 7]
+    # Points are written without an envelope
+    assert np.isnan(envelope[[1, 2]]).all()
+
+def test_chunks_match_full_read(fabric):
+    import pandas as pd
+
+    from Python.sqlite import read_sf_dataset_sqlite, read_sf_dataset_sqlite_chunks
+
+    conn = as_sqlite(fabric["gpkg"], "flowpaths")
+    full = read_sf_dataset_sqlite(conn, "flowpaths", where="vpuid != ?", params=["01"])
+    chunks = list(read_sf_dataset_sqlite_chunks(conn, "flowpaths", 64, where="vpuid != ?", params=["01"]))
+
+    assert all(len(chunk) <= 64 for chunk in chunks)
+    assert len(chunks) == -(-len(full) // 64)
+    assert pd.concat(chunks, ignore_index=True).equals(full)
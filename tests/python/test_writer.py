@@ -0,0 +1,91 @@
+import sqlite3
+from contextlib import closing
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyogrio
+import pytest
+import shapely
+
+from Python.writer import register_gpkg_functions, write_gpkg
+
+@pytest.fixture(scope="module")
+def layers(fabric):
+    out = {layer: gpd.read_file(fabric["gpkg"], layer=layer) for layer in ("divides", "flowpaths", "nexus")}
+    out["network"] = pd.DataFrame(gpd.read_file(fabric["gpkg"], layer="network"))
+
+    # Enough points for a three level rtree, with missing and empty geometries
+    rng = np.random.default_rng(4)
+    points = shapely.points(rng.uniform(0, 1e5, (6000, 2)))
+    points[[10, 20]] = None
+    points[30] = shapely.Point()
+    out["points"] = gpd.GeoDataFrame({"fid": np.arange(6000) * 2 + 5, "value": np.arange(6000) / 3}, geometry=points, crs="EPSG:5070")
+    return out
+
+@pytest.fixture(scope="module")
+def written(layers, tmp_path_factory):
+    return write_gpkg(layers, str(tmp_path_factory.mktemp("writer") / "subset.gpkg"))
+
+def test_round_trip(layers, written):
+    listed = dict(pyogrio.list_layers(written))
+    assert set(listed) == set(layers) | {"layer_styles"}
+    assert listed["network"] is None and listed["divides"] == "Polygon"
+
+    for layer, df in layers.items():
+        back = gpd.read_file(written, layer=layer, fid_as_index=True)
+        if "fid" in df.columns:
+            assert back.index.tolist() == df["fid"].tolist()
+            df = df.drop(columns="fid")
+        back = back.reset_index(drop=True)
+
+        attrs = [col for col in df.columns if col != "geometry"]
+        pd.testing.assert_frame_equal(pd.DataFrame(back[attrs]), pd.DataFrame(df[attrs]), check_dtype=False)
+        if isinstance(df, gpd.GeoDataFrame):
+            assert back.crs == df.crs
+            missing = df.geometry.isna().to_numpy()
+            assert back.geometry.isna().to_numpy().tolist() == missing.tolist()
+            assert shapely.equals(back.geometry.values[~missing], df.geometry.values[~missing]).all()
+
+def test_rtree(layers, written):
+    with closing(sqlite3.connect(written)) as conn:
+        for layer in ("divides", "flowpaths", "nexus", "points"):
+            rtree = f"rtree_{layer}_geometry"
+            assert conn.execute(f"SELECT rtreecheck('{rtree}')").fetchone() == ("ok",)
+
+            # Window queries match the feature bounds
+            fid = layers[layer]["fid"] if "fid" in layers[layer] else pd.Series(np.arange(len(layers[layer])) + 1)
+            bounds = layers[layer].bounds
+            xmin, ymin, xmax, ymax = layers[layer].total_bounds
+            window = (xmin + (xmax - xmin) / 3, ymin + (ymax - ymin) / 3, xmax - (xmax - xmin) / 3, ymax - (ymax - ymin) / 3)
+            hits = conn.execute(
+                f'SELECT id FROM "{rtree}" WHERE maxx >= ? AND minx <= ? AND maxy >= ? AND miny <= ?',
+                (window[0], window[2], window[1], window[3])
+            ).fetchall()
+            expected = fid[(bounds["maxx"] >= window[0]) & (bounds["minx"] <= window[2]) &
+                           (bounds["maxy"] >= window[1]) & (bounds["miny"] <= window[3])]
+            assert sorted(r[0] for r in hits) == sorted(expected)
+
+        depth = conn.execute("SELECT data FROM rtree_points_geometry_node WHERE nodeno = 1").fetchone()[0][:2]
+        assert int.from_bytes(depth, "big") == 2
+
+def test_triggers_keep_rtree_current(written, tmp_path):
+    path = tmp_path / "edit.gpkg"
+    path.write_bytes(open(written, "rb").read())
+
+    with closing(sqlite3.connect(path)) as conn, conn:
+        register_gpkg_functions(conn)
+        conn.execute("DELETE FROM nexus WHERE fid = 1")
+        conn.execute("UPDATE divides SET geometry = (SELECT geometry FROM divides WHERE fid = 2) WHERE fid = 3")
+        assert conn.execute("SELECT rtreecheck('rtree_divides_geometry')").fetchone() == ("ok",)
+        assert conn.execute("SELECT count(*) FROM rtree_nexus_geometry WHERE id = 1").fetchone() == (0,)
+        assert conn.execute("SELECT minx, maxy FROM rtree_divides_geometry WHERE id = 3").fetchone() == \
+            conn.execute("SELECT minx, maxy FROM rtree_divides_geometry WHERE id = 2").fetchone()
+
+def test_no_styles_and_replace(layers, tmp_path):
+    path = str(tmp_path / "plain.gpkg")
+    write_gpkg({"nexus": layers["nexus"]}, path, styles=False)
+    write_gpkg({"network": layers["network"]}, path, styles=False)
+
+    assert pyogrio.list_layers(path)[:, 0].tolist() == ["network"]
+    assert [p.name for p in tmp_path.iterdir()] == ["plain.gpkg"]
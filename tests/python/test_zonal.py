@@ -0,0 +1,104 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from Python.zonal import Grid, coverage_fractions, execute_zonal, read_grid, weight_grid
+
+# 10 x 8 grid of unit cells
+GRID = Grid(0.0, 0.0, 10.0, 8.0, 10, 8, "EPSG:5070")
+
+@pytest.fixture
+def divides():
+    return gpd.GeoDataFrame({
+        "divide_id": ["cat-1", "cat-2", "cat-3"],
+        "vpuid": ["01", "01", "02"],
+        "geometry": [
+            shapely.box(0.5, 0.5, 3.5, 2.5),
+            shapely.Polygon([(4, 1), (9.5, 1), (4, 7.25)]),
+            shapely.box(1, 4, 3, 7).difference(shapely.box(1.5, 5, 2.5, 6))
+        ]
+    }, crs=GRID.crs)
+
+def test_read_grid(tmp_path):
+    path = tmp_path / "forcing_grids.json"
+    path.write_text(json.dumps([{"X1": 0, "Xn": 10, "Y1": 0, "Yn": 8, "ncols": 10, "nrows": 8, "crs": "EPSG:5070"}]))
+
+    assert read_grid(str(path)) == GRID
+
+def test_coverage_fractions(divides):
+    w = coverage_fractions(GRID, np.asarray(divides.geometry.array), divides["divide_id"].to_numpy())
+
+    # Covered area adds up to the polygon areas, and no cell is over-covered
+    area = w.groupby("id")["coverage_fraction"].sum()
+    assert np.allclose(area[divides["divide_id"]].to_numpy(), divides.area.to_numpy())
+    assert w["coverage_fraction"].between(0, 1 + 1e-12).all()
+
+    # Cells are numbered row-major from the top-left corner, starting at 1
+    corner = w[(w["id"] == "cat-1") & (w["cell"] == 7 * 10 + 1)]
+    assert corner["coverage_fraction"].tolist() == pytest.approx([0.25])
+    inner = w[(w["id"] == "cat-1") & (w["cell"] == 6 * 10 + 2)]
+    assert inner["coverage_fraction"].tolist() == [1.0]
+    holed = w[(w["id"] == "cat-3") & (w["cell"] == 2 * 10 + 2)]
+    assert holed["coverage_fraction"].tolist() == pytest.approx([0.5])
+
+def test_weight_grid_parallel_and_cached(divides, tmp_path):
+    serial = weight_grid(GRID, divides)
+    key = ["divide_id", "cell"]
+
+    parallel = weight_grid(GRID, divides, by="vpuid", workers=2, cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(
+        parallel.sort_values(key, ignore_index=True), serial.sort_values(key, ignore_index=True)
+    )
+
+    # The second call is answered from the cache
+    assert len(list(tmp_path.glob("weights_*.parquet"))) == 1
+    cached = weight_grid(GRID, divides, cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(cached, parallel)
+
+    # Different divides get different weights
+    weight_grid(GRID, divides.iloc[:2], cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("weights_*.parquet"))) == 2
+
+def test_execute_zonal(divides):
+    w = weight_grid(GRID, divides)
+    rng = np.random.default_rng(1)
+    band = rng.uniform(0, 100, (GRID.nrows, GRID.ncols))
+    band[7, 0] = np.nan
+
+    out = execute_zonal({"slope": band, "aspect": band * 3.6}, w)
+    assert out.columns.tolist() == ["divide_id", "slope", "aspect"]
+
+    # Missing cells are left out of the weights
+    values = band.ravel()[w["cell"].to_numpy() - 1]
+    ok = ~np.isnan(values)
+    expected = (
+        pd.DataFrame({"divide_id": w["divide_id"][ok], "x": values[ok] * w["coverage_fraction"][ok], "w": w["coverage_fraction"][ok]})
+        .groupby("divide_id")[["x", "w"]].sum()
+    )
+    assert np.allclose(out.set_index("divide_id")["slope"], expected["x"] / expected["w"])
+
+    stack = execute_zonal(np.stack([band, band]), w)
+    assert stack.columns.tolist() == ["divide_id", "mean.1", "mean.2"]
+
+    # Circular means wrap around 0/360
+    circular = execute_zonal(np.where(np.arange(GRID.ncols) % 2, 350.0, 10.0)[None].repeat(GRID.nrows, 0), w, fun="circular_mean")
+    assert np.all(np.minimum(circular["circular_mean"], 360 - circular["circular_mean"]) < 10)
+
+def test_execute_zonal_freq_and_distribution(divides):
+    w = weight_grid(GRID, divides)
+    classes = np.arange(GRID.nrows * GRID.ncols).reshape(GRID.nrows, GRID.ncols) % 3
+
+    freq = execute_zonal(classes, w, fun="freq")
+    assert freq.columns.tolist() == ["divide_id", "band", "value", "percentage"]
+    assert np.allclose(freq.groupby("divide_id")["percentage"].sum(), 1)
+
+    dist = execute_zonal(classes, w, fun="equal_population_distribution", groups=2)
+    for s in dist["equal_population_distribution"]:
+        assert sum(json.loads(s)["frequency"]) == pytest.approx(1, abs=1e-5)
+
+    with pytest.raises(ValueError):
+        execute_zonal(classes, w, fun="median")